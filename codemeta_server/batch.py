@@ -0,0 +1,204 @@
+"""Retrieval of many resources in a single request, for aggregators and harvesters that mirror the catalogue"""
+
+import json
+import uuid
+from typing import Optional, List, Iterator, Tuple
+from rdflib import URIRef
+from codemeta.common import urijoin
+from codemeta_server.streaming import iter_turtle, iter_ntriples
+from codemeta_server.versions import InvalidRange, is_range
+
+#supported formats => media type of a single item
+FORMATS = {
+    "json": "application/ld+json",
+    "turtle": "text/turtle",
+    "ntriples": "application/n-triples",
+    "html": "text/html",
+}
+
+#number of resources serialized together to JSON-LD, the JSON-LD processing (context compaction) is done once for all of them
+BATCHSIZE = 50
+
+STATUSTEXT = { 200: "OK", 304: "Not Modified", 400: "Bad Request", 404: "Not Found", 500: "Internal Server Error" }
+
+
+class BatchError(ValueError):
+    pass
+
+
+class Item:
+    """A single requested resource and the result for it"""
+
+    def __init__(self, path: str, etag: Optional[str] = None):
+        self.path = path
+        self.etag = etag #the ETag the client has, if it still matches nothing is returned for the item
+        self.res: Optional[URIRef] = None
+        self.version: Optional[str] = None
+        self.status = 200
+        self.error: Optional[str] = None
+        self.validators: Optional[Tuple[str, float]] = None
+        self.content: Optional[str] = None
+        self.data: Optional[dict] = None #the JSON-LD node (json only)
+
+
+def parse_request(body: bytes, format: Optional[str], limit: int) -> Tuple[List[Item], str]:
+    """Parses the body of a batch request: a JSON list of resource paths or a JSON object with 'resources' and optionally 'format'.
+    Resources are either paths or objects with 'resource' and optionally the 'etag' the client has. Returns the items and the format."""
+    try:
+        request = json.loads(body)
+    except ValueError as e:
+        raise BatchError(f"Request body must be JSON: {e}")
+    if isinstance(request, dict):
+        resources = request.get("resources")
+        if format is None:
+            format = request.get("format")
+    else:
+        resources = request
+    if not isinstance(resources, list):
+        raise BatchError("Expected a list of resources")
+    if not format:
+        format = "json"
+    if format not in FORMATS:
+        raise BatchError(f"Unsupported format: {format}, choose from: " + ", ".join(FORMATS))
+    if limit and len(resources) > limit:
+        raise BatchError(f"Too many resources requested, at most {limit} are allowed per batch")
+    items = []
+    for resource in resources:
+        if isinstance(resource, str):
+            items.append(Item(resource.strip("/")))
+        elif isinstance(resource, dict) and isinstance(resource.get("resource"), str):
+            items.append(Item(resource["resource"].strip("/"), resource.get("etag")))
+        else:
+            raise BatchError(f"Invalid resource in batch: {json.dumps(resource)}")
+    return items, format
+
+
+def resolve(server, item: Item, state):
+    """Resolves the path of an item to a resource, a path without a version, with 'latest' or with a version range resolves to the matching version"""
+    identifier = item.path
+    if not identifier:
+        item.status, item.error = 404, "Resource not found"
+        return
+    if identifier.find("/") > 0:
+        versionless, spec = identifier.rsplit("/",1)
+        if versionless in state.versionmap and (spec == "latest" or is_range(spec)):
+            try:
+                version = state.versionmap.resolve(versionless, spec)
+            except InvalidRange as e:
+                item.status, item.error = 400, str(e)
+                return
+            if not version:
+                item.status, item.error = 404, f"No version of {versionless} matches {spec}"
+                return
+            identifier = versionless + "/" + version
+    res = URIRef(urijoin(server.baseuri, identifier))
+    if (res, None, None) not in state.graph and identifier in state.versionmap:
+        identifier = identifier + "/" + state.versionmap.latest(identifier)
+        res = URIRef(urijoin(server.baseuri, identifier))
+    if (res, None, None) not in state.graph:
+        item.status, item.error = 404, "Resource not found"
+        return
+    item.res = res
+    found = state.versionmap.split(res, 2)
+    item.version = found[1] if found else None
+
+
+def process(server, items: List[Item], output_type: str, state) -> Iterator[Item]:
+    """Serializes the items in chunks and yields them as soon as they are done, in the order they were requested"""
+    for i in range(0, len(items), BATCHSIZE):
+        chunk = items[i:i+BATCHSIZE]
+        pending = []
+        for item in chunk:
+            if item.status == 200:
+                item.validators = server.get_validators(item.res, output_type, state)
+                if item.etag is not None and item.etag.strip() in (item.validators[0], "W/" + item.validators[0]):
+                    item.status = 304
+                else:
+                    pending.append(item)
+        try:
+            serialize_chunk(server, pending, output_type, state)
+        except Exception as e: #pylint: disable=broad-except
+            for item in pending:
+                if item.content is None and item.data is None:
+                    item.status, item.error = 500, f"Unable to serialize: {e}"
+        yield from chunk
+
+
+def serialize_chunk(server, items: List[Item], output_type: str, state):
+    if output_type == "json":
+        #one JSON-LD serialization for the whole chunk, the nodes of the requested resources are taken from it
+        resources = list(dict.fromkeys(item.res for item in items))
+        if not resources:
+            return
+        doc = json.loads(server.render(resources, "json", state)) if len(resources) > 1 else None
+        nodes = {}
+        if doc is not None:
+            for node in doc.get("@graph", [doc]):
+                if isinstance(node, dict) and "@id" in node:
+                    nodes[node["@id"]] = node
+        for item in items:
+            node = nodes.get(str(item.res))
+            if node is None:
+                #not in the joint serialization (or the only resource), serialize it on its own
+                single = json.loads(server.serialize(item.res, "json", state))
+                item.data = single
+            else:
+                item.data = dict(node)
+                item.data["@context"] = doc.get("@context")
+    elif output_type in ("turtle", "ntriples"):
+        serializer = iter_turtle if output_type == "turtle" else iter_ntriples
+        for item in items:
+            item.content = "".join(serializer(server.describe([item.res], state)))
+    else:
+        for item in items:
+            item.content = server.serialize(item.res, output_type, state)
+
+
+def get_result(server, item: Item) -> dict:
+    result = { "resource": item.path, "status": item.status }
+    if item.res is not None:
+        result["id"] = str(item.res)
+        result["url"] = server.get_url(item.res)
+        if item.version:
+            result["version"] = item.version
+    if item.validators is not None:
+        result["etag"] = item.validators[0]
+    if item.error:
+        result["error"] = item.error
+    return result
+
+
+def iter_jsonlines(server, items: Iterator[Item]) -> Iterator[str]:
+    """One JSON object per line and per resource"""
+    for item in items:
+        result = get_result(server, item)
+        if item.data is not None:
+            result["data"] = item.data
+        elif item.content is not None:
+            result["content"] = item.content
+        yield json.dumps(result, ensure_ascii=False) + "\n"
+
+
+def iter_multipart(server, items: Iterator[Item], output_type: str, boundary: str) -> Iterator[str]:
+    """A multipart/mixed message with one part per resource, the status, location and ETag of each are in the part headers"""
+    for item in items:
+        headers = [ f"--{boundary}", f"Status: {item.status} {STATUSTEXT.get(item.status, '')}".rstrip(), f"X-Resource: {item.path}" ]
+        if item.res is not None:
+            headers.append(f"Content-Location: {server.get_url(item.res)}")
+        if item.validators is not None:
+            headers.append(f"ETag: {item.validators[0]}")
+        if item.data is not None:
+            headers.append(f"Content-Type: {FORMATS[output_type]}")
+            body = json.dumps(item.data, indent=4, ensure_ascii=False)
+        elif item.content is not None:
+            headers.append(f"Content-Type: {FORMATS[output_type]}; charset=utf-8")
+            body = item.content
+        else:
+            headers.append("Content-Type: text/plain; charset=utf-8")
+            body = item.error or ""
+        yield "\r\n".join(headers) + "\r\n\r\n" + body + "\r\n"
+    yield f"--{boundary}--\r\n"
+
+
+def new_boundary() -> str:
+    return "batch-" + uuid.uuid4().hex
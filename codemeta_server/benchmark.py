@@ -0,0 +1,286 @@
+"""Benchmarks the server on synthetic codemeta graphs of increasing size: startup time, peak memory usage and the latency and throughput of each endpoint"""
+
+import sys
+import os
+import os.path
+import json
+import time
+import random
+import platform
+import resource
+import subprocess
+import asyncio
+import argparse
+from typing import List, Optional
+from codemeta.common import CODEMETA_SOURCE, SCHEMA_SOURCE, STYPE_SOURCE
+
+try:
+    import httpx
+except ImportError:
+    httpx = None
+
+BASEURI = "http://localhost:8080/"
+
+WORDS = ("natural", "language", "processing", "speech", "recognition", "corpus", "annotation", "linguistic", "parser",
+         "tokeniser", "lemmatiser", "tagger", "search", "visualisation", "machine", "learning", "text", "audio", "lexicon",
+         "semantic", "syntax", "morphology", "translation", "alignment", "metadata", "archive", "workflow", "pipeline")
+
+LICENSES = ("http://spdx.org/licenses/GPL-3.0-only", "http://spdx.org/licenses/MIT", "http://spdx.org/licenses/Apache-2.0", "http://spdx.org/licenses/BSD-3-Clause")
+
+STATUSES = ("https://www.repostatus.org/#active", "https://www.repostatus.org/#wip", "https://www.repostatus.org/#inactive", "https://www.repostatus.org/#unsupported")
+
+LANGUAGES = ("Python", "C++", "Java", "Rust", "R", "JavaScript")
+
+#interface type => (path component in URIs, schema type)
+INTERFACES = (
+    ("commandlineapplication", "CommandLineApplication"),
+    ("webapplication", "WebApplication"),
+    ("softwarelibrary", "SoftwareLibrary"),
+)
+
+#endpoint name => (path, accept header). {tool} and {version} are filled in with a different resource for each request.
+ENDPOINTS = {
+    "resource_html": ("/{tool}/{version}", "text/html"),
+    "resource_json": ("/{tool}/{version}.json", "application/json"),
+    "resource_turtle": ("/{tool}/{version}.ttl", "text/turtle"),
+    "redirect_latest": ("/{tool}", "application/json"),
+    "index_html": ("/", "text/html"),
+    "table_html": ("/table/", "text/html"),
+    "index_page_json": ("/?limit=25", "application/json"),
+    "search_text": ("/?q={word}", "text/html"),
+    "search_facet": ("/?q=schema:license%3D%3Dspdx:MIT", "text/html"),
+    "search_sparql": ("/?q=schema:name%3D{word}", "text/html"),
+    "facets": ("/facets", "application/json"),
+    "validation": ("/validation/{tool}/{version}", "text/plain"),
+    "sparql": ("/api/?query=SELECT%20%3Fres%20WHERE%20%7B%20%3Fres%20a%20%3Chttp%3A%2F%2Fschema.org%2FSoftwareSourceCode%3E%20%7D%20LIMIT%2010", "application/sparql-results+json"),
+    "dump_json": ("/data.json", "application/json"),
+    "log": ("/logs/{tool}", "text/plain"),
+}
+
+
+def generate_graph(tools: int, versions: int, seed: int = 0, baseuri: str = BASEURI) -> dict:
+    """Generates a codemeta graph (as JSON-LD, like codemetapy --graph produces) with the specified number of tools, each in the specified number of versions"""
+    rng = random.Random(seed)
+    graph = []
+    for i in range(tools):
+        tool = f"tool{i}"
+        words = rng.sample(WORDS, 6)
+        name = f"{words[0].capitalize()} {words[1].capitalize()} {i}"
+        interfaces = rng.sample(INTERFACES, rng.randint(1, 2))
+        maintainers = [ { "@type": "Person", "givenName": rng.choice(("Maria", "Jan", "Ada", "Kees", "Sofia", "Tom")), "familyName": rng.choice(("Jansen", "de Vries", "Bakker", "Visser", "Smit")) + str(rng.randint(1, tools)) } for _ in range(rng.randint(1, 3)) ]
+        for v in range(versions):
+            version = f"{1 + v // 5}.{v % 5}.{rng.randint(0, 3)}"
+            uri = f"{baseuri}{tool}/{version}"
+            graph.append({
+                "@id": uri,
+                "@type": "SoftwareSourceCode",
+                "identifier": f"{baseuri}{tool}",
+                "name": name,
+                "version": version,
+                "description": f"{name} is a tool for " + " ".join(rng.choice(WORDS) for _ in range(rng.randint(10, 40))),
+                "keywords": words[:rng.randint(2, 5)],
+                "license": rng.choice(LICENSES),
+                "developmentStatus": rng.choice(STATUSES),
+                "codeRepository": f"https://github.com/example/{tool}",
+                "programmingLanguage": rng.choice(LANGUAGES),
+                "maintainer": maintainers,
+                "dateModified": f"20{10 + v % 15:02d}-{1 + v % 12:02d}-01",
+                "isSourceCodeOf": [ {
+                    "@id": f"{baseuri}{interfacetype}/{tool}/{version}",
+                    "@type": schematype,
+                    "name": name,
+                    "executableName": tool,
+                } for interfacetype, schematype in interfaces ],
+            })
+    return {
+        "@context": [ CODEMETA_SOURCE, SCHEMA_SOURCE, STYPE_SOURCE ],
+        "@graph": graph,
+    }
+
+
+def generate_logs(logdir: str, tools: int, lines: int = 200, seed: int = 0):
+    """Generates harvest logs for all tools, some with errors"""
+    rng = random.Random(seed)
+    os.makedirs(logdir, exist_ok=True)
+    for i in range(tools):
+        with open(os.path.join(logdir, f"tool{i}.harvest.log"),'w',encoding='utf-8') as f:
+            for j in range(lines):
+                if rng.random() < 0.02:
+                    f.write(f"Harvester error: unable to process source {j} of tool{i}\n")
+                else:
+                    f.write(f"Processing source {j} of tool{i}: " + " ".join(rng.choice(WORDS) for _ in range(8)) + "\n")
+
+
+def generate(directory: str, tools: int, versions: int, seed: int = 0) -> str:
+    """Writes a synthetic graph and logs to a directory, returns the graph file"""
+    os.makedirs(directory, exist_ok=True)
+    graphfile = os.path.join(directory, "graph.json")
+    with open(graphfile,'w',encoding='utf-8') as f:
+        json.dump(generate_graph(tools, versions, seed), f, indent=1)
+    generate_logs(os.path.join(directory, "logs"), tools, seed=seed)
+    return graphfile
+
+
+def percentile(values: List[float], p: float) -> float:
+    if not values:
+        return 0.0
+    values = sorted(values)
+    return values[min(len(values) - 1, int(round(p / 100 * (len(values) - 1))))]
+
+
+async def measure(app, name: str, path: str, accept: str, requests: int, concurrency: int, resources: List[tuple]) -> dict:
+    """Issues the requests with the specified concurrency against the app (in-process), returns latency statistics"""
+    rng = random.Random(name)
+    latencies = []
+    statuses = {}
+    paths = []
+    for _ in range(requests):
+        tool, version = rng.choice(resources)
+        paths.append(path.format(tool=tool, version=version, word=rng.choice(WORDS)))
+    queue = iter(paths)
+    transport = httpx.ASGITransport(app=app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://localhost:8080", headers={"Accept": accept}, timeout=None) as client:
+
+        async def worker():
+            for p in queue:
+                begintime = time.perf_counter()
+                response = await client.get(p)
+                latencies.append(time.perf_counter() - begintime)
+                statuses[str(response.status_code)] = statuses.get(str(response.status_code), 0) + 1
+
+        #warm up (once per endpoint), not counted
+        await client.get(paths[0])
+        begintime = time.perf_counter()
+        await asyncio.gather(*(worker() for _ in range(concurrency)))
+        duration = time.perf_counter() - begintime
+    return {
+        "requests": len(latencies),
+        "concurrency": concurrency,
+        "p50_ms": round(percentile(latencies, 50) * 1000, 3),
+        "p99_ms": round(percentile(latencies, 99) * 1000, 3),
+        "mean_ms": round(sum(latencies) / len(latencies) * 1000, 3) if latencies else 0.0,
+        "max_ms": round(max(latencies) * 1000, 3) if latencies else 0.0,
+        "throughput": round(len(latencies) / duration, 2) if duration else 0.0,
+        "statuses": statuses,
+    }
+
+
+def run_single(graphfile: str, logdir: Optional[str], requests: int, concurrency: int, endpoints: List[str], **kwargs) -> dict:
+    """Starts a server on the graph in this process and benchmarks it, returns the results"""
+    from codemeta_server.main import get_app
+    begintime = time.perf_counter()
+    app = get_app(graph=graphfile, baseuri=BASEURI, inputlogdir=logdir, **kwargs)
+    startup = time.perf_counter() - begintime
+    begintime = time.perf_counter()
+    app.dumps.build()
+    app.wait_idle()
+    dumps = time.perf_counter() - begintime
+    resources = [ (identifier, app.versionmap.latest(identifier)) for identifier in app.versionmap.identifiers() if identifier.find("/") == -1 ]
+    result = {
+        "triples": len(app.graph),
+        "resources": len(resources),
+        "startup_s": round(startup, 3),
+        "dumps_s": round(dumps, 3),
+        "endpoints": {},
+    }
+    for name in endpoints:
+        path, accept = ENDPOINTS[name]
+        result["endpoints"][name] = asyncio.run(measure(app, name, path, accept, requests, concurrency, resources))
+        print(f"  {name}: p50={result['endpoints'][name]['p50_ms']}ms p99={result['endpoints'][name]['p99_ms']}ms throughput={result['endpoints'][name]['throughput']}/s",file=sys.stderr)
+    #peak resident memory of this process, in kB on Linux (bytes on macOS)
+    maxrss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    result["peak_rss_mb"] = round(maxrss / (1024 * 1024 if sys.platform == "darwin" else 1024), 1)
+    return result
+
+
+def compare(previous: dict, current: dict) -> List[str]:
+    """Compares two benchmark results, returns a line for each measurement that differs by more than 10%"""
+    lines = []
+    previousruns = { (run["tools"], run["versions"]): run for run in previous.get("runs", []) }
+    for run in current.get("runs", []):
+        other = previousruns.get((run["tools"], run["versions"]))
+        if other is None:
+            continue
+        label = f"{run['tools']}x{run['versions']}"
+        measurements = [ (key, other.get(key), run.get(key)) for key in ("startup_s", "dumps_s", "peak_rss_mb") ]
+        for name, endpoint in run["endpoints"].items():
+            for key in ("p50_ms", "p99_ms", "throughput"):
+                measurements.append((f"{name}.{key}", other["endpoints"].get(name, {}).get(key), endpoint.get(key)))
+        for key, before, after in measurements:
+            if before and after is not None and abs(after - before) / before > 0.1:
+                better = after > before if key.endswith("throughput") else after < before
+                lines.append(f"{label} {key}: {before} -> {after} ({(after - before) / before * 100:+.1f}%, {'better' if better else 'worse'})")
+    return lines
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmarks codemeta-server on synthetic codemeta graphs", formatter_class=argparse.ArgumentDefaultsHelpFormatter)
+    parser.add_argument('--sizes',type=str, help="Comma separated numbers of tools to benchmark with", action='store', default="100,1000")
+    parser.add_argument('--versions',type=int, help="Number of versions of each tool", action='store', default=3)
+    parser.add_argument('--seed',type=int, help="Seed for the generator", action='store', default=0)
+    parser.add_argument('--requests',type=int, help="Number of requests per endpoint", action='store', default=200)
+    parser.add_argument('--concurrency',type=int, help="Number of concurrent requests", action='store', default=8)
+    parser.add_argument('--endpoints',type=str, help="Comma separated list of endpoints to benchmark, available: " + ",".join(ENDPOINTS), action='store', default=",".join(ENDPOINTS))
+    parser.add_argument('--workdir',type=str, help="Directory for the generated graphs and logs", action='store', default="benchmark-data")
+    parser.add_argument('--output',type=str, help="Write the results (JSON) to this file", action='store')
+    parser.add_argument('--compare',type=str, help="Compare the results to those of an earlier run (JSON)", action='store')
+    parser.add_argument('--generate', help="Only generate the graphs and logs, do not benchmark", action='store_true')
+    parser.add_argument('--single',type=str, help=argparse.SUPPRESS, action='store') #internal: benchmark this graph in this process and print the result
+    args = parser.parse_args()
+
+    endpoints = [ x.strip() for x in args.endpoints.split(",") if x.strip() ]
+    for name in endpoints:
+        if name not in ENDPOINTS:
+            parser.error(f"Unknown endpoint: {name}")
+
+    if args.single:
+        if httpx is None:
+            raise Exception("The benchmark requires httpx, install it with: pip install httpx")
+        logdir = os.path.join(os.path.dirname(args.single), "logs")
+        result = run_single(args.single, logdir if os.path.isdir(logdir) else None, args.requests, args.concurrency, endpoints)
+        print(json.dumps(result))
+        return
+
+    runs = []
+    for tools in ( int(x) for x in args.sizes.split(",") if x.strip() ):
+        directory = os.path.join(args.workdir, f"{tools}x{args.versions}")
+        if not os.path.exists(os.path.join(directory, "graph.json")):
+            print(f"Generating graph with {tools} tools of {args.versions} versions in {directory}",file=sys.stderr)
+            generate(directory, tools, args.versions, args.seed)
+        if args.generate:
+            continue
+        print(f"Benchmarking {tools} tools of {args.versions} versions",file=sys.stderr)
+        #every size is benchmarked in a fresh process, so startup time and peak memory usage are not affected by earlier runs
+        process = subprocess.run([ sys.executable, "-m", "codemeta_server.benchmark", "--single", os.path.join(directory, "graph.json"),
+                                   "--requests", str(args.requests), "--concurrency", str(args.concurrency), "--endpoints", ",".join(endpoints) ],
+                                 stdout=subprocess.PIPE, check=True)
+        result = json.loads(process.stdout)
+        result.update(tools=tools, versions=args.versions)
+        runs.append(result)
+
+    if args.generate:
+        return
+    from codemeta_server.main import VERSION
+    results = {
+        "version": VERSION,
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "cpus": os.cpu_count(),
+        "timestamp": time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime()),
+        "requests": args.requests,
+        "concurrency": args.concurrency,
+        "runs": runs,
+    }
+    if args.output:
+        with open(args.output,'w',encoding='utf-8') as f:
+            json.dump(results, f, indent=4)
+    else:
+        print(json.dumps(results, indent=4))
+    if args.compare:
+        with open(args.compare,'r',encoding='utf-8') as f:
+            for line in compare(json.load(f), results):
+                print(line,file=sys.stderr)
+
+
+if __name__ == "__main__":
+    main()
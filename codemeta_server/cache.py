@@ -0,0 +1,66 @@
+import threading
+from collections import OrderedDict
+from typing import Union, Optional, Hashable
+
+
+class RenderCache:
+    """Bounded in-process LRU cache for rendered output, bounded both by the number of entries and by the total size in bytes"""
+
+    def __init__(self, maxentries: int = 1000, maxsize: int = 256 * 1024 * 1024):
+        self.maxentries = maxentries
+        self.maxsize = maxsize
+        self.entries = OrderedDict()
+        self.size = 0
+        self.hits = 0
+        self.misses = 0
+        self.lock = threading.Lock()
+
+    def enabled(self) -> bool:
+        return self.maxentries > 0 and self.maxsize > 0
+
+    def get(self, key: Hashable) -> Optional[Union[str,bytes]]:
+        """Returns the cached value for the key, or None if it is not cached. Updates the hit/miss counters."""
+        with self.lock:
+            entry = self.entries.get(key)
+            if entry is None:
+                self.misses += 1
+                return None
+            self.entries.move_to_end(key)
+            self.hits += 1
+            return entry[0]
+
+    def set(self, key: Hashable, value: Union[str,bytes]):
+        """Adds a value to the cache, evicting the least recently used entries if needed"""
+        if value is None or not self.enabled():
+            return
+        size = len(value) if isinstance(value, bytes) else len(value.encode('utf-8'))
+        if size > self.maxsize:
+            return #never cache anything that would evict everything else
+        with self.lock:
+            if key in self.entries:
+                self.size -= self.entries.pop(key)[1]
+            self.entries[key] = (value, size)
+            self.size += size
+            while len(self.entries) > self.maxentries or self.size > self.maxsize:
+                _, (_, evictedsize) = self.entries.popitem(last=False)
+                self.size -= evictedsize
+
+    def clear(self):
+        """Empties the cache (the hit/miss counters are retained)"""
+        with self.lock:
+            self.entries.clear()
+            self.size = 0
+
+    def stats(self) -> dict:
+        with self.lock:
+            return {
+                "entries": len(self.entries),
+                "size": self.size,
+                "maxentries": self.maxentries,
+                "maxsize": self.maxsize,
+                "hits": self.hits,
+                "misses": self.misses,
+            }
+
+    def __len__(self):
+        return len(self.entries)
@@ -0,0 +1,184 @@
+import asyncio
+import functools
+import contextvars
+import threading
+from contextlib import contextmanager, asynccontextmanager
+from concurrent.futures import Executor
+from typing import Callable, Any, Iterator
+
+
+class Overloaded(Exception):
+    """Raised when a request can not be queued because the queue is already full"""
+    pass
+
+
+_END = object()
+
+def _close(iterator: Iterator):
+    if hasattr(iterator, "close"):
+        iterator.close()
+
+
+class Limiter:
+    """Runs blocking functions in an executor, with at most ``maxconcurrent`` running simultaneously and at most ``maxqueue`` waiting for their turn.
+    Anything beyond that is refused immediately by raising ``Overloaded``."""
+
+    def __init__(self, executor: Executor, maxconcurrent: int, maxqueue: int):
+        self.executor = executor
+        self.maxconcurrent = maxconcurrent
+        self.maxqueue = maxqueue
+        self.pending = 0 #running + queued, only modified from the event loop
+        self.running = 0 #holding a slot, only modified from the event loop
+        self.semaphore = None #created lazily so it binds to the running event loop
+
+    @property
+    def queued(self) -> int:
+        return self.pending - self.running
+
+    @asynccontextmanager
+    async def slot(self):
+        """Waits for one of the ``maxconcurrent`` slots"""
+        if self.semaphore is None:
+            self.semaphore = asyncio.Semaphore(self.maxconcurrent)
+        self.pending += 1
+        try:
+            async with self.semaphore:
+                self.running += 1
+                try:
+                    yield
+                finally:
+                    self.running -= 1
+        finally:
+            self.pending -= 1
+
+    def admit(self):
+        """Raises ``Overloaded`` if the queue is full"""
+        if self.pending >= self.maxconcurrent + self.maxqueue:
+            raise Overloaded()
+
+    async def run(self, func: Callable, *args, **kwargs) -> Any:
+        """Run the function in the executor and return its result"""
+        self.admit()
+        async with self.slot():
+            loop = asyncio.get_running_loop()
+            #run in a copy of the current context, so context variables (e.g. request timings) are available in the worker thread
+            context = contextvars.copy_context()
+            return await loop.run_in_executor(self.executor, functools.partial(context.run, func, *args, **kwargs))
+
+    async def iterate(self, iterator: Iterator):
+        """Asynchronously iterates over a blocking iterator (e.g. a generator producing a response), advancing it in the executor.
+        Every step takes a slot like any other job, so streaming responses count towards the concurrency limit. Steps are not
+        refused when the queue is full though, as the response is under way already: whether to accept the request at all
+        is decided (by ``run`` or ``admit``) before streaming starts. If the iteration is aborted (for instance because the client
+        disconnected), the iterator is closed so it stops producing."""
+        future = None
+        try:
+            while True:
+                async with self.slot():
+                    context = contextvars.copy_context()
+                    future = self.executor.submit(context.run, next, iterator, _END)
+                    item = await asyncio.wrap_future(future)
+                if item is _END:
+                    break
+                yield item
+        finally:
+            if hasattr(iterator, "cancel"):
+                #lets the pending step stop early, rather than only closing the iterator once it is done
+                iterator.cancel()
+            if future is None:
+                _close(iterator)
+            else:
+                #closes immediately if nothing is running, otherwise as soon as the pending step is done
+                future.add_done_callback(lambda _: _close(iterator))
+
+
+class ThreadedASGIApp:
+    """Wraps an ASGI application so that each HTTP request is handled in a worker thread (with its own event loop) under the given limiter.
+    This is used for sub-applications that do blocking work inside their async handlers."""
+
+    def __init__(self, app, limiter: Limiter):
+        self.app = app
+        self.limiter = limiter
+
+    async def __call__(self, scope, receive, send):
+        if scope['type'] != 'http':
+            await self.app(scope, receive, send)
+            return
+        loop = asyncio.get_running_loop()
+
+        async def threadreceive():
+            return await asyncio.wrap_future(asyncio.run_coroutine_threadsafe(receive(), loop))
+
+        async def threadsend(message):
+            await asyncio.wrap_future(asyncio.run_coroutine_threadsafe(send(message), loop))
+
+        app = self.app #requests already in flight keep the app they started with
+        await self.limiter.run(lambda: asyncio.run(app(scope, threadreceive, threadsend)))
+
+
+class ReadWriteLock:
+    """Lets any number of readers in at once, or a single writer. A waiting writer holds off new readers, so it is not
+    starved by a steady stream of requests. Read locks are not tied to a thread: a request acquires it in the event loop
+    and releases it once the response is sent, whichever threads did the work in between."""
+
+    def __init__(self):
+        self.condition = threading.Condition()
+        self.readers = 0
+        self.writers = 0 #waiting or writing
+        self.writing = False
+
+    def try_acquire_read(self) -> bool:
+        with self.condition:
+            if self.writers:
+                return False
+            self.readers += 1
+            return True
+
+    async def acquire_read(self):
+        """Waits for the read lock without blocking the event loop. Writes are rare and short, so this simply polls."""
+        while not self.try_acquire_read():
+            await asyncio.sleep(0.01)
+
+    def release_read(self):
+        with self.condition:
+            self.readers -= 1
+            if not self.readers:
+                self.condition.notify_all()
+
+    @contextmanager
+    def write(self):
+        with self.condition:
+            self.writers += 1
+            try:
+                self.condition.wait_for(lambda: not self.readers and not self.writing)
+            except BaseException:
+                self.writers -= 1
+                raise
+            self.writing = True
+        try:
+            yield
+        finally:
+            with self.condition:
+                self.writing = False
+                self.writers -= 1
+                self.condition.notify_all()
+
+
+class ReadLockMiddleware:
+    """ASGI middleware that holds the read lock for the duration of each request, including sending the response.
+    Requests for the paths passed as exempt do not read the graph, or change it themselves, and do not take the lock."""
+
+    def __init__(self, app, lock: ReadWriteLock, exempt: tuple = ()):
+        self.app = app
+        self.lock = lock
+        self.exempt = exempt
+
+    async def __call__(self, scope, receive, send):
+        if scope['type'] != 'http' or scope.get('path', "").startswith(self.exempt):
+            await self.app(scope, receive, send)
+            return
+        await self.lock.acquire_read()
+        try:
+            await self.app(scope, receive, send)
+        finally:
+            self.lock.release_read()
@@ -0,0 +1,246 @@
+"""Prebuilt and precompressed full dumps of the knowledge graph"""
+
+import sys
+import os
+import os.path
+import re
+import time
+import zlib
+import hashlib
+import shutil
+import atexit
+import tempfile
+import threading
+import traceback
+from typing import Optional, Dict, Iterator, BinaryIO
+from fastapi import Request, Response
+from fastapi.responses import StreamingResponse
+from codemeta_server.streaming import Primed
+from codemeta_server.concurrency import Overloaded
+from codemeta_server.httputils import httpdate, negotiate_encoding, not_modified, parse_range, RangeNotSatisfiable
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+
+#output format => (file extension, media type)
+FORMATS = {
+    "json": ("json", "application/json+ld"),
+    "turtle": ("ttl", "text/turtle"),
+    "ntriples": ("nt", "application/n-triples"),
+}
+
+#content encoding => file extension, in increasing order of preference
+ENCODINGS = { "identity": "" , "gzip": ".gz" }
+if brotli is not None:
+    ENCODINGS["br"] = ".br"
+if zstandard is not None:
+    ENCODINGS["zstd"] = ".zst"
+
+CHUNKSIZE = 64 * 1024
+
+
+class Compressor:
+    """Incrementally compresses data using the specified content encoding"""
+
+    def __init__(self, encoding: str):
+        self.encoding = encoding
+        if encoding == "gzip":
+            self.compressor = zlib.compressobj(9, zlib.DEFLATED, 16 + zlib.MAX_WBITS) #with gzip header
+        elif encoding == "br":
+            self.compressor = brotli.Compressor(quality=9)
+        elif encoding == "zstd":
+            self.compressor = zstandard.ZstdCompressor(level=12).compressobj()
+        else:
+            self.compressor = None
+
+    def compress(self, data: bytes) -> bytes:
+        if self.compressor is None:
+            return data
+        elif self.encoding == "br":
+            return self.compressor.process(data)
+        return self.compressor.compress(data)
+
+    def flush(self) -> bytes:
+        if self.compressor is None:
+            return b""
+        elif self.encoding == "br":
+            return self.compressor.finish()
+        return self.compressor.flush()
+
+
+class Dump:
+    """A single prebuilt serialisation of the full graph, along with its compressed variants"""
+
+    def __init__(self, format: str, digest: str, lastmodified: float):
+        self.format = format
+        self.digest = digest
+        self.lastmodified = lastmodified
+        self.files: Dict[str, str] = {} #encoding => filename
+        self.sizes: Dict[str, int] = {}
+
+    def etag(self, encoding: str) -> str:
+        if encoding == "identity":
+            return f"\"{self.digest}\""
+        return f"\"{self.digest}-{encoding}\""
+
+    def read(self, encoding: str, start: int, end: int) -> Iterator[bytes]:
+        """Iterate over the (inclusive) byte range of the specified variant. The file is opened right away, so it can be read to
+        the end even if the dump of a newer generation replaces it meanwhile."""
+        return self.iterate(open(self.files[encoding],'rb'), start, end)
+
+    @staticmethod
+    def iterate(f: BinaryIO, start: int, end: int) -> Iterator[bytes]:
+        with f:
+            f.seek(start)
+            remaining = end - start + 1
+            while remaining > 0:
+                chunk = f.read(min(CHUNKSIZE, remaining))
+                if not chunk:
+                    break
+                remaining -= len(chunk)
+                yield chunk
+
+
+class DumpStore:
+    """Holds full dumps of the graph in all supported formats and encodings, built once per graph generation in a directory on disk.
+    Without a directory, a temporary one is used that is removed when the process exits."""
+
+    def __init__(self, server, dumpdir: Optional[str] = None):
+        self.server = server
+        if dumpdir:
+            self.dumpdir = dumpdir
+            os.makedirs(self.dumpdir, exist_ok=True)
+        else:
+            self.dumpdir = tempfile.mkdtemp(prefix="codemeta-server-dumps-")
+            #forked worker processes exit without running this, only the process that created the directory removes it
+            atexit.register(shutil.rmtree, self.dumpdir, ignore_errors=True)
+        self.dumps: Dict[str, Dump] = {}
+        self.generation = None
+        self.lock = threading.Lock()
+
+    def ready(self) -> bool:
+        return self.generation == self.server.generation
+
+    def build(self):
+        """Builds all dumps for the current graph generation (a no-op if they already exist).
+        The graph is serialised incrementally and all variants are compressed as the serialisation proceeds."""
+        with self.lock:
+            state = self.server.graphstate
+            generation = state.generation
+            if self.generation == generation:
+                return
+            begintime = time.time()
+            dumps = {}
+            for format in FORMATS:
+                try:
+                    dumps[format] = self.build_format(format, state)
+                except Exception:
+                    #requests for this format are serialised on the fly instead
+                    print(f"Failed to build the {format} data dump for graph generation {generation}:",file=sys.stderr)
+                    traceback.print_exc(file=sys.stderr)
+            self.dumps = dumps
+            self.generation = generation
+            self.cleanup()
+            print(f"Built full data dumps for graph generation {generation} in {time.time() - begintime:.2f}s",file=sys.stderr)
+
+    def build_format(self, format: str, state) -> Dump:
+        """Serialises the graph in one format, writing all encodings at once"""
+        digest = hashlib.sha256()
+        outputs = {} #encoding => (compressor, file)
+        try:
+            for encoding in ENCODINGS:
+                f = open(os.path.join(self.dumpdir, f"data.{FORMATS[format][0]}{ENCODINGS[encoding]}.tmp"),'wb')
+                outputs[encoding] = (Compressor(encoding), f)
+            for chunk in self.server.stream(None, format, state):
+                digest.update(chunk)
+                for compressor, f in outputs.values():
+                    f.write(compressor.compress(chunk))
+            dump = Dump(format, digest.hexdigest()[:32], state.loadtime)
+            for encoding, (compressor, f) in outputs.items():
+                f.write(compressor.flush())
+                dump.sizes[encoding] = f.tell()
+                f.close()
+                filename = os.path.join(self.dumpdir, f"data.{dump.digest}.{FORMATS[format][0]}{ENCODINGS[encoding]}")
+                os.replace(f.name, filename)
+                dump.files[encoding] = filename
+        finally:
+            for _, f in outputs.values():
+                f.close()
+                if os.path.exists(f.name):
+                    os.unlink(f.name) #only left behind if the build failed
+        return dump
+
+    def cleanup(self):
+        """Removes dumps of earlier generations (also those left behind by earlier runs), only touching files named like the ones we write"""
+        keep = set(filename for dump in self.dumps.values() for filename in dump.files.values())
+        extensions = "|".join(re.escape(ext) for ext, _ in FORMATS.values())
+        encodings = "|".join(re.escape(ext) for ext in ENCODINGS.values() if ext)
+        pattern = re.compile(rf"^data\.([0-9a-f]{{32}}\.)?({extensions})({encodings})?(\.tmp)?$")
+        for name in os.listdir(self.dumpdir):
+            filename = os.path.join(self.dumpdir, name)
+            if pattern.match(name) and filename not in keep:
+                os.unlink(filename)
+
+    def build_in_background(self):
+        self.server.run_in_background(self.build)
+
+    async def respond(self, request: Request, format: str) -> Response:
+        """Serves a dump, taking into account content encoding, conditional requests and range requests"""
+        dump = self.dumps.get(format) if self.ready() else None
+        if dump is None:
+            #not built yet (or the graph changed, or the build failed): serialise on the fly rather than waiting for the build to finish
+            return await self.respond_stream(format)
+        encoding = negotiate_encoding(request, reversed(list(ENCODINGS.keys())))
+        etag = dump.etag(encoding)
+        headers = {
+            "ETag": etag,
+            "Last-Modified": httpdate(dump.lastmodified),
+            "Vary": ", ".join(x for x in (self.server.vary, "Accept-Encoding") if x),
+            "Accept-Ranges": "bytes",
+        }
+        if self.server.cachecontrol:
+            headers["Cache-Control"] = self.server.cachecontrol
+        if encoding != "identity":
+            headers["Content-Encoding"] = encoding
+        if not_modified(request, etag, dump.lastmodified):
+            return Response(status_code=304, headers=headers)
+        size = dump.sizes[encoding]
+        try:
+            byterange = parse_range(request, size, etag, dump.lastmodified)
+        except RangeNotSatisfiable:
+            headers["Content-Range"] = f"bytes */{size}"
+            return Response(status_code=416, headers=headers)
+        if byterange is None:
+            start, end = 0, size - 1
+            status_code = 200
+        else:
+            start, end = byterange
+            status_code = 206
+            headers["Content-Range"] = f"bytes {start}-{end}/{size}"
+        try:
+            chunks = dump.read(encoding, start, end)
+        except FileNotFoundError:
+            #replaced by the dump of a newer generation in the meantime
+            return await self.respond_stream(format)
+        headers["Content-Length"] = str(end - start + 1)
+        return StreamingResponse(chunks, status_code=status_code, headers=headers, media_type=FORMATS[format][1])
+
+    async def respond_stream(self, format: str) -> Response:
+        """Serialises the graph on the fly. The first chunk is produced before the response starts, so a failing serialisation
+        results in a proper error rather than a truncated response"""
+        try:
+            chunks = await self.server.limiter.run(Primed, self.server.stream(None, format, self.server.graphstate))
+        except Overloaded:
+            raise
+        except Exception as e:
+            print(f"Failed to serialise the full graph as {format}:",file=sys.stderr)
+            traceback.print_exc(file=sys.stderr)
+            return self.server.respond500(format, str(e))
+        return self.server.respond_stream(format, chunks)
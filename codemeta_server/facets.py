@@ -0,0 +1,111 @@
+"""Index from (predicate, object) pairs to resources, for faceted search"""
+
+import threading
+from collections import defaultdict
+from typing import Dict, List, Set, Iterable, Optional
+from rdflib import Graph, URIRef
+from rdflib.term import Node
+from codemeta.common import SDO, RDF
+
+#facets are (prefixed) predicates, or property paths of multiple predicates separated by a slash
+DEFAULT_FACETS = [
+    "rdf:type",
+    "codemeta:developmentStatus",
+    "schema:license",
+    "schema:applicationCategory",
+    "schema:programmingLanguage",
+    "codemeta:isSourceCodeOf/rdf:type",
+]
+
+
+class FacetIndex:
+    """Maps, for each configured facet, each value to the set of resources (of a particular type) that have that value"""
+
+    def __init__(self, facets: Dict[str,List[URIRef]], restype: URIRef = SDO.SoftwareSourceCode):
+        self.facets = facets #facet key => property path
+        self.restype = restype
+        self.index: Dict[str,Dict[Node,Set[URIRef]]] = {}
+        self.values: Dict[URIRef,Dict[str,Set[Node]]] = {} #resource => facet key => values (needed for removal)
+        self.lock = threading.Lock()
+
+    def analyze(self, graph: Graph, res: URIRef) -> Dict[str,Set[Node]]:
+        values = {}
+        for key, path in self.facets.items():
+            nodes = {res}
+            for predicate in path:
+                nodes = { o for node in nodes for o in graph.objects(node, predicate) }
+            if nodes:
+                values[key] = nodes
+        return values
+
+    def build(self, graph: Graph):
+        """(Re)builds the entire index from the graph"""
+        values = {}
+        for res, _, _ in graph.triples((None, RDF.type, self.restype)):
+            values[res] = self.analyze(graph, res)
+        index = { key: defaultdict(set) for key in self.facets }
+        for res, facetvalues in values.items():
+            for key, nodes in facetvalues.items():
+                for node in nodes:
+                    index[key][node].add(res)
+        with self.lock:
+            self.values = values
+            self.index = index
+
+    def copy(self) -> "FacetIndex":
+        """Returns a copy that can be updated without affecting this index"""
+        index = FacetIndex(self.facets, self.restype)
+        with self.lock:
+            index.index = { key: defaultdict(set, { node: set(resources) for node, resources in values.items() }) for key, values in self.index.items() }
+            index.values = dict(self.values)
+        return index
+
+    def update(self, graph: Graph, resources: Iterable[URIRef]):
+        """Updates the index for the specified resources only, resources no longer in the graph are removed"""
+        with self.lock:
+            for res in resources:
+                self._remove(res)
+                if (res, RDF.type, self.restype) in graph:
+                    facetvalues = self.analyze(graph, res)
+                    self.values[res] = facetvalues
+                    for key, nodes in facetvalues.items():
+                        for node in nodes:
+                            self.index[key][node].add(res)
+
+    def remove(self, res: URIRef):
+        with self.lock:
+            self._remove(res)
+
+    def _remove(self, res: URIRef):
+        for key, nodes in self.values.pop(res, {}).items():
+            for node in nodes:
+                resources = self.index[key].get(node)
+                if resources is not None:
+                    resources.discard(res)
+                    if not resources:
+                        del self.index[key][node]
+
+    def __contains__(self, key: str) -> bool:
+        return key in self.facets
+
+    def resources(self) -> Set[URIRef]:
+        return set(self.values)
+
+    def lookup(self, key: str, values: Iterable[Node]) -> Set[URIRef]:
+        """Returns the resources that have any of the values for the facet (a disjunction)"""
+        with self.lock:
+            result = set()
+            for value in values:
+                result |= self.index[key].get(value, set())
+            return result
+
+    def counts(self, resources: Optional[Set[URIRef]] = None) -> Dict[str,Dict[Node,int]]:
+        """Returns, per facet, the number of resources for each value. Only the specified resources are counted, if any are passed."""
+        counts = {}
+        with self.lock:
+            for key, index in self.index.items():
+                if resources is None:
+                    counts[key] = { value: len(matches) for value, matches in index.items() }
+                else:
+                    counts[key] = { value: len(matches & resources) for value, matches in index.items() if not matches.isdisjoint(resources) }
+        return counts
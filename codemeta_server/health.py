@@ -0,0 +1,110 @@
+"""Liveness and readiness: the server binds its port right away and loads the graph in the background, the progress of
+loading (the phases and their timings) is reported via the readiness endpoint and other requests are refused until it is done"""
+
+import os
+import json
+import time
+import threading
+from typing import Optional, List
+from starlette.requests import Request
+
+#paths that are served while the graph is still loading
+ALWAYS_AVAILABLE = ("/health/", "/static/", "/metrics")
+
+#seconds clients are asked to wait before retrying while the graph is loading
+RETRYAFTER = 5
+
+
+class LoadProgress:
+    """Progress of the initial load of the graph: the phase it is in and how long each phase took.
+    When serving with multiple workers, the master shares its progress with the workers via a file."""
+
+    def __init__(self, filename: Optional[str] = None):
+        self.status = "loading" #loading, ready or failed
+        self.begintime = time.time()
+        self.endtime: Optional[float] = None
+        self.phases: List[list] = [] #[name, begin time, end time (None while in progress)]
+        self.details = {}
+        self.error: Optional[str] = None
+        self.filename = filename
+        self.lock = threading.Lock()
+
+    def begin(self, phase: str):
+        """Marks the start of a phase, this ends the previous phase"""
+        with self.lock:
+            now = time.time()
+            if self.phases and self.phases[-1][2] is None:
+                self.phases[-1][2] = now
+            self.phases.append([phase, now, None])
+        self.save()
+
+    def set(self, key: str, value):
+        """Records a detail of the load (e.g. the number of triples)"""
+        with self.lock:
+            self.details[key] = value
+        self.save()
+
+    def finish(self, error: Optional[str] = None):
+        with self.lock:
+            now = time.time()
+            if self.phases and self.phases[-1][2] is None:
+                self.phases[-1][2] = now
+            self.status = "failed" if error else "ready"
+            self.error = error
+            self.endtime = now
+        self.save()
+
+    def to_dict(self) -> dict:
+        with self.lock:
+            now = time.time()
+            return {
+                "status": self.status,
+                "phase": self.phases[-1][0] if self.phases and self.phases[-1][2] is None else None,
+                "elapsed": round((self.endtime if self.endtime is not None else now) - self.begintime, 3),
+                "phases": [ { "name": name, "seconds": round((end if end is not None else now) - begin, 3), "done": end is not None } for name, begin, end in self.phases ],
+                "details": dict(self.details),
+                "error": self.error,
+            }
+
+    def save(self):
+        if self.filename:
+            with open(self.filename + ".tmp", "w", encoding="utf-8") as f:
+                json.dump({ "status": self.status, "begintime": self.begintime, "endtime": self.endtime, "phases": self.phases, "details": self.details, "error": self.error }, f)
+            os.replace(self.filename + ".tmp", self.filename)
+
+    def refresh(self):
+        """Reads the progress shared by the master process (if any)"""
+        if self.filename and self.status == "loading":
+            try:
+                with open(self.filename, "r", encoding="utf-8") as f:
+                    data = json.load(f)
+            except (OSError, ValueError):
+                return
+            with self.lock:
+                self.status = data["status"]
+                self.begintime = data["begintime"]
+                self.endtime = data["endtime"]
+                self.phases = data["phases"]
+                self.details = data["details"]
+                self.error = data["error"]
+
+
+class ReadinessMiddleware:
+    """ASGI middleware that refuses requests with 503 Service Unavailable (and Retry-After) as long as the graph is not loaded"""
+
+    def __init__(self, app, server):
+        self.app = app
+        self.server = server
+
+    async def __call__(self, scope, receive, send):
+        if scope['type'] != 'http' or self.server.graphstate is not None or scope.get('path', "").startswith(ALWAYS_AVAILABLE):
+            await self.app(scope, receive, send)
+            return
+        request = Request(scope)
+        self.server.progress.refresh()
+        if self.server.progress.status == "failed":
+            message = "Failed to load the graph"
+        else:
+            message = "The graph is still being loaded, please try again later"
+        response = self.server.respond503(self.server.get_output_type(request), message, RETRYAFTER)
+        await response(scope, receive, send)
@@ -0,0 +1,110 @@
+"""Small helpers for HTTP content negotiation, conditional requests and range requests"""
+
+from email.utils import formatdate, parsedate_to_datetime
+from typing import Optional, Tuple, Iterable
+from fastapi import Request
+
+
+def httpdate(timestamp: float) -> str:
+    """Format a unix timestamp as an HTTP date"""
+    return formatdate(timestamp, usegmt=True)
+
+
+def parse_httpdate(s: str) -> Optional[float]:
+    try:
+        return parsedate_to_datetime(s).timestamp()
+    except (TypeError, ValueError, IndexError):
+        return None
+
+
+def negotiate_encoding(request: Request, available: Iterable[str]) -> str:
+    """Select the best content encoding from the available ones based on the Accept-Encoding header.
+    The available encodings should be passed in order of preference, "identity" is always acceptable."""
+    accept = request.headers.get('Accept-Encoding')
+    if not accept:
+        return "identity"
+    qualities = {}
+    for item in accept.split(","):
+        item = item.strip().split(";")
+        q = 1.0
+        for param in item[1:]:
+            param = param.strip()
+            if param.startswith("q="):
+                try:
+                    q = float(param[2:])
+                except ValueError:
+                    q = 1.0
+        qualities[item[0].strip().lower()] = q
+    best = "identity"
+    bestq = 0.0
+    for encoding in available:
+        q = qualities.get(encoding, qualities.get("*", 0.0))
+        if q > bestq:
+            best = encoding
+            bestq = q
+    return best
+
+
+def etag_matches(header: str, etag: str) -> bool:
+    """Weak comparison of an ETag against the value of an If-None-Match header"""
+    if header.strip() == "*":
+        return True
+    etag = etag[2:] if etag.startswith("W/") else etag
+    for candidate in header.split(","):
+        candidate = candidate.strip()
+        if candidate.startswith("W/"):
+            candidate = candidate[2:]
+        if candidate == etag:
+            return True
+    return False
+
+
+def not_modified(request: Request, etag: Optional[str], lastmodified: Optional[float]) -> bool:
+    """Evaluates the If-None-Match and If-Modified-Since headers, returns True if a 304 Not Modified response can be sent"""
+    ifnonematch = request.headers.get('If-None-Match')
+    if ifnonematch is not None:
+        #If-None-Match takes precedence over If-Modified-Since
+        return etag is not None and etag_matches(ifnonematch, etag)
+    ifmodifiedsince = request.headers.get('If-Modified-Since')
+    if ifmodifiedsince is not None and lastmodified is not None:
+        since = parse_httpdate(ifmodifiedsince)
+        if since is not None:
+            return int(lastmodified) <= int(since)
+    return False
+
+
+class RangeNotSatisfiable(Exception):
+    pass
+
+
+def parse_range(request: Request, size: int, etag: Optional[str] = None, lastmodified: Optional[float] = None) -> Optional[Tuple[int,int]]:
+    """Parses the Range header and returns an inclusive (start, end) byte range, or None if the full content should be returned.
+    Only single byte ranges are supported, requests for multiple ranges get the full content.
+    Raises RangeNotSatisfiable if the range can not be satisfied."""
+    header = request.headers.get('Range')
+    if not header or not header.startswith("bytes=") or header.find(",") != -1 or size == 0:
+        return None
+    ifrange = request.headers.get('If-Range')
+    if ifrange:
+        if ifrange.startswith(('"', 'W/"')):
+            if etag is None or ifrange.startswith("W/") or ifrange != etag:
+                return None
+        else:
+            since = parse_httpdate(ifrange)
+            if since is None or lastmodified is None or int(lastmodified) != int(since):
+                return None
+    start, _, end = header[len("bytes="):].strip().partition("-")
+    try:
+        if not start:
+            #suffix range: the last N bytes
+            length = int(end)
+            if length <= 0:
+                raise RangeNotSatisfiable()
+            return (max(0, size - length), size - 1)
+        start = int(start)
+        end = int(end) if end else size - 1
+    except ValueError:
+        return None
+    if start >= size or end < start:
+        raise RangeNotSatisfiable()
+    return (start, min(end, size - 1))
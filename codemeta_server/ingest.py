@@ -0,0 +1,141 @@
+"""Incremental updates of single resources: a codemeta record replaces the description of one resource in the graph
+that is served, without reloading (or even parsing) the rest of the graph. Also provides a command line tool to send
+records to a running server."""
+
+import sys
+import os
+import os.path
+import json
+import time
+import uuid
+import argparse
+import urllib.request
+import urllib.error
+from typing import Optional, Set, List
+from rdflib import Graph, URIRef, BNode
+from rdflib.term import Node
+from codemeta.common import AttribDict, bind_graph, SDO, RDF
+from codemeta.parsers.jsonld import parse_jsonld_data
+
+
+class IngestError(ValueError):
+    pass
+
+
+def parse_record(data: bytes, res: URIRef, args: AttribDict) -> Graph:
+    """Parses a single codemeta record into a new graph, the main resource in it gets the URI of the resource it replaces"""
+    try:
+        record = json.loads(data)
+    except ValueError as e:
+        raise IngestError(f"Record must be JSON: {e}")
+    if not isinstance(record, dict):
+        raise IngestError("Expected a single codemeta record (a JSON object)")
+    g = Graph()
+    bind_graph(g)
+    try:
+        parse_jsonld_data(g, res, record, args)
+    except Exception as e: #pylint: disable=broad-except
+        raise IngestError(f"Unable to parse record: {e}")
+    if (res, RDF.type, SDO.SoftwareSourceCode) not in g:
+        raise IngestError("Record does not describe a SoftwareSourceCode resource")
+    return g
+
+
+def owned_nodes(graph: Graph, res: URIRef) -> Set[Node]:
+    """Returns the resource along with the nodes that belong to it, those go when the resource goes: the blank nodes and the
+    URIs under its own URI that are reachable from it, as long as nothing else refers to them. Anything else it refers to (a
+    person, an organization, a vocabulary term) may be described for the sake of other resources as well, so is left alone."""
+    prefixes = (str(res) + "/", str(res) + "#")
+    owned = { res }
+    queue = [ res ]
+    while queue:
+        node = queue.pop()
+        for o in graph.objects(node, None):
+            if o not in owned and (isinstance(o, BNode) or (isinstance(o, URIRef) and str(o).startswith(prefixes))):
+                owned.add(o)
+                queue.append(o)
+    changed = True
+    while changed:
+        changed = False
+        for node in list(owned):
+            if node != res and any(s not in owned for s in graph.subjects(None, node)):
+                owned.discard(node)
+                changed = True
+    return owned
+
+
+def remove_resource(graph: Graph, res: URIRef) -> int:
+    """Removes the description of a resource from the graph, returns the number of triples removed"""
+    triples = [ triple for node in owned_nodes(graph, res) for triple in graph.triples((node, None, None)) ]
+    for triple in triples:
+        graph.remove(triple)
+    return len(triples)
+
+
+def replace_resource(graph: Graph, res: URIRef, record: Graph) -> int:
+    """Replaces the description of a resource in the graph by the one in the record, returns the number of triples added"""
+    remove_resource(graph, res)
+    graph.addN( triple + (graph,) for triple in record )
+    return len(record)
+
+
+def spool(spooldir: str, action: str, resource: str, data: Optional[bytes] = None):
+    """Queues an update for the master process (when serving with multiple workers, only the master changes the graph)"""
+    entry = { "action": action, "resource": resource }
+    if data is not None:
+        entry["record"] = data.decode("utf-8")
+    filename = os.path.join(spooldir, f"{time.time_ns():020d}-{uuid.uuid4().hex}.json")
+    with open(filename + ".tmp", "w", encoding="utf-8") as f:
+        json.dump(entry, f)
+    os.replace(filename + ".tmp", filename)
+
+
+def read_spool(spooldir: str) -> List[dict]:
+    """Returns and removes the queued updates, in the order they were queued"""
+    entries = []
+    for filename in sorted(os.listdir(spooldir)):
+        if filename.endswith(".json"):
+            path = os.path.join(spooldir, filename)
+            try:
+                with open(path, "r", encoding="utf-8") as f:
+                    entries.append(json.load(f))
+            except (OSError, ValueError) as e:
+                print(f"Unable to read queued update {path}: {e}",file=sys.stderr)
+            os.remove(path)
+    return entries
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Adds, replaces or deletes a single resource in a running codemeta-server, without reloading the graph. Requires the admin token of the server.", formatter_class=argparse.ArgumentDefaultsHelpFormatter)
+    parser.add_argument('--url',type=str, help="Base URL of the server", action='store', default=os.environ.get('CODEMETA_BASEURL', "http://localhost:8080/"))
+    parser.add_argument('--token',type=str, help="Admin token of the server, it is better to set this via $CODEMETA_ADMINTOKEN", action='store', default=os.environ.get('CODEMETA_ADMINTOKEN'))
+    parser.add_argument('--delete', help="Delete the resource rather than adding or replacing it", action='store_true')
+    parser.add_argument('resource',type=str, help="Identifier and version of the resource, e.g. frog/0.13")
+    parser.add_argument('record',type=str, nargs='?', help="codemeta.json record describing the resource (- for standard input)")
+    args = parser.parse_args()
+
+    if not args.token:
+        parser.error("No admin token provided, use --token or set $CODEMETA_ADMINTOKEN")
+    if args.delete:
+        data = None
+    elif not args.record:
+        parser.error("No record provided")
+    elif args.record == "-":
+        data = sys.stdin.buffer.read()
+    else:
+        with open(args.record, 'rb') as f:
+            data = f.read()
+
+    url = args.url.rstrip("/") + "/admin/resources/" + args.resource.strip("/")
+    request = urllib.request.Request(url, data=data, method="DELETE" if args.delete else "PUT",
+                                     headers={ "Authorization": f"Bearer {args.token}", "Content-Type": "application/ld+json" })
+    try:
+        with urllib.request.urlopen(request) as response:
+            print(response.read().decode("utf-8"))
+    except urllib.error.HTTPError as e:
+        print(f"Error {e.code}: {e.read().decode('utf-8')}",file=sys.stderr)
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
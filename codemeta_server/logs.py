@@ -0,0 +1,176 @@
+"""Harvest logs as produced by codemeta-harvester. The logs stay on disk, only a small summary of each is kept in memory."""
+
+import sys
+import os
+import os.path
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from typing import Optional, Dict, List, Set
+from fastapi import Request, Response
+from fastapi.responses import StreamingResponse
+from codemeta_server.httputils import httpdate, not_modified, parse_range, RangeNotSatisfiable
+
+LOGSUFFIX = ".harvest.log"
+
+#marks lines that count as errors (matched case-insensitively)
+ERRORMARKER = b"harvester error"
+
+#maximum number of error lines kept in the summary of a log
+MAXEXCERPT = 20
+
+CHUNKSIZE = 64 * 1024
+
+
+class LogEntry:
+    """Summary of a single log file"""
+
+    def __init__(self, identifier: str, filename: str):
+        self.identifier = identifier
+        self.filename = filename
+        self.size = 0
+        self.mtime = 0 #in nanoseconds
+        self.inode = 0
+        self.scanned = 0 #offset up to which complete lines were scanned
+        self.lines = 0
+        self.errors = 0
+        self.excerpt: List[str] = [] #the first error lines
+
+    def scan(self, stat: os.stat_result):
+        """Scans the log for errors. If the file only grew since the last scan, only the appended lines are scanned."""
+        if stat.st_ino != self.inode or stat.st_size < self.scanned:
+            #new, replaced or truncated: start over
+            self.scanned = 0
+            self.lines = 0
+            self.errors = 0
+            self.excerpt = []
+        with open(self.filename,'rb') as f:
+            f.seek(self.scanned)
+            for line in f:
+                if not line.endswith(b"\n"):
+                    break #incomplete line that is still being written, picked up by the next scan
+                self.scanned += len(line)
+                self.lines += 1
+                if line.lower().find(ERRORMARKER) != -1:
+                    self.errors += 1
+                    if len(self.excerpt) < MAXEXCERPT:
+                        self.excerpt.append(line.decode('utf-8',errors='replace').rstrip())
+        self.size = stat.st_size
+        self.mtime = stat.st_mtime_ns
+        self.inode = stat.st_ino
+
+
+class LogStore:
+    """Index of the harvest logs in a directory, maps resource identifiers to summaries of their logs"""
+
+    def __init__(self, logdir: str, threads: int = 4):
+        self.logdir = logdir
+        self.threads = threads
+        self.entries: Dict[str, LogEntry] = {}
+        self.lock = threading.Lock()
+
+    def refresh(self) -> Set[str]:
+        """Scans all logs that are new or changed since the last refresh (in parallel), and forgets logs that were removed.
+        Returns the identifiers of the logs whose summary changed."""
+        with self.lock:
+            stats = {}
+            try:
+                names = os.listdir(self.logdir)
+            except OSError as e:
+                print(f"Unable to read log directory {self.logdir}: {e}",file=sys.stderr)
+                return set()
+            for name in names:
+                if name.endswith(LOGSUFFIX) and not name.startswith("."):
+                    try:
+                        stats[name[:-len(LOGSUFFIX)]] = os.stat(os.path.join(self.logdir, name))
+                    except OSError:
+                        continue #removed in the meantime
+            changed = set(identifier for identifier in self.entries if identifier not in stats)
+            for identifier in changed:
+                del self.entries[identifier]
+            scan = []
+            for identifier, stat in stats.items():
+                entry = self.entries.get(identifier)
+                if entry is None:
+                    entry = LogEntry(identifier, os.path.join(self.logdir, identifier + LOGSUFFIX))
+                elif (stat.st_mtime_ns, stat.st_size, stat.st_ino) == (entry.mtime, entry.size, entry.inode):
+                    continue
+                scan.append((entry, stat))
+            if len(scan) > 1 and self.threads > 1:
+                with ThreadPoolExecutor(max_workers=self.threads, thread_name_prefix="codemeta-server-logs") as pool:
+                    results = list(pool.map(lambda x: self.scan(*x), scan))
+            else:
+                results = [ self.scan(entry, stat) for entry, stat in scan ]
+            for (entry, _), summary in zip(scan, results):
+                if summary is None:
+                    continue
+                if self.entries.get(entry.identifier) is not entry or summary != (entry.errors, entry.excerpt):
+                    changed.add(entry.identifier)
+                self.entries[entry.identifier] = entry
+            return changed
+
+    def scan(self, entry: LogEntry, stat: os.stat_result) -> Optional[tuple]:
+        """Scans a single log, returns its summary as it was before the scan (or None if the log could not be read)"""
+        summary = (entry.errors, list(entry.excerpt))
+        try:
+            entry.scan(stat)
+        except OSError as e:
+            print(f"Unable to read log {entry.filename}: {e}",file=sys.stderr)
+            return None
+        return summary
+
+    def __contains__(self, identifier: str) -> bool:
+        return identifier in self.entries
+
+    def __len__(self) -> int:
+        return len(self.entries)
+
+    def get(self, identifier: str) -> Optional[LogEntry]:
+        return self.entries.get(identifier)
+
+    def respond(self, request: Request, identifier: str) -> Optional[Response]:
+        """Serves a log directly from disk, taking into account conditional requests and range requests. Returns None if there is no such log."""
+        entry = self.entries.get(identifier)
+        if entry is None:
+            return None
+        try:
+            stat = os.stat(entry.filename)
+        except OSError:
+            return None
+        #the log may have grown since it was last scanned, so the current state of the file is served
+        etag = f"\"{stat.st_ino:x}-{stat.st_mtime_ns:x}-{stat.st_size:x}\""
+        size = stat.st_size
+        headers = {
+            "ETag": etag,
+            "Last-Modified": httpdate(stat.st_mtime),
+            "Accept-Ranges": "bytes",
+            "X-Errors": str(entry.errors),
+        }
+        if not_modified(request, etag, stat.st_mtime):
+            return Response(status_code=304, headers=headers)
+        try:
+            byterange = parse_range(request, size, etag, stat.st_mtime)
+        except RangeNotSatisfiable:
+            headers["Content-Range"] = f"bytes */{size}"
+            return Response(status_code=416, headers=headers)
+        if byterange is None:
+            start, end = 0, size - 1
+            status_code = 200
+        else:
+            start, end = byterange
+            status_code = 206
+            headers["Content-Range"] = f"bytes {start}-{end}/{size}"
+        headers["Content-Length"] = str(max(0, end - start + 1))
+        return StreamingResponse(read(entry.filename, start, end), status_code=status_code, headers=headers, media_type="text/plain; charset=utf-8")
+
+
+def read(filename: str, start: int, end: int):
+    """Iterate over the (inclusive) byte range of a file"""
+    with open(filename,'rb') as f:
+        f.seek(start)
+        remaining = end - start + 1
+        while remaining > 0:
+            chunk = f.read(min(CHUNKSIZE, remaining))
+            if not chunk:
+                break
+            remaining -= len(chunk)
+            yield chunk
@@ -2,23 +2,57 @@ import sys
 import os.path
 import json
 import traceback
-import glob
-import re
-from typing import Union, Optional, List
+import html
+import time
+import signal
+import hmac
+import asyncio
+import threading
+import multiprocessing
+import base64
+import hashlib
+from contextlib import asynccontextmanager, nullcontext
+from datetime import datetime
+from typing import Union, Optional, List, Tuple, Iterator, Callable
 from os import environ
+from urllib.parse import urlencode
 from collections import defaultdict
-from packaging.version import Version
+from concurrent.futures import ThreadPoolExecutor, ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
 from rdflib_endpoint import SparqlEndpoint
-from rdflib import Graph, ConjunctiveGraph, URIRef, Literal
+from rdflib import Graph, ConjunctiveGraph, URIRef, BNode, Literal, RDFS, SKOS
 from fastapi import FastAPI, Request, Response
-from fastapi.responses import JSONResponse
+from fastapi.responses import JSONResponse, StreamingResponse, FileResponse, RedirectResponse
 from fastapi.staticfiles import StaticFiles
+from fastapi.middleware.cors import CORSMiddleware
 from codemeta.codemeta import serialize
-from codemeta.validation import get_validation_report
-from codemeta.common import getstream, init_graph, AttribDict, SDO, RDF, CODEMETA, CODEMETAPY, urijoin
+from codemeta.common import getstream, init_graph, AttribDict, SDO, RDF, CODEMETAPY, SOFTWARETYPES, urijoin, query
 from codemeta.parsers.jsonld import parse_jsonld
+from codemeta.serializers.jsonld import serialize_to_jsonld, DEVIANT_CONTEXT
 from codemeta2html import __path__ as CODEMETA2HTMLPATH
+import codemeta2html.html
 from codemeta2html.html import serialize_to_html
+from jinja2 import Environment, FileSystemLoader
+from codemeta_server.cache import RenderCache
+from codemeta_server.concurrency import Limiter, Overloaded, ThreadedASGIApp, ReadWriteLock, ReadLockMiddleware
+from codemeta_server.dumps import DumpStore
+from codemeta_server.snapshot import snapshot_key, load_snapshot, save_snapshot
+from codemeta_server.store import StoreGraph, open_store, ingest_store, update_meta, reopen
+from codemeta_server.textindex import TextIndex, DEFAULT_PREDICATES
+from codemeta_server.facets import FacetIndex, DEFAULT_FACETS
+from codemeta_server.subgraph import SubgraphIndex, extract_subgraph, iter_description, copy_graph
+from codemeta_server.versions import VersionIndex, InvalidRange, is_range
+from codemeta_server.prerender import PageStore, export_site
+from codemeta_server.logs import LogStore
+from codemeta_server.views import ViewStore
+from codemeta_server.health import LoadProgress, ReadinessMiddleware, RETRYAFTER, ALWAYS_AVAILABLE
+from codemeta_server.validation import ValidationStore, SEVERITIES, summarize, render_html as render_validation_html
+from codemeta_server.metrics import ServerMetrics, MetricsMiddleware, timed, record_sparql
+from codemeta_server.httputils import httpdate, not_modified
+from codemeta_server.batch import BatchError, parse_request as parse_batch, resolve as resolve_batch_item, process as process_batch, iter_jsonlines, iter_multipart, new_boundary
+from codemeta_server.sparql import QueryRunner, SparqlApp
+from codemeta_server.ingest import IngestError, parse_record, remove_resource, replace_resource, spool, read_spool
+from codemeta_server.streaming import chunked, iter_ntriples, iter_turtle, iter_jsonld, Primed
 import argparse
 
 VERSION = "0.5.0" #also adapt in setup.py and codemeta.json
@@ -36,14 +70,143 @@ PREFIX repostatus: <https://www.repostatus.org/#>
 PREFIX trl: <https://w3id.org/research-technology-readiness-levels#>
 PREFIX nwo: <https://w3id.org/nwo-research-fields#>
 PREFIX tadirah: <https://vocabs.dariah.eu/tadirah/>
-PREFIX spdx: <http://spdx.org/licences/>
+PREFIX spdx: <http://spdx.org/licenses/>
 PREFIX skos: <http://www.w3.org/2004/02/skos/core#>
 PREFIX dct: <http://purl.org/dc/terms/>
 PREFIX orcid: <http://orcid.org/>
 """
 
 NSPREFIXES = ('rdfs:', 'schema:','codemeta:','stype:','iodata:','repostatus:','trl:','nwo:','tadirah:','spdx:','skos:','dct:','orcid:')
-    
+
+PREFIXES = { line.split()[1][:-1]: line.split()[2].strip("<>") for line in SPARQL_BINDS.strip().split("\n") }
+
+#number of threads for background builds (dumps, validation, views, pre-rendering), separate from those serving requests
+BUILDTHREADS = 2
+
+#indices in JSON-LD or Turtle with more resources than this are streamed rather than serialized at once
+STREAM_THRESHOLD = 100
+
+HYDRA_NEXT = "http://www.w3.org/ns/hydra/core#next" #links to the next page in paginated JSON-LD output
+
+#heading of the index of search results, codemeta2html would give a list of resources its own heading
+SEARCH_HEADING = "Search results"
+
+#what codemeta2html passes to its templates besides the graph, the index and the settings
+TEMPLATE_NAMES = ("SDO", "CODEMETA", "CODEMETAPY", "RDF", "RDFS", "SOFTWAREIODATA", "REPOSTATUS", "SKOS", "TRL", "get_triples", "get_description",
+                  "get_target_platforms", "type_label", "URIRef", "get_badge", "get_interface_types", "get_filters", "link_resource", "get_last_component",
+                  "is_resource", "Literal", "get_version", "chain", "get_doi", "has_actionable_targetapps", "has_displayable_targetapps")
+
+_RENDERCONTEXT = None #in HTML render processes: the graph generation they render
+
+def _init_render(context: "RenderContext"):
+    """Initializer of HTML render processes"""
+    global _RENDERCONTEXT
+    if isinstance(context.graph, tuple):
+        #a graph in a store is sent by reference to processes started by a fork server, as there are no handles to inherit
+        context.graph = StoreGraph(*context.graph).reopen(readonly=True)
+    else:
+        reopen(context, readonly=True)
+    _RENDERCONTEXT = context
+
+def _render_ready():
+    """Returns once a render process is initialized"""
+    return None
+
+def _render_html(res, kwargs: dict) -> str:
+    """Entrypoint for HTML render processes"""
+    return _RENDERCONTEXT.render(res, **kwargs)
+
+class GraphState:
+    """Holds one generation of the graph along with everything derived from it. Reloading swaps in an entirely new state, requests in flight keep using the state they started with."""
+    def __init__(self, graph: Graph, contextgraph: Graph, versionmap: VersionIndex):
+        self.graph = graph
+        self.contextgraph = contextgraph
+        self.versionmap = versionmap
+        self.textindex = None
+        self.facetindex = None
+        self.descriptions = None #descriptions of the individual resources (not kept for graphs in a persistent store, as it would hold them in memory)
+        self.view = None #materialized listings of the indices, built in the background or computed when first needed
+        self.changed = None #the (source code) resources that changed since the state this one was derived from, if derived
+        self.validators = {} #(resource, output_type) => (etag, last modified time), computed when first needed
+        self.previousvalidators = {} #the validators of the previous generation, so unchanged resources keep their modification time
+        self.partitioned = None #whether the graph consists of the descriptions of its resources only (computed when first needed)
+        self.generation = 0
+        self.loadtime = time.time()
+
+    def derive(self) -> "GraphState":
+        """Returns a copy of this state to apply changes to, requests in progress keep using this one.
+        A graph in memory is copied, a graph in a persistent store can not be and is shared."""
+        graph = self.graph if isinstance(self.graph, StoreGraph) else copy_graph(self.graph)
+        state = GraphState(graph, self.contextgraph, self.versionmap.copy())
+        state.textindex = self.textindex.copy()
+        state.facetindex = self.facetindex.copy()
+        state.descriptions = self.descriptions.copy() if self.descriptions is not None else None
+        state.view = self.view #the views of the new generation are built incrementally from these
+        return state
+
+class RenderContext:
+    """Everything needed to render the HTML pages of one graph generation, in the server or in the render processes"""
+    def __init__(self, server: "CodemetaServer", state: GraphState):
+        self.generation = state.generation
+        self.graph = state.graph
+        self.contextgraph = state.contextgraph
+        self.descriptions = state.descriptions
+        self.args = server.get_args("html")
+        self.title = server.title
+
+    def __getstate__(self):
+        #sent to render processes started by a fork server: the pages are rendered from the graph rather than from the
+        #descriptions (which are not sent along), and a graph in a store is opened anew by reference
+        data = dict(self.__dict__, descriptions=None, args=vars(self.args))
+        if isinstance(self.graph, StoreGraph):
+            data["graph"] = (self.graph.plugin, self.graph.directory, self.graph.identifier)
+        return data
+
+    def __setstate__(self, data: dict):
+        self.__dict__.update(data)
+        self.args = AttribDict(data["args"])
+
+    def render(self, res: Union[Optional[URIRef],List[URIRef]], **kwargs) -> str:
+        graph = self.graph
+        if isinstance(res, URIRef) and self.descriptions is not None:
+            graph = self.descriptions.get_page(res, self.graph) or self.graph
+        heading = kwargs.pop("heading", None)
+        if heading and isinstance(res, list):
+            return render_index(graph, [ (x, graph.value(x, SDO.name)) for x in res ], heading, self.args, contextgraph=self.contextgraph, title=self.title, **kwargs)
+        return serialize_to_html(graph, res, self.args, contextgraph=self.contextgraph, title=self.title, **kwargs )
+
+
+_TEMPLATES = None #jinja environment with the codemeta2html templates, created on first use
+
+def render_index(graph: Graph, resources: List[Tuple[URIRef,Optional[Literal]]], heading: str, args: AttribDict, contextgraph: Graph, indextemplate: str = "index.html", **kwargs) -> str:
+    """Renders an index of the listed resources (with their labels) under the given heading, as codemeta2html's serialize_to_html()
+    does for a list of resources, which always uses its own heading"""
+    global _TEMPLATES
+    if _TEMPLATES is None:
+        _TEMPLATES = Environment(loader=FileSystemLoader(os.path.join(CODEMETA2HTMLPATH[0], "templates")), autoescape=True, trim_blocks=True, lstrip_blocks=True)
+    kwargs.pop("sparql_query", None)
+    names = { name: getattr(codemeta2html.html, name) for name in TEMPLATE_NAMES }
+    return _TEMPLATES.get_template(indextemplate).render(
+        g=graph,
+        res=None,
+        index=[ (heading, True, resources) ],
+        STYPE=SOFTWARETYPES,
+        styledir=args.styledir,
+        css=args.css,
+        contextgraph=contextgraph,
+        now=datetime.now().strftime("%Y-%m-%d %H:%M:%S"),
+        baseuri=args.baseuri,
+        baseurl=args.baseurl,
+        buildsite=args.buildsite,
+        serverside=args.serverside,
+        intro=args.intro,
+        int=int,
+        range=range,
+        str=str,
+        **names,
+        **kwargs,
+    )
+
 class CodemetaServer(FastAPI):
     def __init__(self, *args,
                  graph: str,
@@ -55,6 +218,38 @@ class CodemetaServer(FastAPI):
                  includecontext: bool = False,
                  addcontext: list = [],
                  addcontextgraph: list = [],
+                 cacheentries: int = 1000,
+                 cachesize: int = 256,
+                 threads: int = 4,
+                 renderprocesses: int = 0,
+                 maxconcurrent: int = 0,
+                 maxqueue: int = 64,
+                 dumpdir: Optional[str] = None,
+                 snapshotdir: Optional[str] = None,
+                 store: Optional[str] = None,
+                 reloadinterval: int = 0,
+                 admintoken: Optional[str] = None,
+                 searchpredicates: Optional[dict] = None,
+                 searchlimit: int = 500,
+                 facets: Optional[List[str]] = None,
+                 pagesize: int = 0,
+                 prerenderdir: Optional[str] = None,
+                 prerenderprocesses: int = 0,
+                 redirectmaxage: int = 300,
+                 logwatchinterval: int = 10,
+                 workers: int = 1,
+                 workerstatsinterval: int = 300,
+                 slowrequests: float = 0,
+                 cachecontrol: str = "public, no-cache",
+                 vary: str = "Accept",
+                 shacl: Optional[str] = None,
+                 validationprocesses: int = 0,
+                 batchlimit: int = 1000,
+                 sparqltimeout: float = 30,
+                 sparqlmaxrows: int = 100000,
+                 sparqlconcurrent: int = 0,
+                 sparqlqueue: int = 16,
+                 loadinbackground: bool = False,
                  **kwargs
                 ) -> None:
         """Constructor for the CodemetaServer"""
@@ -82,52 +277,80 @@ class CodemetaServer(FastAPI):
         self.includecontext = includecontext
         self.addcontext = addcontext
         self.addcontextgraph = addcontextgraph
-        g, contextgraph = init_graph(self.get_args())
-        parse_jsonld(g, None, getstream(graph), self.get_args())
-        self.graph = g
-        self.contextgraph = contextgraph
-        if self.includecontext:
-            self.graph += contextgraph #include context
-        self.build_versionmap()
-        if kwargs.get('inputlogdir'):
-            self.read_logs(kwargs['inputlogdir'])
+        self.threads = threads
+        self.maxconcurrent = maxconcurrent if maxconcurrent else threads
+        self.maxqueue = maxqueue
+        self.sparqlconcurrent = sparqlconcurrent if sparqlconcurrent else max(1, threads // 2)
+        self.sparqlqueue = sparqlqueue
+        self.start_executor()
+        if renderprocesses and "forkserver" not in multiprocessing.get_all_start_methods():
+            print("WARNING: HTML render processes require a fork server which is not available on this platform, rendering in threads instead",file=sys.stderr)
+            renderprocesses = 0
+        self.renderprocesses = renderprocesses
+        self.renderpool = None #(generation, process pool) for HTML rendering, it is only used for the generation it was started for
+        self.renderpool_lock = threading.Lock()
+        self.cache = RenderCache(maxentries=cacheentries, maxsize=cachesize * 1024 * 1024)
+        self.dumps = DumpStore(self, dumpdir)
+        self.pagestore = PageStore(self, prerenderdir, prerenderprocesses) if prerenderdir else None
+        self.validation = ValidationStore(self, shacl, validationprocesses if validationprocesses else (os.cpu_count() or 1))
+        self.views = ViewStore(self)
+        self.serverside = True #set to False when exporting a static site
+        self.graphfile = graph
+        self.snapshotdir = snapshotdir
+        self.store = store
+        self.inputlogdir = kwargs.get('inputlogdir')
+        self.logstore = LogStore(self.inputlogdir, threads) if self.inputlogdir else None
+        self.logwatchinterval = logwatchinterval
+        self.reloadinterval = reloadinterval
+        self.admintoken = admintoken
+        self.searchpredicates = searchpredicates if searchpredicates else DEFAULT_PREDICATES
+        self.searchlimit = searchlimit
+        self.facets = { key: [ expand_prefixed(x) for x in key.split("/") ] for key in (facets if facets else DEFAULT_FACETS) }
+        self.pagesize = pagesize
+        self.redirectmaxage = redirectmaxage
+        self.workers = workers
+        self.workerstatsinterval = workerstatsinterval
+        self.slowrequests = slowrequests
+        self.cachecontrol = cachecontrol
+        self.vary = vary
+        self.batchlimit = batchlimit
+        self.sparql = QueryRunner(self, sparqltimeout, sparqlmaxrows)
+        self.metrics = ServerMetrics(self)
+        self.reload_lock = threading.Lock()
+        self.reloading = False
+        self.reloadpending = False
+        self.update_lock = threading.Lock() #held while a new state is published
+        #a graph in a persistent store is changed in place, while no requests are reading it
+        self.graphlock = ReadWriteLock() if store else None
+        self.writehook: Optional[Callable] = None #called before a graph in a store is changed in place (the master stops the workers reading it)
+        self.spooldir = None #directory where workers queue updates for the master
+        self.masterpid = None #set when running as a worker process, the master process handles reloads
+        self.generations = 0
+        self.graphstate = None
+        self.progress = LoadProgress()
+        self.loadinbackground = loadinbackground #if set, the graph is loaded once the application starts, rather than here
+        if not loadinbackground:
+            state = self.load_state(self.progress)
+            self.generations += 1
+            state.generation = self.generations
+            self.graphstate = state
+            self.progress.finish()
         # Instantiate FastAPI
         super().__init__(
-            title=title, description=description, version=version,
+            title=title, description=description, version=version, lifespan=self.lifespan,
         )
+        self.add_exception_handler(Overloaded, self.handle_overloaded)
+        if self.graphlock is not None:
+            self.add_middleware(ReadLockMiddleware, lock=self.graphlock, exempt=ALWAYS_AVAILABLE + ("/admin/",))
+        self.add_middleware(ReadinessMiddleware, server=self)
+        self.add_middleware(MetricsMiddleware, server=self)
+        if self.graphstate is not None:
+            self.build_in_background(self.graphstate)
 
-        #Instantiate sub API for SPARQL endpoint
-        subapi = SparqlEndpoint(
-            graph=self.graph,
-            title="Codemeta Server SPARQL endpoint",
-            description="A SPARQL endpoint to serve software metadata using codemeta and schema.org\n[Source code](https://github.com/proycon/codemeta-server/)",
-            version=VERSION,
-            public_url=urijoin(self.baseurl,"api/"),
-            path="/",
-            cors_enabled=True,
-            example_query="""PREFIX rdf: <http://www.w3.org/1999/02/22-rdf-syntax-ns#>
-PREFIX rdfs: <http://www.w3.org/2000/01/rdf-schema#>
-PREFIX schema: <http://schema.org/>
-PREFIX codemeta: <https://codemeta.github.io/terms/>
-PREFIX softwaretypes: <https://w3id.org/software-types#>
-PREFIX softwareiodata: <https://w3id.org/software-iodata#>
-PREFIX trl: <https://w3id.org/research-technology-readiness-levels#>
-PREFIX repostatus: <https://www.repostatus.org/#>
-PREFIX nwo: <https://w3id.org/nwo-research-fields#>
-PREFIX tadirah: <https://vocabs.dariah.eu/tadirah/>
-PREFIX spdx: <http://spdx.org/licenses/>
-PREFIX skos: <http://www.w3.org/2004/02/skos/core#>
-
-SELECT ?name ?description ?repo ?status ?license WHERE {
-    ?sub schema:name ?name .
-    ?sub rdf:type schema:SoftwareSourceCode .
-    ?sub schema:license ?license .
-    ?sub codemeta:developmentStatus ?status .
-    ?sub schema:codeRepository ?repo .
-} LIMIT 25
-"""
-        )
-        self.mount("/api/", subapi)
+        #Instantiate sub API for SPARQL endpoint, the wrapper is repointed to a new endpoint whenever the graph is reloaded.
+        #Queries themselves are answered by the query runner (with time and size limits), in a concurrency lane of their own.
+        self.sparqlapp = ThreadedASGIApp(self.make_sparql_endpoint(self.graph if self.graphstate is not None else Graph()), self.sparqllimiter)
+        self.mount("/api/", CORSMiddleware(SparqlApp(self.sparql, self.sparqlapp), allow_origins=["*"], allow_credentials=True, allow_methods=["*"], allow_headers=["*"]))
 
         #Serve static files
         self.mount("/static", StaticFiles(directory=STATIC_DIR))
@@ -147,8 +370,8 @@ SELECT ?name ?description ?repo ?status ?license WHERE {
                       },
                   }
                 )
-        async def index(request: Request, res: Optional[str] = None, q: Optional[str] = None, sparql: Optional[str] = None):
-            return self.get_index(request,res,q,sparql, "cardindex.html", )
+        async def index(request: Request, res: Optional[str] = None, q: Optional[str] = None, sparql: Optional[str] = None, limit: Optional[int] = None, cursor: Optional[str] = None):
+            return await self.respond_index(request,res,q,sparql, "cardindex.html", limit, cursor)
 
 
         @self.get("/services/",
@@ -163,8 +386,8 @@ SELECT ?name ?description ?repo ?status ?license WHERE {
                       },
                   }
                 )
-        async def services(request: Request, res: Optional[str] = None, q: Optional[str] = None, sparql: Optional[str] = None):
-            return self.get_index(request,res,q,sparql, "serviceindex.html", )
+        async def services(request: Request, res: Optional[str] = None, q: Optional[str] = None, sparql: Optional[str] = None, limit: Optional[int] = None, cursor: Optional[str] = None):
+            return await self.respond_index(request,res,q,sparql, "serviceindex.html", limit, cursor)
 
         @self.get("/table/",
                   name="Index",
@@ -181,8 +404,8 @@ SELECT ?name ?description ?repo ?status ?license WHERE {
                       },
                   }
                 )
-        async def table(request: Request, res: Optional[str] = None, q: Optional[str] = None, sparql: Optional[str] = None):
-            return self.get_index(request,res,q,sparql, "tableindex.html")
+        async def table(request: Request, res: Optional[str] = None, q: Optional[str] = None, sparql: Optional[str] = None, limit: Optional[int] = None, cursor: Optional[str] = None):
+            return await self.respond_index(request,res,q,sparql, "tableindex.html", limit, cursor)
 
         @self.get("/data.json",
                   name="Full data download (JSON-LD)",
@@ -197,10 +420,8 @@ SELECT ?name ?description ?repo ?status ?license WHERE {
                       },
                   }
                 )
-        async def data_json():
-            return self.respond( "json",
-                                 self.serialize(None, "json")
-                               )
+        async def data_json(request: Request):
+            return await self.dumps.respond(request, "json")
 
         @self.get("/data.ttl",
                   name="Full data download (Turtle)",
@@ -214,31 +435,187 @@ SELECT ?name ?description ?repo ?status ?license WHERE {
                       },
                   }
                 )
-        async def data_turtle():
-            return self.respond( "turtle",
-                                 self.serialize(None, "turtle")
-                               )
+        async def data_turtle(request: Request):
+            return await self.dumps.respond(request, "turtle")
+
+        @self.get("/data.nt",
+                  name="Full data download (N-Triples)",
+                  description="Returns all data as N-Triples",
+                  responses= {
+                      200: {
+                          "description": "Full dump of the knowledge graph",
+                          "content": {
+                              "application/n-triples": {},
+                          }
+                      },
+                  }
+                )
+        async def data_ntriples(request: Request):
+            return await self.dumps.respond(request, "ntriples")
+
+        @self.get("/facets",
+                  name="Facets",
+                  description="Returns, for each facet, the number of resources per value. If a query is passed (q), only matching resources are counted.",
+                  responses= {
+                      200: {
+                          "description": "Facet counts",
+                          "content": {
+                              "application/json": {},
+                          }
+                      },
+                  }
+                )
+        async def facets(q: Optional[str] = None):
+            return JSONResponse(await self.limiter.run(self.get_facets, q, self.graphstate))
+
+        @self.get("/metrics",
+                  name="Metrics",
+                  description="Returns metrics on requests, rendering, SPARQL queries, caching and the graph in the Prometheus text format",
+                  responses= {
+                      200: {
+                          "description": "Metrics",
+                          "content": {
+                              "text/plain": {},
+                          }
+                      },
+                  }
+                )
+        async def metrics():
+            return Response(content=self.metrics.render(), media_type="text/plain; version=0.0.4; charset=utf-8")
+
+        @self.get("/health/live",
+                  name="Liveness",
+                  description="Returns 200 as long as the server is running, also while the graph is still loading. Returns 503 if loading the graph failed.",
+                  responses= {
+                      200: {
+                          "description": "The server is alive",
+                          "content": {
+                              "application/json": {},
+                          }
+                      },
+                  }
+                )
+        async def health_live():
+            self.progress.refresh()
+            if self.progress.status == "failed" and self.graphstate is None:
+                return JSONResponse({ "status": "failed", "error": self.progress.error }, status_code=503)
+            return JSONResponse({ "status": "alive" })
+
+        @self.get("/health/ready",
+                  name="Readiness",
+                  description="Returns 200 once the graph is loaded and requests can be served, 503 (with Retry-After) while it is still loading. Reports the progress of loading: the current phase and the duration of each phase.",
+                  responses= {
+                      200: {
+                          "description": "The server is ready, along with the timings of the load",
+                          "content": {
+                              "application/json": {},
+                          }
+                      },
+                  }
+                )
+        async def health_ready():
+            self.progress.refresh()
+            report = self.progress.to_dict()
+            if self.graphstate is not None:
+                report["status"] = "ready"
+                report["generation"] = self.generation
+                return JSONResponse(report)
+            if report["status"] == "ready":
+                report["status"] = "loading" #the master is done, this worker is about to be replaced by one that has the graph
+            return JSONResponse(report, status_code=503, headers={ "Retry-After": str(RETRYAFTER) })
+
+        @self.get("/validation/",
+                  name="Validation reports",
+                  description="Returns an overview of the validation reports of all resources with summary statistics, optionally filtered by severity (comma separated list of: violation, warning, info, unknown, none)",
+                  responses= {
+                      200: {
+                          "description": "Overview of the validation reports",
+                          "content": {
+                              "text/html": {},
+                              "application/json": {},
+                          }
+                      },
+                  }
+                 )
+        async def validation_reports(request: Request, severity: Optional[str] = None):
+            output_type = "html" if self.get_output_type(request) == "html" else "json"
+            if severity:
+                severity = [ x.strip().lower() for x in severity.split(",") if x.strip() ]
+                for x in severity:
+                    if x != "none" and x.capitalize() not in SEVERITIES:
+                        return self.respond400(output_type, f"Invalid severity: {x}")
+            return await self.limiter.run(self.respond_validation_reports, output_type, severity)
 
         @self.get("/validation/{resource:path}",
                   name="Validation report",
-                  description="Returns a specific validation log",
+                  description="Returns the validation report of a resource, either by the identifier of the report or that of the resource itself",
                   responses= {
                       200: {
-                          "description": "Visualisation validation log",
+                          "description": "Validation report",
                           "content": {
                               "text/plain": {},
+                              "application/json": {},
                           }
                       },
                   }
                  )
         async def get_validation(resource: str, request: Request):
-            res = URIRef(urijoin(self.baseuri, "validation", resource))
-            if (res,None,None) in self.graph:
-                return self.respond( "text",
-                             get_validation_report(self.graph, res)
-                            )
-            else:
+            state = self.graphstate
+            resource = resource.strip("/")
+            output_type = "json" if self.get_output_type(request) == "json" else "text"
+            report = None
+            if resource:
+                report = self.validation.get(URIRef(urijoin(self.baseuri, "validation", resource)), state) or self.validation.get(URIRef(urijoin(self.baseuri, resource)), state)
+            if report is None:
+                return self.respond404(output_type)
+            headers = { "Cache-Control": self.cachecontrol } if self.cachecontrol else None
+            if output_type == "json":
+                return JSONResponse(report.to_dict(self.get_url(report.resource)), headers=headers)
+            return self.respond("text", report.body, headers)
+
+        @self.get("/logs/{identifier:path}",
+                  name="Harvest log",
+                  description="Returns the harvest log of a resource, byte ranges may be requested to obtain only part of it (e.g. the tail)",
+                  responses= {
+                      200: {
+                          "description": "Harvest log",
+                          "content": {
+                              "text/plain": {},
+                          }
+                      },
+                  }
+                 )
+        async def get_log(identifier: str, request: Request):
+            response = self.logstore.respond(request, identifier.strip("/")) if self.logstore else None
+            if response is None:
                 return self.respond404("text")
+            return response
+
+        @self.post("/batch",
+                  name="Batch",
+                  description="Returns many resources at once. The body is a JSON list of resource paths (versions are resolved as for single resources, e.g. tool, tool/latest, tool/~1.2), or a JSON object with 'resources' and 'format' (json, turtle, ntriples or html). A resource may also be an object with 'resource' and the 'etag' the client has, it is then only returned if it changed. One result per resource is streamed back as JSON Lines, or as a multipart/mixed message if that is accepted.",
+                  responses= {
+                      200: {
+                          "description": "One result per resource",
+                          "content": {
+                              "application/x-ndjson": {},
+                              "multipart/mixed": {},
+                          }
+                      },
+                  }
+                 )
+        async def batch(request: Request, format: Optional[str] = None):
+            try:
+                items, output_type = parse_batch(await request.body(), format, self.batchlimit)
+            except BatchError as e:
+                return JSONResponse({"message": str(e)}, status_code=400)
+            state = self.graphstate
+            await self.limiter.run(self.resolve_batch, items, state)
+            results = process_batch(self, items, output_type, state)
+            if request.headers.get('Accept', "").find("multipart/mixed") != -1:
+                boundary = new_boundary()
+                return StreamingResponse(self.limiter.iterate(chunked(iter_multipart(self, results, output_type, boundary))), media_type=f"multipart/mixed; boundary={boundary}")
+            return StreamingResponse(self.limiter.iterate(chunked(iter_jsonlines(self, results))), media_type="application/x-ndjson")
 
         @self.get("/{resource:path}",
                   name="Resource",
@@ -271,53 +648,756 @@ SELECT ?name ?description ?repo ?status ?license WHERE {
                   }
                  )
         async def get_resource(resource: str, request: Request):
+            suffix = "" #preserved when redirecting to a specific version
             if resource.endswith("data.json"):
                 resource = resource[:-(len("data.json") + 1)]
                 output_type = "json"
+                suffix = "/data.json"
             elif resource.endswith("data.ttl"):
                 resource = resource[:-(len("data.ttl") + 1)]
-                output_type = "ttl"
+                output_type = "turtle"
+                suffix = "/data.ttl"
             elif resource.endswith(".json"):
                 resource = resource[:-5]
                 output_type = "json"
+                suffix = ".json"
             elif resource.endswith(".ttl"):
                 resource = resource[:-4]
-                output_type = "ttl"
+                output_type = "turtle"
+                suffix = ".ttl"
             else:
                 output_type = self.get_output_type(request)
-            res = URIRef(urijoin(self.baseuri, resource))
-            if (res,None,None) in self.graph:
-                return self.respond( output_type,
-                             self.serialize(res, output_type)
-                            )
+            state = self.graphstate
+            validators = state.validators.get((URIRef(urijoin(self.baseuri, resource)), output_type))
+            if validators is not None:
+                #validators are known already, so conditional requests and pre-rendered pages need no worker thread
+                headers = self.caching_headers(*validators)
+                if not_modified(request, *validators):
+                    return Response(status_code=304, headers=headers)
+                if self.pagestore:
+                    filename = self.pagestore.lookup(resource, output_type, state)
+                    if filename:
+                        return self.respond_file(output_type, filename, headers)
+            return await self.limiter.run(self.respond_resource, resource, output_type, state, suffix, request)
+
+        @self.post("/admin/reload",
+                  name="Reload",
+                  description="Reloads the graph from the input file in the background, requires the admin token as bearer token",
+                 )
+        async def admin_reload(request: Request):
+            denied = self.check_admin(request, "Reloading via the API is disabled, no admin token configured")
+            if denied:
+                return denied
+            self.trigger_reload()
+            return JSONResponse({"message": "Reload started", "generation": self.generation}, status_code=202)
+
+        @self.put("/admin/resources/{resource:path}",
+                  name="Put resource",
+                  description="Adds or replaces a single resource (identifier/version) by the codemeta record (JSON-LD) in the body, without reloading the graph. Requires the admin token as bearer token.",
+                 )
+        async def admin_put_resource(request: Request, resource: str):
+            denied = self.check_admin(request, "Updating via the API is disabled, no admin token configured")
+            if denied:
+                return denied
+            data = await request.body()
+            try:
+                return await asyncio.get_running_loop().run_in_executor(self.updater, self.update_resource, resource.strip("/"), data)
+            except IngestError as e:
+                return JSONResponse({"message": str(e)}, status_code=400)
+
+        @self.delete("/admin/resources/{resource:path}",
+                  name="Delete resource",
+                  description="Removes a single resource (identifier/version) from the graph, without reloading it. Requires the admin token as bearer token.",
+                 )
+        async def admin_delete_resource(request: Request, resource: str):
+            denied = self.check_admin(request, "Updating via the API is disabled, no admin token configured")
+            if denied:
+                return denied
+            try:
+                return await asyncio.get_running_loop().run_in_executor(self.updater, self.update_resource, resource.strip("/"), None)
+            except IngestError as e:
+                return JSONResponse({"message": str(e)}, status_code=400)
+
+
+    def check_admin(self, request: Request, disabledmessage: str) -> Optional[Response]:
+        """Checks the admin token of a request to the administrative API, returns the response to refuse it with (if any)"""
+        if not self.admintoken:
+            return JSONResponse({"message": disabledmessage}, status_code=403)
+        authorization = request.headers.get('Authorization', "")
+        if not hmac.compare_digest(authorization.encode('utf-8'), f"Bearer {self.admintoken}".encode('utf-8')):
+            return JSONResponse({"message": "Invalid admin token"}, status_code=401)
+        return None
+
+    def make_sparql_endpoint(self, graph: Graph) -> SparqlEndpoint:
+        """Instantiates the sub API for the SPARQL endpoint"""
+        return SparqlEndpoint(
+            graph=graph,
+            title="Codemeta Server SPARQL endpoint",
+            description="A SPARQL endpoint to serve software metadata using codemeta and schema.org\n[Source code](https://github.com/proycon/codemeta-server/)",
+            version=VERSION,
+            public_url=urijoin(self.baseurl,"api/"),
+            path="/",
+            cors_enabled=False, #handled in front of the endpoint
+            example_query="""PREFIX rdf: <http://www.w3.org/1999/02/22-rdf-syntax-ns#>
+PREFIX rdfs: <http://www.w3.org/2000/01/rdf-schema#>
+PREFIX schema: <http://schema.org/>
+PREFIX codemeta: <https://codemeta.github.io/terms/>
+PREFIX softwaretypes: <https://w3id.org/software-types#>
+PREFIX softwareiodata: <https://w3id.org/software-iodata#>
+PREFIX trl: <https://w3id.org/research-technology-readiness-levels#>
+PREFIX repostatus: <https://www.repostatus.org/#>
+PREFIX nwo: <https://w3id.org/nwo-research-fields#>
+PREFIX tadirah: <https://vocabs.dariah.eu/tadirah/>
+PREFIX spdx: <http://spdx.org/licenses/>
+PREFIX skos: <http://www.w3.org/2004/02/skos/core#>
+
+SELECT ?name ?description ?repo ?status ?license WHERE {
+    ?sub schema:name ?name .
+    ?sub rdf:type schema:SoftwareSourceCode .
+    ?sub schema:license ?license .
+    ?sub codemeta:developmentStatus ?status .
+    ?sub schema:codeRepository ?repo .
+} LIMIT 25
+"""
+        )
+
+    @asynccontextmanager
+    async def lifespan(self, app):
+        """Starts loading the graph (if that is done in the background) and sets up graph reloading (file watching and SIGHUP) and log watching for the lifetime of the application"""
+        if self.graphstate is None and not self.masterpid:
+            threading.Thread(target=self.load_initial, name="codemeta-server-load", daemon=True).start()
+        tasks = []
+        if self.reloadinterval:
+            tasks.append(asyncio.create_task(self.watch_graph()))
+        if self.logstore and self.logwatchinterval:
+            tasks.append(asyncio.create_task(self.watch_logs()))
+        if hasattr(signal, "SIGHUP"):
+            try:
+                asyncio.get_running_loop().add_signal_handler(signal.SIGHUP, self.trigger_reload)
+            except (NotImplementedError, RuntimeError, ValueError):
+                pass #not supported on this platform or not running in the main thread
+        yield
+        for task in tasks:
+            task.cancel()
+
+    async def handle_overloaded(self, request: Request, exc: Overloaded) -> Response:
+        return self.respond503(self.get_output_type(request), "Server is too busy, please try again later")
+
+    async def respond_index(self, request: Request, res: Optional[str], q: Optional[str], sparql: Optional[str], indextemplate: str, limit: Optional[int], cursor: Optional[str]) -> Response:
+        """Responds to a request for an index. An unfiltered index in JSON-LD or Turtle is simply the full dump of the knowledge graph.
+        Indices are valid for a single generation of the graph, conditional requests are answered before anything is serialized."""
+        state = self.graphstate
+        output_type = self.get_output_type(request)
+        if not (res or q or sparql or limit or cursor or self.pagesize) and output_type in ("json", "turtle"):
+            return await self.dumps.respond(request, output_type)
+        etag = "W/\"" + hashlib.sha256(f"{state.loadtime}\0{state.generation}\0{indextemplate}\0{output_type}\0{request.url.query}".encode('utf-8')).hexdigest()[:32] + "\""
+        headers = self.caching_headers(etag, state.loadtime)
+        if not_modified(request, etag, state.loadtime):
+            return Response(status_code=304, headers=headers)
+        if not (res or q or sparql or limit or cursor or self.pagesize) and output_type == "html":
+            page = self.views.page(indextemplate, state)
+            if page is not None:
+                return self.respond(output_type, page, headers)
+            if self.pagestore:
+                filename = self.pagestore.lookup_index(indextemplate, state)
+                if filename:
+                    return self.respond_file(output_type, filename, headers)
+        response = await self.limiter.run(self.get_index, request,res,q,sparql, indextemplate, state=state, limit=limit, cursor=cursor)
+        if response.status_code == 200:
+            response.headers.update(headers)
+        return response
+
+    def respond_resource(self, resource: str, output_type: str, state: Optional[GraphState] = None, suffix: str = "", request: Optional[Request] = None) -> Response:
+        """Serializes a single resource and returns the response. If the request is passed, conditional requests are answered with 304 Not Modified without serializing anything.
+        Requests without a version, for the latest version or for a version range (e.g. tool/~1.2 or tool/>=2,<3) redirect to the matching version, tool/versions lists all versions."""
+        if state is None: state = self.graphstate
+        identifier = resource.strip("/")
+        if identifier.find("/") > 0:
+            versionless, spec = identifier.rsplit("/",1)
+            if versionless in state.versionmap and (spec in ("latest", "versions") or is_range(spec)):
+                if spec == "versions":
+                    return self.respond_versions(versionless, state)
+                try:
+                    version = state.versionmap.resolve(versionless, spec)
+                except InvalidRange as e:
+                    return self.respond400(output_type, str(e))
+                if version:
+                    return self.redirect_version(versionless, version, suffix)
+                return self.respond404(output_type)
+        res = URIRef(urijoin(self.baseuri, resource))
+        if (res,None,None) in state.graph:
+            validators = self.get_validators(res, output_type, state)
+            headers = self.caching_headers(*validators)
+            if request is not None and not_modified(request, *validators):
+                return Response(status_code=304, headers=headers)
+            if self.pagestore:
+                filename = self.pagestore.lookup(resource, output_type, state)
+                if filename:
+                    return self.respond_file(output_type, filename, headers)
+            return self.respond( output_type,
+                         self.serialize(res, output_type, state=state),
+                         headers
+                        )
+        elif identifier in state.versionmap:
+            #the version qualifier is missing, redirect to the latest version
+            return self.redirect_version(identifier, state.versionmap.latest(identifier), suffix)
+        return self.respond404(output_type)
+
+    def get_validators(self, res: URIRef, output_type: str, state: GraphState) -> Tuple[str, float]:
+        """Returns the ETag and last modification time of the serialization of a resource. The ETag is a hash of everything the serialization
+        is made from: the description of the resource (for HTML, along with those of the other resources in its tool suites and its available
+        versions) and the settings it is rendered with, so it only changes when the output does. The modification time is the load time of the
+        generation in which the ETag last changed (as far as the previous generation knows)."""
+        key = (res, output_type)
+        validators = state.validators.get(key)
+        if validators is None:
+            digest = hashlib.sha256(json.dumps([VERSION, self.title, output_type, self.get_args(output_type)], sort_keys=True, default=str).encode('utf-8'))
+            #blank node labels differ between loads, so they are left out
+            graph = self.describe_page(res, state) if output_type == "html" else self.describe([res], state)
+            triples = sorted(" ".join("_:" if isinstance(term, BNode) else term.n3() for term in triple) for triple in graph)
+            for triple in triples:
+                digest.update(triple.encode('utf-8'))
+                digest.update(b"\n")
+            if output_type == "html":
+                found = state.versionmap.split(res, 2)
+                if found:
+                    digest.update(" ".join(state.versionmap.versions(found[0])).encode('utf-8'))
+            etag = f"\"{digest.hexdigest()[:32]}\""
+            previous = state.previousvalidators.get(key)
+            if previous is not None and previous[0] == etag:
+                lastmodified = previous[1]
+            else:
+                lastmodified = state.loadtime
+            validators = state.validators[key] = (etag, lastmodified)
+        return validators
+
+    def caching_headers(self, etag: Optional[str] = None, lastmodified: Optional[float] = None) -> dict:
+        """Returns the validators and the configured caching headers for a response"""
+        headers = {}
+        if etag:
+            headers["ETag"] = etag
+        if lastmodified:
+            headers["Last-Modified"] = httpdate(lastmodified)
+        if self.cachecontrol:
+            headers["Cache-Control"] = self.cachecontrol
+        if self.vary:
+            headers["Vary"] = self.vary
+        return headers
+
+    def respond_validation_reports(self, output_type: str, severity: Optional[List[str]] = None) -> Response:
+        """Serves the overview of the validation reports, from the reports collected for the latest generation"""
+        reports = self.validation.select(severity)
+        if reports is None:
+            return self.respond503(output_type, "Validation reports are still being collected, please try again later", 5)
+        summary = summarize(self.validation.select() if severity else reports)
+        headers = { "Cache-Control": self.cachecontrol } if self.cachecontrol else None
+        if output_type == "html":
+            urls = { report.resource: self.get_url(report.resource) for report in reports }
+            return self.respond("html", render_validation_html(reports, summary, urls, self.title or "Codemeta Server", [ urijoin(self.baseurl, "static", f"codemeta.css?v={VERSION}") ] + self.css, severity), headers)
+        return JSONResponse({
+            "generation": self.validation.generation,
+            "summary": summary,
+            "reports": [ report.to_dict(self.get_url(report.resource)) for report in reports ],
+        }, headers=headers)
+
+    def resolve_batch(self, items: list, state: GraphState):
+        for item in items:
+            resolve_batch_item(self, item, state)
+
+    def get_url(self, res: URIRef) -> str:
+        """Returns the URL under which a resource is served"""
+        if str(res).startswith(self.baseuri):
+            return urijoin(self.baseurl, str(res)[len(self.baseuri):])
+        return str(res)
+
+    def redirect_version(self, identifier: str, version: str, suffix: str = "") -> Response:
+        """Redirects to a specific version of a resource, the redirect may be cached briefly as it changes when new versions are added"""
+        return RedirectResponse(urijoin(self.baseurl, identifier, version) + suffix, status_code=302, headers={ "Cache-Control": f"public, max-age={self.redirectmaxage}" })
+
+    def respond_versions(self, identifier: str, state: GraphState) -> Response:
+        """Lists all versions of a resource, the latest first"""
+        return JSONResponse({
+            "identifier": identifier,
+            "latest": state.versionmap.latest(identifier),
+            "versions": [ { "version": version, "url": urijoin(self.baseurl, identifier, version) } for version in state.versionmap.versions(identifier) ],
+        }, headers={ "Cache-Control": f"public, max-age={self.redirectmaxage}" })
+
+    @property
+    def graph(self) -> Graph:
+        return self.graphstate.graph
+
+    @property
+    def contextgraph(self) -> Graph:
+        return self.graphstate.contextgraph
+
+    @property
+    def versionmap(self) -> VersionIndex:
+        return self.graphstate.versionmap
+
+    @property
+    def generation(self) -> int:
+        return self.graphstate.generation if self.graphstate is not None else 0
+
+    @property
+    def generationtime(self) -> float:
+        return self.graphstate.loadtime
+
+    def load_state(self, progress: Optional[LoadProgress] = None) -> GraphState:
+        """Loads a new generation of the graph (and everything derived from it) from the input file"""
+        begintime = time.time()
+        if progress is None: progress = LoadProgress()
+        state = GraphState(*load_graph(self.graphfile, self.get_args(), self.snapshotdir, self.store, progress))
+        progress.set("triples", len(state.graph))
+        progress.set("resources", len(state.versionmap))
+        if self.inputlogdir:
+            progress.begin("logs")
+            self.read_logs(self.inputlogdir, state)
+        progress.begin("textindex")
+        state.textindex = TextIndex(self.searchpredicates)
+        state.textindex.build(state.graph)
+        progress.begin("facetindex")
+        state.facetindex = FacetIndex(self.facets)
+        state.facetindex.build(state.graph)
+        if not isinstance(state.graph, StoreGraph):
+            progress.begin("descriptions")
+            state.descriptions = SubgraphIndex()
+            state.descriptions.build(state.graph)
+        self.metrics.graph_load_seconds.set(time.time() - begintime)
+        self.metrics.graph_loads.inc()
+        return state
+
+    def load_initial(self, finish: bool = True) -> bool:
+        """Loads the graph for the first time, when that is done in the background. Requests are refused until it is done.
+        Returns whether loading succeeded. If finish is False, the caller marks the end of loading in the progress."""
+        begintime = time.time()
+        print(f"Loading graph from {self.graphfile}",file=sys.stderr)
+        try:
+            self.swap(self.load_state(self.progress))
+        except Exception as e: #pylint: disable=broad-except
+            print(f"Failed to load graph",file=sys.stderr)
+            traceback.print_exc(file=sys.stderr)
+            self.progress.finish(error=str(e) or e.__class__.__name__)
+            return False
+        if finish:
+            self.progress.finish()
+        print(f"Loaded graph (generation {self.generation}) in {time.time() - begintime:.2f}s",file=sys.stderr)
+        return True
+
+    def swap(self, state: GraphState):
+        """Atomically replaces the current state with a new one"""
+        with self.update_lock:
+            self.publish(state)
+
+    def publish(self, state: GraphState, resources: Optional[List[URIRef]] = None):
+        """Makes the state the current one as the next generation, the update lock must be held.
+        If the state was derived from the current one, the (source code) resources that changed are passed so the views are only redone for those."""
+        self.generations += 1
+        state.generation = self.generations
+        if self.graphstate is not None:
+            state.previousvalidators = self.graphstate.validators
+        self.graphstate = state
+        self.invalidate()
+        self.sparqlapp.app = self.make_sparql_endpoint(state.graph)
+        self.build_in_background(state, resources)
+
+    def build_in_background(self, state: GraphState, resources: Optional[List[URIRef]] = None):
+        """Builds everything that is derived from a newly published state in the background"""
+        if self.workers > 1:
+            #the master builds everything before forking the workers (which also start their own render processes)
+            return
+        if self.renderprocesses:
+            self.run_in_background(self.start_renderpool, state)
+        self.dumps.build_in_background()
+        self.validation.build_in_background(resources)
+        self.views.build_in_background(resources)
+        if self.pagestore:
+            self.pagestore.build_in_background()
+
+    def trigger_reload(self):
+        """Reloads the graph in a background thread. If a reload is already in progress, another one follows when it is done."""
+        if self.masterpid:
+            #the master reloads and then replaces all workers
+            os.kill(self.masterpid, signal.SIGHUP)
+            return
+        if self.graphstate is None and self.progress.status == "loading":
+            return #still loading for the first time
+        with self.reload_lock:
+            if self.reloading:
+                self.reloadpending = True
+                return
+            self.reloading = True
+        threading.Thread(target=self.reload, name="codemeta-server-reload", daemon=True).start()
+
+    def reload(self):
+        while True:
+            begintime = time.time()
+            print(f"Reloading graph from {self.graphfile}",file=sys.stderr)
+            try:
+                self.swap(self.load_state())
+                print(f"Reloaded graph (generation {self.generation}) in {time.time() - begintime:.2f}s",file=sys.stderr)
+            except Exception: #pylint: disable=broad-except
+                print(f"Failed to reload graph, continuing with the previous generation",file=sys.stderr)
+                traceback.print_exc(file=sys.stderr)
+            with self.reload_lock:
+                if not self.reloadpending:
+                    self.reloading = False
+                    return
+                self.reloadpending = False
+
+    async def watch_graph(self):
+        """Polls the input file for changes, a reload is triggered once it has changed and is no longer being written to"""
+        laststat = filestat(self.graphfile)
+        pendingstat = None
+        while True:
+            await asyncio.sleep(self.reloadinterval)
+            stat = filestat(self.graphfile)
+            if stat is None or stat == laststat:
+                pendingstat = None
+            elif stat == pendingstat:
+                #unchanged since the previous poll, so writing is finished
+                laststat = stat
+                pendingstat = None
+                self.trigger_reload()
+            else:
+                pendingstat = stat
+
+    async def watch_logs(self):
+        """Polls the log directory for new, changed or removed logs, only the resources whose logs changed are updated"""
+        while True:
+            await asyncio.sleep(self.logwatchinterval)
+            try:
+                await asyncio.get_running_loop().run_in_executor(self.updater, self.update_logs)
+            except Exception: #pylint: disable=broad-except
+                print(f"Failed to update logs",file=sys.stderr)
+                traceback.print_exc(file=sys.stderr)
+
+    def update_logs(self):
+        """Rescans the logs that changed and updates the graph for the affected resources only"""
+        if self.graphstate is None:
+            return #the logs are read along with the graph
+        changed = self.logstore.refresh()
+        if changed:
+            resources = self.update_state(lambda state: [ res for res in (self.annotate_log(identifier, state) for identifier in sorted(changed)) if res is not None ])
+            if resources:
+                print(f"Updated logs of {len(resources)} resources (graph generation {self.generation})",file=sys.stderr)
+
+    def update_state(self, change: Callable[[GraphState], List[URIRef]]) -> List[URIRef]:
+        """Applies a change to a copy of the current state and swaps that in as the next generation, so requests in progress
+        never see a half-changed graph. The change modifies the graph of the state it is passed and returns the (source code)
+        resources it changed, only the indices of those are updated. A graph in a persistent store is changed in place instead,
+        while holding the write lock, so no requests are reading it meanwhile. Returns the changed resources."""
+        with self.update_lock:
+            state = self.graphstate.derive()
+            if isinstance(state.graph, StoreGraph):
+                if self.writehook:
+                    self.writehook()
+                self.stop_renderpool()
+                with self.graphlock.write():
+                    resources = change(state)
+                    if resources:
+                        self.update_indices(state, resources)
+                        state.graph.commit()
+                        update_meta(state.graph, state.versionmap)
+                        self.publish(state, resources)
             else:
-                #if the resource does not exist, a version qualifier may be missing, attempt to find the latest version
-                versions = self.versionmap.get(resource.strip("/"),[])
-                if versions:
-                    res = URIRef(urijoin(self.baseuri, resource,versions[0])) #first version is the latest one
-                    if (res,None,None) in self.graph:
-                        return self.respond( output_type,
-                                     self.serialize(res, output_type)
-                                    )
-            return self.respond404(output_type)
+                resources = change(state)
+                if resources:
+                    self.update_indices(state, resources)
+                    self.publish(state, resources)
+            return resources
+
+    def update_indices(self, state: GraphState, resources: List[URIRef]):
+        """Updates the indices of a derived state for the changed resources only"""
+        state.loadtime = time.time()
+        state.changed = resources
+        state.versionmap.update(state.graph, resources)
+        state.textindex.update(state.graph, resources)
+        state.facetindex.update(state.graph, resources)
+        if state.descriptions is not None:
+            state.descriptions.update(state.graph, resources)
 
+    def update_resource(self, resource: str, data: Optional[bytes]) -> Response:
+        """Adds or replaces (if data is passed) or deletes a single resource, without reloading the graph.
+        Only the indices of the resource are updated, so this takes time in proportion to the size of the record rather than to that of the graph."""
+        res = URIRef(urijoin(self.baseuri, resource))
+        if self.graphstate.versionmap.split(res, 2) is None:
+            raise IngestError("Resources must be addressed by identifier and version, e.g. frog/0.13")
+        record = parse_record(data, res, self.get_args()) if data is not None else None
+        if self.masterpid:
+            #the master process holds the graph, it applies the update and then replaces all workers
+            spool(self.spooldir, "put" if data is not None else "delete", resource, data)
+            os.kill(self.masterpid, signal.SIGUSR1)
+            return JSONResponse({"message": "Update queued", "resource": str(res)}, status_code=202)
+        existed = self.apply_update(res, record)
+        if record is None and not existed:
+            return JSONResponse({"message": "Resource not found", "resource": str(res)}, status_code=404)
+        message = "Resource deleted" if record is None else "Resource replaced" if existed else "Resource added"
+        return JSONResponse({"message": message, "resource": str(res), "generation": self.generation}, status_code=201 if record is not None and not existed else 200)
 
+    def apply_update(self, res: URIRef, record: Optional[Graph]) -> bool:
+        """Replaces (or removes, if no record is passed) the description of a resource, returns whether the resource existed before"""
+        begintime = time.time()
+        if record is None and (res, RDF.type, SDO.SoftwareSourceCode) not in self.graph:
+            return False
+        existed = False
+
+        def change(state: GraphState) -> List[URIRef]:
+            nonlocal existed
+            existed = (res, RDF.type, SDO.SoftwareSourceCode) in state.graph
+            if record is None:
+                if not existed:
+                    return []
+                remove_resource(state.graph, res)
+            else:
+                replace_resource(state.graph, res, record)
+            resources = [res]
+            if self.logstore:
+                #the log annotations were replaced along with the rest of the description
+                found = state.versionmap.split(res, 2)
+                state.versionmap.update(state.graph, [res])
+                if found and found[0] in self.logstore.entries:
+                    logres = self.annotate_log(found[0], state)
+                    if logres is not None and logres != res:
+                        resources.append(logres)
+            return resources
 
+        if not self.update_state(change):
+            return False
+        print(f"{'Deleted' if record is None else 'Updated'} {res} (graph generation {self.generation}) in {time.time() - begintime:.2f}s",file=sys.stderr)
+        return existed
+
+    def apply_spool(self):
+        """Applies the updates queued by worker processes"""
+        for entry in read_spool(self.spooldir):
+            res = URIRef(urijoin(self.baseuri, entry['resource']))
+            try:
+                record = parse_record(entry['record'].encode('utf-8'), res, self.get_args()) if entry['action'] == "put" else None
+                self.apply_update(res, record)
+            except IngestError as e:
+                print(f"Unable to update {res}: {e}",file=sys.stderr)
+
+    def start_executor(self):
+        """(Re)creates the worker threads"""
+        self.executor = ThreadPoolExecutor(max_workers=self.threads, thread_name_prefix="codemeta-server")
+        self.limiter = Limiter(self.executor, self.maxconcurrent, self.maxqueue)
+        #SPARQL queries get threads of their own, so expensive queries can not hold up page rendering
+        self.sparqlexecutor = ThreadPoolExecutor(max_workers=self.sparqlconcurrent, thread_name_prefix="codemeta-server-sparql")
+        self.sparqllimiter = Limiter(self.sparqlexecutor, self.sparqlconcurrent, self.sparqlqueue)
+        #updates are applied one at a time, in a thread of their own so waiting for the graph can not tie up the other threads
+        self.updater = ThreadPoolExecutor(max_workers=1, thread_name_prefix="codemeta-server-update")
+        #everything derived from a new generation of the graph is built in threads of its own, so builds do not take the threads the limiter hands out to requests
+        self.builder = ThreadPoolExecutor(max_workers=BUILDTHREADS, thread_name_prefix="codemeta-server-build")
+        if hasattr(self, "sparqlapp"):
+            self.sparqlapp.limiter = self.sparqllimiter
+
+    def run_in_background(self, func: Callable, *args):
+        """Runs a build in the background, nothing waits for the result so errors are logged"""
+        self.builder.submit(func, *args).add_done_callback(report_failure)
+
+    def wait_idle(self):
+        """Waits until all background work is done, so the process can safely be forked"""
+        executors = (self.executor, self.sparqlexecutor, self.updater, self.builder)
+        self.start_executor()
+        for executor in executors:
+            executor.shutdown(wait=True)
+
+    def after_fork(self, masterpid: int):
+        """Prepares a forked worker process: threads do not survive a fork, and watching for changes is left to the master"""
+        self.masterpid = masterpid
+        self.reloadinterval = 0
+        self.logwatchinterval = 0
+        self.renderpool = None
+        if self.renderprocesses and self.graphstate is not None:
+            #this process has no other threads yet, so it can safely fork its render processes (sharing the graph copy-on-write)
+            self.start_renderpool(self.graphstate, fork=True)
+        self.start_executor()
+        if self.graphstate is not None:
+            reopen(self.graphstate)
+            self.sparqlapp.app = self.make_sparql_endpoint(self.graph)
+
+    def invalidate(self):
+        """Discards everything derived from earlier generations of the graph"""
+        self.cache.clear()
+        with self.renderpool_lock:
+            if self.renderpool is not None:
+                #render processes hold a copy of the old graph
+                self.renderpool[1].shutdown(wait=False)
+                self.renderpool = None
+
+    def stop_renderpool(self):
+        """Stops the HTML render processes and waits until they are gone"""
+        with self.renderpool_lock:
+            renderpool, self.renderpool = self.renderpool, None
+        if renderpool is not None:
+            renderpool[1].shutdown(wait=True)
+
+    def start_renderpool(self, state: GraphState, fork: bool = False):
+        """Starts the processes for HTML rendering of a graph generation. Forking is only safe as long as the process has no
+        other threads, otherwise the processes are started by a fork server and the graph is sent to them, which takes a while
+        for large graphs. Pages are rendered in threads until the processes are ready."""
+        begintime = time.time()
+        if fork:
+            context = multiprocessing.get_context("fork")
+        else:
+            context = multiprocessing.get_context("forkserver")
+            context.set_forkserver_preload([__name__])
+        #render processes read a graph in a store, so it may not be changed until they are registered (and can be stopped by update_state)
+        with self.update_lock if isinstance(state.graph, StoreGraph) and not fork else nullcontext():
+            pool = ProcessPoolExecutor(max_workers=self.renderprocesses, mp_context=context, initializer=_init_render, initargs=(RenderContext(self, state),))
+            try:
+                #starts all processes and waits until they are initialized
+                for future in [ pool.submit(_render_ready) for _ in range(self.renderprocesses) ]:
+                    future.result()
+            except Exception as e: #pylint: disable=broad-except
+                print(f"Unable to start HTML render processes, rendering in threads instead: {e}",file=sys.stderr)
+                pool.shutdown(wait=False)
+                return
+            with self.renderpool_lock:
+                if self.graphstate is not state:
+                    #a newer generation was published in the meantime
+                    pool.shutdown(wait=False)
+                    return
+                self.renderpool = (state.generation, pool)
+        print(f"Started {self.renderprocesses} HTML render processes for graph generation {state.generation} in {time.time() - begintime:.2f}s",file=sys.stderr)
 
-    def serialize(self, res: Union[Optional[URIRef],List[URIRef]], output_type: str, **kwargs) -> str:
+    def render(self, res: Union[Optional[URIRef],List[URIRef]], output_type: str, state: Optional[GraphState] = None, **kwargs) -> str:
+        """Serializes the resource(s), bypassing the cache. Resources are serialized from their descriptions only, rather than from the entire graph."""
+        if state is None: state = self.graphstate
         if output_type == "html":
-             return serialize_to_html(self.graph, res, self.get_args(output_type), contextgraph=self.contextgraph, title=self.title, **kwargs )
+            return RenderContext(self, state).render(res, **kwargs)
+        elif isinstance(res, list):
+            return serialize(self.describe(res, state), None, self.get_args(output_type), contextgraph=state.contextgraph, title=self.title, **kwargs )
+        elif res is not None and output_type == "json":
+            doc = serialize_to_jsonld(self.describe([res], state), res, self.get_args(output_type))
+            #codemetapy only strips its internal context when the description has more than a single node
+            if isinstance(doc.get("@context"), list):
+                doc["@context"] = [ x for x in doc["@context"] if x != DEVIANT_CONTEXT ]
+            return json.dumps(doc, indent=4, ensure_ascii=False, sort_keys=True)
+        elif res is not None:
+            #codemetapy would extract the description from the graph once more for turtle, so the resource is not passed
+            return serialize(self.describe([res], state), None if output_type == "turtle" else res, self.get_args(output_type), contextgraph=state.contextgraph, title=self.title, **kwargs )
         else:
-             return serialize(self.graph, res, self.get_args(output_type), contextgraph=self.contextgraph, title=self.title, **kwargs )
+            return serialize(state.graph, res, self.get_args(output_type), contextgraph=state.contextgraph, title=self.title, **kwargs )
 
+    def describe_page(self, res: URIRef, state: GraphState) -> Graph:
+        """Returns a graph with everything the HTML page of a resource shows: its own description and those of the other resources in its tool suites"""
+        if state.descriptions is not None:
+            page = state.descriptions.get_page(res, state.graph)
+            if page is not None:
+                return page
+        resources = [res] + sorted(set(x for suite in state.graph.objects(res, SDO.applicationSuite) for x in state.graph.subjects(SDO.applicationSuite, suite) if x != res))
+        return extract_subgraph(state.graph, resources)
 
-    def get_index(self, request: Request, res: Optional[str] = None, q: Optional[str] = None, sparql: Optional[str] = None, indextemplate: str  = "cardindex.html"):
+    def describe(self, resources: List[URIRef], state: GraphState) -> Graph:
+        """Returns a new graph with the descriptions of the resources"""
+        if state.descriptions is not None:
+            return state.descriptions.get(resources, state.graph)
+        return extract_subgraph(state.graph, resources)
+
+    def serialize(self, res: Union[Optional[URIRef],List[URIRef]], output_type: str, state: Optional[GraphState] = None, **kwargs) -> str:
+        if state is None: state = self.graphstate
+        with timed("render", self.metrics.serialize_seconds, output_type=output_type, indextemplate=kwargs.get('indextemplate', "")):
+            key = (state.generation, tuple(res) if isinstance(res, list) else res, output_type, tuple(sorted(kwargs.items())))
+            content = self.cache.get(key)
+            renderpool = self.renderpool
+            if content is None and output_type == "html" and renderpool is not None and renderpool[0] == state.generation:
+                try:
+                    content = renderpool[1].submit(_render_html, res, kwargs).result()
+                except (RuntimeError, BrokenProcessPool):
+                    pass #the processes were shut down in the meantime (or died), rendered here instead
+            if content is None:
+                content = self.render(res, output_type, state, **kwargs)
+                self.cache.set(key, content)
+            return content
+
+
+    def stream(self, res: Optional[List[URIRef]], output_type: str, state: Optional[GraphState] = None) -> Iterator[bytes]:
+        """Serializes the resources, or the entire graph if None, incrementally. Returns a generator of chunks."""
+        if state is None: state = self.graphstate
+        if output_type == "json" and res is None and not self.is_partitioned(state):
+            #the graph holds more than the descriptions of its resources, or they share blank nodes, so it is serialized as a whole
+            pieces = ( self.render(None, output_type, state) for _ in range(1) )
+        elif output_type == "json":
+            pieces = iter_jsonld(res if res is not None else self.get_catalogue(state), lambda x: self.render([x], output_type, state))
+        elif output_type in ("turtle", "ntriples"):
+            serializer = iter_turtle if output_type == "turtle" else iter_ntriples
+            if res is None:
+                pieces = serializer(state.graph)
+            else:
+                pieces = ( piece for x in res for piece in serializer(self.describe([x], state)) )
+        else:
+            raise ValueError(f"Streaming is not supported for output type {output_type}")
+        return chunked(pieces)
+
+    def is_partitioned(self, state: GraphState) -> bool:
+        """Returns whether every triple of the graph is in the description of one of the (source code) resources, and no blank
+        node is in more than one description. Only then is a full JSON-LD dump the same graph when it is made of the
+        serializations of the resources one by one."""
+        if state.partitioned is None:
+            catalogue = set(self.get_catalogue(state))
+            if state.descriptions is not None:
+                nodes = { node: [ res for res in resources if res in catalogue ] for node, resources in state.descriptions.nodes.items() }
+            else:
+                nodes = defaultdict(list)
+                for res in catalogue:
+                    for node in set(s for s, _, _ in iter_description(state.graph, [res])):
+                        nodes[node].append(res)
+            state.partitioned = all(nodes.get(s) and (len(nodes[s]) == 1 or not isinstance(s, BNode)) for s in state.graph.subjects(unique=True))
+            if not state.partitioned:
+                print("The graph holds triples outside of the descriptions of its resources, full JSON-LD dumps serialize it as a whole",file=sys.stderr)
+        return state.partitioned
+
+    def get_index(self, request: Request, res: Optional[str] = None, q: Optional[str] = None, sparql: Optional[str] = None, indextemplate: str  = "cardindex.html", state: Optional[GraphState] = None, limit: Optional[int] = None, cursor: Optional[str] = None):
+        """Serializes an index of resources. If a limit is passed (or a page size is configured), only one page of the resources is serialized, further pages are obtained by passing the returned cursor"""
+        if state is None: state = self.graphstate
         output_type = self.get_output_type(request)
+        searched = bool(q or sparql)
+        if not limit:
+            limit = self.pagesize
+        try:
+            offset = decode_cursor(cursor) if cursor else 0
+        except ValueError:
+            return self.respond400(output_type, "Invalid cursor")
         if q:
-            sparql = self.formulate_query(q)
-        if res: res = [ URIRef(self.baseuri + x) for x in res.split(";") ]
+            with timed("query"):
+                matches, sparql = self.search(q, state)
+            if matches is not None:
+                res = matches
+        elif res:
+            res = [ URIRef(self.baseuri + x) for x in res.split(";") ]
+        if sparql:
+            record_sparql(sparql)
+        services = indextemplate == "serviceindex.html" and output_type == "html"
+        if services and isinstance(res, list):
+            #the service index only shows resources that provide a service, the others need not be rendered
+            res = self.views.get(state).select_services(res)
+        nextcursor = None
+        total = None
         try:
-            response = self.serialize(res, output_type, sparql_query=sparql, indextemplate=indextemplate, q=q if q else "")
+            if limit > 0 or offset > 0:
+                if not isinstance(res, list):
+                    if sparql:
+                        res = self.query_resources(sparql, state)
+                        if services:
+                            res = self.views.get(state).select_services(res)
+                    else:
+                        res = self.views.get(state).services if services else self.get_catalogue(state)
+                    sparql = None
+                total = len(res)
+                if limit > 0:
+                    if offset + limit < total:
+                        nextcursor = encode_cursor(offset + limit)
+                    res = res[offset:offset+limit]
+                else:
+                    res = res[offset:]
+            elif output_type in ("json", "turtle"):
+                if not isinstance(res, list) and sparql:
+                    res = self.query_resources(sparql, state)
+                    sparql = None
+                if isinstance(res, list) and len(res) > STREAM_THRESHOLD:
+                    return self.respond_stream(output_type, Primed(self.stream(res, output_type, state)))
+            kwargs = { "heading": SEARCH_HEADING } if searched and output_type == "html" and isinstance(res, list) else {}
+            response = self.serialize(res, output_type, state, sparql_query=sparql, indextemplate=indextemplate, q=q if q else "", **kwargs)
         except Exception as e:
             msg = str(e)
             if sparql: msg += f"<pre>SPARQL query was: {sparql}\n</pre>"
@@ -325,7 +1405,16 @@ SELECT ?name ?description ?repo ?status ?license WHERE {
             msg += "<pre>" + "\n".join(traceback.format_exception(exc_type, exc_value, exc_traceback)) + "</pre>"
             print(msg,file=sys.stderr)
             return self.respond400( output_type, msg)
-        return self.respond( output_type, response)
+        if total is None:
+            return self.respond( output_type, response)
+        headers = { "X-Total-Count": str(total) }
+        if nextcursor:
+            params = dict(request.query_params)
+            params.update(limit=str(limit), cursor=nextcursor)
+            nexturl = urijoin(self.baseurl, request.url.path.lstrip("/")) + "?" + urlencode(params)
+            headers["Link"] = f"<{nexturl}>; rel=\"next\""
+            response = add_next_link(response, output_type, nexturl)
+        return self.respond( output_type, response, headers)
 
     def get_args(self, output_type: str = "json") -> AttribDict:
         return AttribDict({
@@ -335,7 +1424,7 @@ SELECT ?name ?description ?repo ?status ?license WHERE {
             "graph": True,
             "output": output_type,
             "buildsite": True,
-            "serverside": True,
+            "serverside": self.serverside,
             "no_cache": False,
             "includecontext": self.includecontext,
             "addcontext": self.addcontext,
@@ -344,15 +1433,39 @@ SELECT ?name ?description ?repo ?status ?license WHERE {
             "css": [ f"codemeta.css?v={VERSION}" , f"fontawesome.css?v={VERSION}" ] + self.css #cache busting
         })
 
-    def respond(self, output_type: str, content: Union[str,bytes, None]) -> Response:
+    def respond(self, output_type: str, content: Union[str,bytes, None], headers: Optional[dict] = None) -> Response:
         if content is None: content = ""
+        if isinstance(content, str):
+            with timed("encode"):
+                content = content.encode('utf-8')
+        if output_type == 'json':
+            return Response( content=content, media_type="application/json+ld", headers=headers)
+        elif output_type == "turtle":
+            return Response( content=content, media_type="text/turtle", headers=headers)
+        elif output_type == "html":
+            return Response( content=content, media_type="text/html", headers=headers)
+        return Response( content=content, media_type="text/plain", headers=headers)
+
+    def respond_stream(self, output_type: str, chunks: Iterator[bytes], headers: Optional[dict] = None) -> Response:
+        """Streams a response as it is being serialized, serialization stops if the client disconnects"""
+        content = self.limiter.iterate(chunks)
+        if output_type == 'json':
+            return StreamingResponse( content=content, media_type="application/json+ld", headers=headers)
+        elif output_type == "turtle":
+            return StreamingResponse( content=content, media_type="text/turtle", headers=headers)
+        elif output_type == "ntriples":
+            return StreamingResponse( content=content, media_type="application/n-triples", headers=headers)
+        return StreamingResponse( content=content, media_type="text/plain", headers=headers)
+
+    def respond_file(self, output_type: str, filename: str, headers: Optional[dict] = None) -> Response:
+        """Serves pre-rendered output from disk"""
         if output_type == 'json':
-            return Response( content=content, media_type="application/json+ld")
+            return FileResponse(filename, media_type="application/json+ld", headers=headers)
         elif output_type == "turtle":
-            return Response( content=content, media_type="text/turtle")
+            return FileResponse(filename, media_type="text/turtle", headers=headers)
         elif output_type == "html":
-            return Response( content=content, media_type="text/html")
-        return Response( content=content, media_type="text/plain")
+            return FileResponse(filename, media_type="text/html", headers=headers)
+        return FileResponse(filename, media_type="text/plain", headers=headers)
 
     def respond404(self, output_type: str) -> Response:
         if output_type == 'json':
@@ -363,6 +1476,25 @@ SELECT ?name ?description ?repo ?status ?license WHERE {
             return Response(status_code=404, content="<html><body><strong>404</strong> - Not Found - Resource does not exist</body></html>", media_type="text/html")
         return Response(status_code=404, content="404 Not Found - Resource does not exist", media_type="text/plain")
 
+    def respond503(self, output_type: str, message: str, retryafter: int = 1) -> Response:
+        headers = { "Retry-After": str(retryafter) }
+        if output_type == 'json':
+            return Response(status_code=503, content=json.dumps({"message": message}), media_type="application/json", headers=headers)
+        elif output_type == "turtle":
+            return Response(status_code=503, content="", media_type="text/turtle", headers=headers)
+        elif output_type == "html":
+            return Response(status_code=503, content=f"<html><body><strong>503</strong> - Service Unavailable - {message}</body></html>", media_type="text/html", headers=headers)
+        return Response(status_code=503, content=f"503 Service Unavailable - {message}", media_type="text/plain", headers=headers)
+
+    def respond500(self, output_type: str, message: str) -> Response:
+        if output_type == 'json':
+            return Response(status_code=500, content=json.dumps({"message": message}), media_type="application/json")
+        elif output_type == "turtle":
+            return Response(status_code=500, content="", media_type="text/turtle")
+        elif output_type == "html":
+            return Response(status_code=500, content=f"<html><body><strong>500</strong> - Internal Server Error - {message}</body></html>", media_type="text/html")
+        return Response(status_code=500, content=f"500 Internal Server Error - {message}", media_type="text/plain")
+
     def respond400(self, output_type: str, message: str) -> Response:
         if output_type == 'json':
             return Response(status_code=400, content=json.dumps({"message": message}), media_type="application/json")
@@ -374,39 +1506,120 @@ SELECT ?name ?description ?repo ?status ?license WHERE {
 
     def get_output_type(self, request: Request) -> str:
         """Get the outputtype based on content negotiation"""
-        accept = request.headers.get('Accept')
-        if accept:
-            accept = accept.split(",")
-            ordered = []
-            for item in accept:
-                item = item.split(";")
-                q = 1.0
-                if len(item) > 1:
-                    if item[1].startswith("q="):
-                        try:
-                            q = float(item[1][2:])
-                        except ValueError:
-                            q = 1.0
-                ordered.append( (item[0],q) )
-
-            #sort by q value
-            ordered.sort(key=lambda x: -1 * x[1])
-
-            for item, _q in ordered:
-                if item.find("html") != -1:
-                    return "html"
-                elif item.find("json") != -1:
-                    return "json"
-                elif item.find("turtle") != -1:
-                    return "turtle"
-                elif item.find("rdf+") or item.find("text/n3"):
-                    #For a bunch of RDF types which we don't support, we just return turtle instead
-                    return "turtle"
-        return "html"
-
-    def formulate_query(self, q: str, restype="schema:SoftwareSourceCode"):
-        """Translate a query from a simpler less-formalised syntax to SPARQL"""
+        with timed("negotiate"):
+            accept = request.headers.get('Accept')
+            if accept:
+                accept = accept.split(",")
+                ordered = []
+                for item in accept:
+                    item = item.split(";")
+                    q = 1.0
+                    if len(item) > 1:
+                        if item[1].startswith("q="):
+                            try:
+                                q = float(item[1][2:])
+                            except ValueError:
+                                q = 1.0
+                    ordered.append( (item[0],q) )
+
+                #sort by q value
+                ordered.sort(key=lambda x: -1 * x[1])
+
+                for item, _q in ordered:
+                    if item.find("html") != -1:
+                        return "html"
+                    elif item.find("json") != -1:
+                        return "json"
+                    elif item.find("turtle") != -1:
+                        return "turtle"
+                    elif item.find("rdf+") or item.find("text/n3"):
+                        #For a bunch of RDF types which we don't support, we just return turtle instead
+                        return "turtle"
+            return "html"
+
+    def search(self, q: str, state: Optional[GraphState] = None) -> Tuple[Optional[List[URIRef]], Optional[str]]:
+        """Resolves a query in the simple query syntax. Free-text clauses are resolved using the full-text index, exact and disjunctive clauses on facets using the facet index, other clauses are translated to SPARQL.
+        Returns either a list of matching resources (ranked by relevance) or a SPARQL query."""
+        if state is None: state = self.graphstate
+        textclauses = []
+        otherclauses = []
+        candidates = None
+        for clause in q.split(';'):
+            if clause.find('=') > 0:
+                key, value = clause.split('=',1)
+                key = key.strip()
+                value = value.strip()
+                exact = value.startswith('=')
+                if exact:
+                    value = value[1:]
+                if (exact or value.find('|') > 0) and key in state.facetindex:
+                    matches = state.facetindex.lookup(key, [ parse_value(x.strip()) for x in value.split('|') ])
+                    candidates = matches if candidates is None else candidates & matches
+                else:
+                    otherclauses.append(clause)
+            elif clause.strip():
+                textclauses.append(clause.strip())
+        ranked = state.textindex.search(" ".join(textclauses))
+        if ranked is None and textclauses:
+            #free text without any searchable terms (e.g. only punctuation) matches nothing, rather than everything
+            ranked = []
+        if ranked is not None:
+            ranked = [ res for res, _ in ranked if candidates is None or res in candidates ]
+            if not otherclauses:
+                ranked = ranked[:self.searchlimit]
+        elif candidates is not None:
+            ranked = self.views.get(state).order(candidates)
+        if not otherclauses or ranked == []:
+            return ranked, None
+        return None, self.formulate_query(";".join(otherclauses), candidates=ranked)
+
+    def get_catalogue(self, state: GraphState) -> List[URIRef]:
+        """Returns all resources in the order in which the index presents them (grouped and by label)"""
+        return self.views.get(state).catalogue
+
+    def query_resources(self, sparql: str, state: GraphState) -> List[URIRef]:
+        """Returns the resources matching a SPARQL query (with a ?res variable), in a stable order (by label)"""
+        with timed("query", self.metrics.sparql_seconds, source="index"):
+            return [ res for res, _ in sorted(query(self.sparql.graph(state), sparql), key=lambda x: (str(x[1]).lower(), str(x[0]))) ]
+
+    def get_facets(self, q: Optional[str] = None, state: Optional[GraphState] = None) -> dict:
+        """Returns the facet counts, restricted to the resources matching the query (if any)"""
+        if state is None: state = self.graphstate
+        resources = None
+        if q:
+            with timed("query"):
+                matches, sparql = self.search(q, state)
+            if sparql:
+                record_sparql(sparql)
+                with timed("query", self.metrics.sparql_seconds, source="index"):
+                    resources = set(row.res for row in self.sparql.graph(state).query(sparql))
+            elif matches is not None:
+                resources = set(matches)
+        counts = state.facetindex.counts(resources)
+        facets = {}
+        for key, valuecounts in counts.items():
+            facets[key] = [ { "value": compact_prefixed(value) if isinstance(value, URIRef) else str(value), "label": self.get_label(value, state), "count": count }
+                            for value, count in sorted(valuecounts.items(), key=lambda x: (-x[1], str(x[0]))) ]
+        return {
+            "total": len(resources) if resources is not None else len(state.facetindex.resources()),
+            "facets": facets,
+        }
+
+    def get_label(self, value, state: GraphState) -> str:
+        if isinstance(value, URIRef):
+            for g in (state.graph, state.contextgraph):
+                for predicate in (SDO.name, RDFS.label, SKOS.prefLabel):
+                    label = g.value(value, predicate)
+                    if label:
+                        return str(label)
+            return get_last_component(str(value))
+        return str(value)
+
+    def formulate_query(self, q: str, restype="schema:SoftwareSourceCode", candidates: Optional[List[URIRef]] = None):
+        """Translate a query from a simpler less-formalised syntax to SPARQL. If candidates are passed, the results are constrained to those resources."""
         conditions = []
+        if candidates is not None:
+            conditions.append("VALUES ?res { " + " ".join(res.n3() for res in candidates) + " }")
         for clause in q.split(';'): #semicolon splits queries (conjunctive)
             if clause.find('=') > 0:
                 key, value = clause.split('=',1)
@@ -421,10 +1634,10 @@ SELECT ?name ?description ?repo ?status ?license WHERE {
                     for value in value.split('|'): #disjunction
                         if not (value.startswith(NSPREFIXES) or value.isnumeric()):
                             value = f"\"{value}\"" #string literal
-                        values.append(f"{value} .")
+                        values.append(value)
                     if values:
                         i = len(conditions) + 1
-                        conditions.append("{{ VALUES ?values{i} {{ " + ", ".join(values)  + f" }} ?res {key} ?values{i}.")
+                        conditions.append(f"VALUES ?values{i} {{ " + " ".join(values)  + f" }} ?res {key} ?values{i} .")
                 else:
                     if not (value.startswith(NSPREFIXES) or value.isnumeric()):
                         value = f"\"{value}\"" #string literal
@@ -450,57 +1663,177 @@ SELECT ?name ?description ?repo ?status ?license WHERE {
         }}
         """
 
-    def read_logs(self, inputlogdir: str):
-        """Add information from the logs directly to the graph using an internal namespace"""
-        for logfile in glob.glob(os.path.join(inputlogdir,"*.harvest.log")):
-            identifier = os.path.basename(logfile).split(".")[0]
-            res = URIRef(self.baseuri + identifier)
-            if not (res,RDF.type,SDO.SoftwareSourceCode) in self.graph:
-                versions = self.versionmap.get(identifier,[])
-                if versions:
-                    res = URIRef(urijoin(self.baseuri, identifier,versions[0])) #first version is the latest one
-                    if not (res,RDF.type,SDO.SoftwareSourceCode) in self.graph:
-                        print(f"Log {logfile} describes non-existing resource {res}",file=sys.stderr)
-                        return
-            errors = 0
-            with open(logfile,'r',encoding='utf-8') as f:
-                logdata = f.readlines()
-                for line in logdata:
-                    if line.lower().find("harvester error") != -1:
-                        errors += 1
-                self.graph.set((res, CODEMETAPY.errors, Literal(errors)))
-                self.graph.set((res, CODEMETAPY.log, Literal("\n".join(logdata))))
+    def read_logs(self, inputlogdir: str, state: GraphState):
+        """Add information from the logs directly to the graph of a state that is being loaded, using an internal namespace.
+        The logs themselves stay on disk (served via /logs/), the graph only holds the number of errors and a summary with the first error lines."""
+        if self.logstore is None or self.logstore.logdir != inputlogdir:
+            self.logstore = LogStore(inputlogdir)
+        begintime = time.time()
+        self.logstore.refresh() #only logs that are new or changed are (re)scanned
+        for identifier in list(self.logstore.entries):
+            self.annotate_log(identifier, state)
+        print(f"Read {len(self.logstore)} logs in {time.time() - begintime:.2f}s",file=sys.stderr)
+
+    def get_log_resource(self, identifier: str, state: GraphState) -> Optional[URIRef]:
+        """Returns the resource a log describes: the resource with the identifier or otherwise its latest version"""
+        res = URIRef(self.baseuri + identifier)
+        if (res,RDF.type,SDO.SoftwareSourceCode) in state.graph:
+            return res
+        version = state.versionmap.latest(identifier)
+        if version:
+            res = URIRef(urijoin(self.baseuri, identifier,version))
+            if (res,RDF.type,SDO.SoftwareSourceCode) in state.graph:
+                return res
+        return None
+
+    def annotate_log(self, identifier: str, state: GraphState) -> Optional[URIRef]:
+        """Sets the error count and log summary of a resource in the graph of a state that is not published yet (or removes them if the log is gone), returns the resource"""
+        res = self.get_log_resource(identifier, state)
+        if res is None:
+            print(f"Log {identifier}.harvest.log describes non-existing resource",file=sys.stderr)
+            return None
+        entry = self.logstore.get(identifier)
+        if entry is None:
+            state.graph.remove((res, CODEMETAPY.errors, None))
+            state.graph.remove((res, CODEMETAPY.log, None))
+            return res
+        summary = f"The full harvest log is available at {urijoin(self.baseurl, 'logs', identifier)}"
+        if entry.excerpt:
+            summary += "\n\n" + "\n".join(entry.excerpt)
+            if entry.errors > len(entry.excerpt):
+                summary += f"\n(and {entry.errors - len(entry.excerpt)} more errors)"
+        state.graph.set((res, CODEMETAPY.errors, Literal(entry.errors)))
+        state.graph.set((res, CODEMETAPY.log, Literal(summary)))
+        return res
 
     def build_versionmap(self):
-        self.versionmap = defaultdict(list)
-        for s,_,_ in self.graph.triples((None,RDF.type,SDO.SoftwareSourceCode)):
-            if str(s).startswith(self.baseuri):
-                components = str(s)[len(self.baseuri):].strip("/").split("/")
-                if len(components) == 2:
-                    name, version = components
-                    print(f"Versionmap: adding SofwareSourceCode {name} with version {version}",file=sys.stderr)
-                    self.versionmap[name].append(version)
-        targetapps = set()
-        for _,_, o in self.graph.triples((None,CODEMETA.isSourceCodeOf,None)):
-            if str(o).startswith(self.baseuri) and o not in targetapps:
-                targetapps.add(o) #prevents duplicates
-                components = str(o)[len(self.baseuri):].strip("/").split("/")
-                if len(components) == 3:
-                    interfacetype, name, version = components
-                    print(f"Versionmap: adding {interfacetype} {name} with version {version}",file=sys.stderr)
-                    self.versionmap[interfacetype + "/" + name].append(version)
-        
-        for key, versions in self.versionmap.items():
-            self.versionmap[key] = sorted(versions, key=lambda x: Version(re.sub("^v","", x))._key if validversion(x) else (9999,0,0,0,0,0), reverse=True)
-
-def validversion(s: str) -> bool:
+        self.graphstate.versionmap = build_versionmap(self.graph, self.baseuri)
+
+def build_versionmap(graph: Graph, baseuri: str) -> VersionIndex:
+    """Builds the index of all versions of all SoftwareSourceCode resources and their target products"""
+    versionmap = VersionIndex(baseuri)
+    versionmap.build(graph)
+    print(f"Indexed versions of {len(versionmap)} resources",file=sys.stderr)
+    return versionmap
+
+def load_graph(graphfile: str, args: AttribDict, snapshotdir: Optional[str] = None, store: Optional[str] = None, progress: Optional[LoadProgress] = None) -> Tuple[Graph, Graph, VersionIndex]:
+    """Loads the graph, context graph and version index from a JSON-LD file, or from a binary snapshot if one is available for this input and context configuration.
+    If a persistent triple store is configured, the graph is held in the store instead, and the JSON-LD is only parsed if the input was not ingested into the store before."""
+    if progress is None: progress = LoadProgress()
+    if store:
+        progress.begin("store")
+        key = snapshot_key(graphfile, args)
+        loaded = open_store(store, key, args.baseuri)
+        if loaded is not None:
+            return loaded
+    elif snapshotdir:
+        progress.begin("snapshot")
+        key = snapshot_key(graphfile, args)
+        snapshot = load_snapshot(snapshotdir, key)
+        if snapshot is not None:
+            return snapshot
+    progress.begin("context")
+    g, contextgraph = init_graph(args)
+    progress.begin("parse")
+    stat = filestat(graphfile)
+    if stat is not None:
+        progress.set("inputsize", stat[1])
+    parse_jsonld(g, None, getstream(graphfile), args)
+    if args.includecontext:
+        g += contextgraph #include context
+    progress.begin("versionmap")
+    versionmap = build_versionmap(g, args.baseuri)
+    if store:
+        progress.begin("ingest")
+        g = ingest_store(store, key, args.baseuri, g, contextgraph, versionmap)
+    elif snapshotdir:
+        progress.begin("savesnapshot")
+        save_snapshot(snapshotdir, key, g, contextgraph, versionmap)
+    return g, contextgraph, versionmap
+
+def expand_prefixed(name: str) -> URIRef:
+    """Expands a prefixed name like schema:name to a full URI, using the same prefixes as in queries"""
+    prefix, _, local = name.partition(":")
+    if prefix in PREFIXES and not local.startswith("//"):
+        return URIRef(PREFIXES[prefix] + local)
+    return URIRef(name)
+
+def compact_prefixed(uri: URIRef) -> str:
+    """Compacts a URI to a prefixed name if possible, the inverse of expand_prefixed()"""
+    for prefix, namespace in PREFIXES.items():
+        if str(uri).startswith(namespace) and len(uri) > len(namespace):
+            return prefix + ":" + str(uri)[len(namespace):]
+    return str(uri)
+
+def report_failure(future):
+    """Logs the error of a failed background job"""
+    exc = future.exception()
+    if exc is not None:
+        print(f"Background job failed: {exc}",file=sys.stderr)
+        traceback.print_exception(type(exc), exc, exc.__traceback__, file=sys.stderr)
+
+def parse_value(value: str) -> Union[URIRef,Literal]:
+    """Parses a value in the simple query syntax: prefixed names are URIs, numbers are integers and anything else is a string literal"""
+    if value.startswith(NSPREFIXES) or value.startswith("rdf:"):
+        return expand_prefixed(value)
+    elif value.isnumeric():
+        return Literal(int(value))
+    return Literal(value)
+
+def encode_cursor(offset: int) -> str:
+    """Encodes the position in a list of results as an opaque cursor"""
+    return base64.urlsafe_b64encode(f"o{offset}".encode('ascii')).decode('ascii').rstrip("=")
+
+def decode_cursor(cursor: str) -> int:
+    """Decodes a cursor as returned by encode_cursor(), raises ValueError if it is invalid"""
     try:
-        Version(s)
-        return True
-    except:
-        return False
+        value = base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4)).decode('ascii')
+    except Exception:
+        raise ValueError("Invalid cursor")
+    if not value.startswith("o") or not value[1:].isdigit():
+        raise ValueError("Invalid cursor")
+    return int(value[1:])
 
-def get_app(**kwargs):
+def add_next_link(content: str, output_type: str, nexturl: str) -> str:
+    """Adds a link to the next page to the body of a paginated response"""
+    if output_type == "html":
+        link = f"<nav class=\"pagination\"><a rel=\"next\" href=\"{html.escape(nexturl)}\">Next page &raquo;</a></nav>"
+        pos = content.rfind("</body>")
+        if pos == -1:
+            return content + link
+        return content[:pos] + link + content[pos:]
+    elif output_type == "json":
+        data = json.loads(content)
+        if isinstance(data, dict):
+            data[HYDRA_NEXT] = { "@id": nexturl }
+            return json.dumps(data, indent=4, ensure_ascii=False, sort_keys=True)
+        return content
+    elif output_type == "turtle":
+        return f"# next page: <{nexturl}>\n" + content
+    return content
+
+def get_last_component(uri: str) -> str:
+    return uri.rstrip("/#").rsplit("/",1)[-1].rsplit("#",1)[-1]
+
+def parse_weighted_predicates(s: str) -> dict:
+    """Parses a comma separated list of (prefixed) predicates with an optional weight, e.g. schema:name^3,schema:description"""
+    predicates = {}
+    for item in s.split(","):
+        item = item.strip()
+        if item:
+            predicate, _, weight = item.partition("^")
+            predicates[expand_prefixed(predicate)] = float(weight) if weight else 1.0
+    return predicates
+
+def filestat(filename: str) -> Optional[tuple]:
+    try:
+        stat = os.stat(filename)
+    except OSError:
+        return None
+    return (stat.st_mtime_ns, stat.st_size, stat.st_ino)
+
+def get_config(**kwargs) -> dict:
+    """Complements the configuration with defaults from environment variables"""
     if not kwargs.get('graph'):
         if 'CODEMETA_GRAPH' in environ:
             kwargs['graph'] = environ['CODEMETA_GRAPH']
@@ -544,8 +1877,141 @@ def get_app(**kwargs):
         if 'CODEMETA_INCLUDECONTEXT' in environ:
             kwargs['includecontext'] = environ['CODEMETA_INCLUDECONTEXT'].lower() in ("true","yes","1")
 
-    return CodemetaServer(**kwargs)
+    if kwargs.get('cacheentries') is None:
+        kwargs['cacheentries'] = int(environ.get('CODEMETA_CACHEENTRIES', 1000))
+
+    if kwargs.get('cachesize') is None:
+        kwargs['cachesize'] = int(environ.get('CODEMETA_CACHESIZE', 256))
+
+    if kwargs.get('threads') is None:
+        kwargs['threads'] = int(environ.get('CODEMETA_THREADS', 4))
+
+    if kwargs.get('renderprocesses') is None:
+        kwargs['renderprocesses'] = int(environ.get('CODEMETA_RENDERPROCESSES', 0))
+
+    if kwargs.get('maxconcurrent') is None:
+        kwargs['maxconcurrent'] = int(environ.get('CODEMETA_MAXCONCURRENT', 0))
+
+    if kwargs.get('maxqueue') is None:
+        kwargs['maxqueue'] = int(environ.get('CODEMETA_MAXQUEUE', 64))
+
+    if not kwargs.get('dumpdir'):
+        if 'CODEMETA_DUMPDIR' in environ:
+            kwargs['dumpdir'] = environ['CODEMETA_DUMPDIR']
+
+    if not kwargs.get('snapshotdir'):
+        if 'CODEMETA_SNAPSHOTDIR' in environ:
+            kwargs['snapshotdir'] = environ['CODEMETA_SNAPSHOTDIR']
+
+    if not kwargs.get('store'):
+        if 'CODEMETA_STORE' in environ:
+            kwargs['store'] = environ['CODEMETA_STORE']
+
+    if kwargs.get('reloadinterval') is None:
+        kwargs['reloadinterval'] = int(environ.get('CODEMETA_RELOADINTERVAL', 0))
+
+    if not kwargs.get('admintoken'):
+        if 'CODEMETA_ADMINTOKEN' in environ:
+            kwargs['admintoken'] = environ['CODEMETA_ADMINTOKEN']
+
+    if not kwargs.get('searchpredicates'):
+        if 'CODEMETA_SEARCHPREDICATES' in environ:
+            kwargs['searchpredicates'] = environ['CODEMETA_SEARCHPREDICATES']
+    if isinstance(kwargs.get('searchpredicates'), str):
+        kwargs['searchpredicates'] = parse_weighted_predicates(kwargs['searchpredicates'])
+
+    if kwargs.get('searchlimit') is None:
+        kwargs['searchlimit'] = int(environ.get('CODEMETA_SEARCHLIMIT', 500))
+
+    if not kwargs.get('facets'):
+        if 'CODEMETA_FACETS' in environ:
+            kwargs['facets'] = environ['CODEMETA_FACETS']
+    if isinstance(kwargs.get('facets'), str):
+        kwargs['facets'] = [ x.strip() for x in kwargs['facets'].split(",") if x.strip() ]
+
+    if kwargs.get('pagesize') is None:
+        kwargs['pagesize'] = int(environ.get('CODEMETA_PAGESIZE', 0))
+
+    if kwargs.get('redirectmaxage') is None:
+        kwargs['redirectmaxage'] = int(environ.get('CODEMETA_REDIRECTMAXAGE', 300))
+
+    if not kwargs.get('prerenderdir'):
+        if 'CODEMETA_PRERENDERDIR' in environ:
+            kwargs['prerenderdir'] = environ['CODEMETA_PRERENDERDIR']
+
+    if kwargs.get('prerenderprocesses') is None:
+        kwargs['prerenderprocesses'] = int(environ.get('CODEMETA_PRERENDERPROCESSES', 0))
 
+    if kwargs.get('logwatchinterval') is None:
+        kwargs['logwatchinterval'] = int(environ.get('CODEMETA_LOGWATCHINTERVAL', 10))
+
+    if kwargs.get('workers') is None:
+        kwargs['workers'] = int(environ.get('CODEMETA_WORKERS', 1))
+
+    if kwargs.get('workerstatsinterval') is None:
+        kwargs['workerstatsinterval'] = int(environ.get('CODEMETA_WORKERSTATSINTERVAL', 300))
+
+    if kwargs.get('slowrequests') is None:
+        kwargs['slowrequests'] = float(environ.get('CODEMETA_SLOWREQUESTS', 0))
+
+    if kwargs.get('cachecontrol') is None:
+        kwargs['cachecontrol'] = environ.get('CODEMETA_CACHECONTROL', "public, no-cache")
+
+    if kwargs.get('vary') is None:
+        kwargs['vary'] = environ.get('CODEMETA_VARY', "Accept")
+
+    if kwargs.get('batchlimit') is None:
+        kwargs['batchlimit'] = int(environ.get('CODEMETA_BATCHLIMIT', 1000))
+
+    if kwargs.get('sparqltimeout') is None:
+        kwargs['sparqltimeout'] = float(environ.get('CODEMETA_SPARQLTIMEOUT', 30))
+
+    if kwargs.get('sparqlmaxrows') is None:
+        kwargs['sparqlmaxrows'] = int(environ.get('CODEMETA_SPARQLMAXROWS', 100000))
+
+    if kwargs.get('sparqlconcurrent') is None:
+        kwargs['sparqlconcurrent'] = int(environ.get('CODEMETA_SPARQLCONCURRENT', 0))
+
+    if kwargs.get('sparqlqueue') is None:
+        kwargs['sparqlqueue'] = int(environ.get('CODEMETA_SPARQLQUEUE', 16))
+
+    if not kwargs.get('shacl'):
+        if 'CODEMETA_SHACL' in environ:
+            kwargs['shacl'] = environ['CODEMETA_SHACL']
+
+    if kwargs.get('validationprocesses') is None:
+        kwargs['validationprocesses'] = int(environ.get('CODEMETA_VALIDATIONPROCESSES', 0))
+
+    return kwargs
+
+def get_app(**kwargs):
+    return CodemetaServer(**get_config(**kwargs))
+
+def build_snapshot(**kwargs):
+    """Parses the graph and stores a snapshot of it in the snapshot directory, without serving anything. Can be used to prepare snapshots ahead of time."""
+    kwargs = get_config(**kwargs)
+    if not kwargs.get('snapshotdir'):
+        raise Exception("No snapshot directory provided, use --snapshotdir or set environment variable $CODEMETA_SNAPSHOTDIR")
+    baseuri = kwargs['baseuri']
+    if baseuri[-1] not in ('/','#','?'):
+        baseuri += "/"
+    args = AttribDict({
+        "baseuri": baseuri,
+        "baseurl": kwargs['baseurl'],
+        "includecontext": kwargs.get('includecontext', False),
+        "addcontext": kwargs.get('addcontext'),
+        "addcontextgraph": kwargs.get('addcontextgraph'),
+    })
+    load_graph(kwargs['graph'], args, kwargs['snapshotdir'])
+
+def export(**kwargs):
+    """Loads the graph and exports it as a complete static site, without serving anything"""
+    kwargs = get_config(**kwargs)
+    outputdir = kwargs.pop('export')
+    kwargs['prerenderdir'] = None #pre-rendering happens directly in the output directory
+    server = CodemetaServer(**kwargs)
+    server.serverside = False
+    export_site(server, outputdir, STATIC_DIR, kwargs['prerenderprocesses'] or os.cpu_count() or 1)
 
 def main():
     import uvicorn
@@ -556,16 +2022,61 @@ def main():
     parser.add_argument('--baseuri',type=str, help="Base URI used in the IDs of all resources", action='store', required=True)
     parser.add_argument('--baseurl',type=str, help="Base URL", action='store')
     parser.add_argument('--inputlogdir',type=str, help="Directory where *.harvest.log can be found as generated by codemeta-harvester", action='store')
+    parser.add_argument('--logwatchinterval',type=int, help="Check the log directory for new or changed logs every this many seconds (0 disables), only the affected resources are updated", action='store')
     parser.add_argument('--addcontext', help="Add the specified jsonld (must be a URL) to the context (and to the context graph). May be specified multiple times.", action='append',required=False)
     parser.add_argument('--includecontext', help="Include all context vocabularies in the main graph and express it verbosely in serialisations. This makes the resoluting codemeta.json richer without the need to query certain external vocabularies, at the cost of added redundancy.", action='store_true',required=False)
     parser.add_argument('--intro', type=str, help="Introductory text (html) to add to indices", action='store',required=False)
     parser.add_argument('--title',type=str, help="Title", action='store')
     parser.add_argument('--css',type=str, help="URLs to extra CSS stylesheets to use (comma separated list)", action='store')
+    parser.add_argument('--cacheentries',type=int, help="Maximum number of rendered responses to keep in the in-memory cache (0 disables caching)", action='store')
+    parser.add_argument('--cachesize',type=int, help="Maximum total size (in MB) of rendered responses to keep in the in-memory cache (0 disables caching)", action='store')
+    parser.add_argument('--threads',type=int, help="Number of worker threads for serialisation, validation and SPARQL queries", action='store')
+    parser.add_argument('--renderprocesses',type=int, help="Number of worker processes for HTML rendering (0 renders in the worker threads instead)", action='store')
+    parser.add_argument('--maxconcurrent',type=int, help="Maximum number of requests processed concurrently (defaults to the number of threads)", action='store')
+    parser.add_argument('--maxqueue',type=int, help="Maximum number of requests waiting to be processed, further requests are refused with 503 Service Unavailable", action='store')
+    parser.add_argument('--dumpdir',type=str, help="Directory where prebuilt (compressed) full data dumps are stored, if not set a temporary directory is used", action='store')
+    parser.add_argument('--snapshotdir',type=str, help="Directory where a binary snapshot of the parsed graph is kept, it is used on startup instead of parsing the JSON-LD again if the input and context settings did not change. Only use a directory you trust.", action='store')
+    parser.add_argument('--store',type=str, help="Keep the graph in a persistent disk-backed triple store rather than in memory, specified as plugin:directory or just a directory, e.g. /var/lib/codemeta-server/store uses Oxigraph (requires oxrdflib) and BerkeleyDB:/var/lib/codemeta-server/store uses BerkeleyDB (requires the berkeleydb package). The input is ingested once, afterwards the server starts by opening the store. Takes precedence over --snapshotdir.", action='store')
+    parser.add_argument('--reloadinterval',type=int, help="Check the graph file for changes every this many seconds and reload it when changed (0 disables). Sending SIGHUP also triggers a reload.", action='store')
+    parser.add_argument('--admintoken',type=str, help="Secret token that enables the administrative API (e.g. POST /admin/reload), pass it as a bearer token. It is better to set this via $CODEMETA_ADMINTOKEN.", action='store')
+    parser.add_argument('--searchpredicates',type=str, help="Comma separated list of (prefixed) predicates to include in the full-text index, each with an optional weight for relevance ranking, e.g. schema:name^3,schema:keywords^2,schema:description (default)", action='store')
+    parser.add_argument('--searchlimit',type=int, help="Maximum number of results for full-text searches", action='store')
+    parser.add_argument('--facets',type=str, help="Comma separated list of (prefixed) predicates, or slash separated property paths, to index as facets. These are available via /facets and exact (==) or disjunctive (|) query clauses on them are answered from the index. Default: " + ",".join(DEFAULT_FACETS), action='store')
+    parser.add_argument('--pagesize',type=int, help="Default number of resources per page in indices (0 disables pagination unless a limit is requested). Further pages are linked via the Link header and a cursor parameter.", action='store')
+    parser.add_argument('--redirectmaxage',type=int, help="Number of seconds clients may cache redirects to the latest version, or the latest version in a range, of a resource", action='store')
+    parser.add_argument('--prerenderdir',type=str, help="Pre-render all resource pages (html, json-ld and turtle) and indices to this directory after the graph is loaded, they are served from there directly. Pages not (yet) pre-rendered are rendered on demand.", action='store')
+    parser.add_argument('--prerenderprocesses',type=int, help="Number of processes to use for pre-rendering and exporting (0 uses one per CPU)", action='store')
+    parser.add_argument('--workers',type=int, help="Number of worker processes to serve with. The graph is loaded once and shared by all workers (copy-on-write), workers that die are restarted and reloads replace all workers.", action='store')
+    parser.add_argument('--workerstatsinterval',type=int, help="Report the memory usage of each worker process every this many seconds (0 disables)", action='store')
+    parser.add_argument('--slowrequests',type=float, help="Log requests that take longer than this many seconds, along with the SPARQL query they were translated to (0 disables)", action='store')
+    parser.add_argument('--cachecontrol',type=str, help="Cache-Control header for resources, indices and dumps, e.g. 'public, max-age=300' to let a CDN cache responses for five minutes (an empty string omits the header). Responses carry an ETag and Last-Modified, so clients and caches can revalidate cheaply.", action='store')
+    parser.add_argument('--vary',type=str, help="Vary header for content negotiated responses (an empty string omits the header)", action='store')
+    parser.add_argument('--batchlimit',type=int, help="Maximum number of resources that can be requested at once via POST /batch (0 for no limit)", action='store')
+    parser.add_argument('--sparqltimeout',type=float, help="Maximum number of seconds a SPARQL query may take to evaluate, longer queries are aborted (0 for no limit). Also applies to the SPARQL queries of indices (?sparql=).", action='store')
+    parser.add_argument('--sparqlmaxrows',type=int, help="Maximum number of rows (or triples) in the result of a SPARQL query, larger results are refused (0 for no limit)", action='store')
+    parser.add_argument('--sparqlconcurrent',type=int, help="Maximum number of SPARQL queries evaluated concurrently, in threads separate from those for page rendering (defaults to half the number of threads)", action='store')
+    parser.add_argument('--sparqlqueue',type=int, help="Maximum number of SPARQL queries waiting to be evaluated, further queries are refused with 503 Service Unavailable", action='store')
+    parser.add_argument('--shacl',type=str, help="SHACL shapes (turtle or json-ld) to validate resources against that carry no validation report from the harvester. Reports of all resources are collected after each load and served via /validation/.", action='store')
+    parser.add_argument('--validationprocesses',type=int, help="Number of processes to use for validating against the SHACL shapes with --workers (0 uses one per CPU)", action='store')
+    parser.add_argument('--export',type=str, help="Only export the graph as a static site to this directory and exit, do not start the server", action='store')
+    parser.add_argument('--buildsnapshot', help="Only build the snapshot in --snapshotdir and exit, do not start the server", action='store_true',required=False)
     args = parser.parse_args() #parsed arguments can be accessed as attributes
 
+    if args.buildsnapshot:
+        build_snapshot(**args.__dict__)
+        return
+    elif args.export:
+        export(**args.__dict__)
+        return
+
     # Start the SPARQL endpoint based on the RDFLib Graph
-    app = get_app(**args.__dict__)
-    uvicorn.run(app, host=args.host, port=args.port)
+    #the port is bound right away, the graph is loaded in the background (see /health/ready)
+    app = get_app(**args.__dict__, loadinbackground=True)
+    if app.workers > 1:
+        from codemeta_server.workers import Master
+        Master(app, args.host, args.port, app.workers, app.workerstatsinterval).run()
+    else:
+        uvicorn.run(app, host=args.host, port=args.port)
 
 if __name__ == "__main__":
     main()
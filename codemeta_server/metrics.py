@@ -0,0 +1,284 @@
+"""Instrumentation: metrics in the Prometheus text format and per-request timings (reported in the Server-Timing header)"""
+
+import sys
+import os
+import time
+import threading
+import contextvars
+from contextlib import contextmanager
+from typing import Dict, List, Tuple, Optional, Callable
+from starlette.routing import Mount
+
+#default histogram buckets (in seconds)
+BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+
+#phases reported in the Server-Timing header, in this order
+PHASES = ("negotiate", "query", "render", "encode")
+
+
+def escape(value: str) -> str:
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace("\"", "\\\"")
+
+
+def format_labels(labelnames: Tuple[str, ...], labelvalues: Tuple[str, ...], extra: str = "") -> str:
+    labels = [ f"{name}=\"{escape(value)}\"" for name, value in zip(labelnames, labelvalues) ]
+    if extra:
+        labels.append(extra)
+    return "{" + ",".join(labels) + "}" if labels else ""
+
+
+class Metric:
+    """A metric whose values are either updated explicitly or computed by a callback (returning a value, or a dictionary of label values => value) when rendered"""
+    type = "untyped"
+
+    def __init__(self, name: str, description: str, labelnames: Tuple[str, ...] = (), callback: Optional[Callable] = None):
+        self.name = name
+        self.description = description
+        self.labelnames = labelnames
+        self.callback = callback
+        self.values: Dict[Tuple[str, ...], float] = {}
+        self.lock = threading.Lock()
+
+    def key(self, labels: dict) -> Tuple[str, ...]:
+        return tuple(str(labels.get(name, "")) for name in self.labelnames)
+
+    def samples(self) -> List[Tuple[str, str, float]]:
+        """Returns (name suffix, formatted labels, value) tuples"""
+        if self.callback is not None:
+            try:
+                value = self.callback()
+            except Exception as e: #pylint: disable=broad-except
+                print(f"Unable to compute metric {self.name}: {e}",file=sys.stderr)
+                return []
+            if isinstance(value, dict):
+                return [ ("", format_labels(self.labelnames, key if isinstance(key, tuple) else (key,)), v) for key, v in sorted(value.items()) ]
+            return [ ("", "", value) ]
+        with self.lock:
+            return [ ("", format_labels(self.labelnames, key), value) for key, value in sorted(self.values.items()) ]
+
+    def render(self) -> str:
+        lines = [ f"# HELP {self.name} {self.description}", f"# TYPE {self.name} {self.type}" ]
+        for suffix, labels, value in self.samples():
+            lines.append(f"{self.name}{suffix}{labels} {value}")
+        return "\n".join(lines) + "\n"
+
+
+class Counter(Metric):
+    type = "counter"
+
+    def inc(self, amount: float = 1, **labels):
+        key = self.key(labels)
+        with self.lock:
+            self.values[key] = self.values.get(key, 0) + amount
+
+
+class Gauge(Metric):
+    type = "gauge"
+
+    def set(self, value: float, **labels):
+        with self.lock:
+            self.values[self.key(labels)] = value
+
+    def inc(self, amount: float = 1, **labels):
+        key = self.key(labels)
+        with self.lock:
+            self.values[key] = self.values.get(key, 0) + amount
+
+    def dec(self, amount: float = 1, **labels):
+        self.inc(-amount, **labels)
+
+
+class Histogram(Metric):
+    type = "histogram"
+
+    def __init__(self, name: str, description: str, labelnames: Tuple[str, ...] = (), buckets: Tuple[float, ...] = BUCKETS):
+        super().__init__(name, description, labelnames)
+        self.buckets = buckets
+        self.counts: Dict[Tuple[str, ...], List[int]] = {} #per label values: count per bucket (not cumulative), the last one is +Inf
+        self.sums: Dict[Tuple[str, ...], float] = {}
+
+    def observe(self, value: float, **labels):
+        key = self.key(labels)
+        i = 0
+        while i < len(self.buckets) and value > self.buckets[i]:
+            i += 1
+        with self.lock:
+            counts = self.counts.get(key)
+            if counts is None:
+                counts = self.counts[key] = [0] * (len(self.buckets) + 1)
+                self.sums[key] = 0.0
+            counts[i] += 1
+            self.sums[key] += value
+
+    def samples(self) -> List[Tuple[str, str, float]]:
+        samples = []
+        with self.lock:
+            for key, counts in sorted(self.counts.items()):
+                total = 0
+                for bound, count in zip(self.buckets + (float("inf"),), counts):
+                    total += count
+                    samples.append(("_bucket", format_labels(self.labelnames, key, "le=\"" + ("+Inf" if bound == float("inf") else f"{bound:g}") + "\""), total))
+                samples.append(("_sum", format_labels(self.labelnames, key), self.sums[key]))
+                samples.append(("_count", format_labels(self.labelnames, key), total))
+        return samples
+
+
+class Registry:
+    def __init__(self):
+        self.metrics: List[Metric] = []
+
+    def add(self, metric: Metric) -> Metric:
+        self.metrics.append(metric)
+        return metric
+
+    def render(self) -> str:
+        return "".join(metric.render() for metric in self.metrics)
+
+
+class RequestTimings:
+    """Time spent in each phase of handling a single request"""
+
+    def __init__(self):
+        self.begintime = time.perf_counter()
+        self.phases: Dict[str, float] = {}
+        self.sparql: Optional[str] = None #the SPARQL query the request was translated to, if any
+
+    def add(self, phase: str, duration: float):
+        self.phases[phase] = self.phases.get(phase, 0.0) + duration
+
+    def header(self) -> str:
+        """Formats the timings for the Server-Timing header (durations in milliseconds)"""
+        entries = [ f"{phase};dur={self.phases[phase] * 1000:.2f}" for phase in PHASES if phase in self.phases ]
+        entries.append(f"total;dur={(time.perf_counter() - self.begintime) * 1000:.2f}")
+        return ", ".join(entries)
+
+
+#timings of the request currently being handled (propagated to worker threads by the Limiter)
+current_timings: contextvars.ContextVar = contextvars.ContextVar("current_timings", default=None)
+
+
+@contextmanager
+def timed(phase: Optional[str], histogram: Optional[Histogram] = None, **labels):
+    """Measures the duration of the enclosed block, adds it to the timings of the current request under the phase (if any) and observes it in the histogram (if any)"""
+    begintime = time.perf_counter()
+    try:
+        yield
+    finally:
+        duration = time.perf_counter() - begintime
+        timings = current_timings.get()
+        if timings is not None and phase:
+            timings.add(phase, duration)
+        if histogram is not None:
+            histogram.observe(duration, **labels)
+
+
+def record_sparql(sparql: str):
+    """Registers the SPARQL query the current request was translated to, for the slow request log"""
+    timings = current_timings.get()
+    if timings is not None:
+        timings.sparql = sparql
+
+
+def resident_memory() -> int:
+    """Returns the resident memory of this process in bytes (0 if unknown)"""
+    try:
+        with open("/proc/self/statm",'r',encoding='ascii') as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+    except (OSError, ValueError, IndexError, AttributeError):
+        pass
+    try:
+        import resource
+        #peak rather than current usage, in kB on Linux and bytes on macOS
+        maxrss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        return maxrss if sys.platform == "darwin" else maxrss * 1024
+    except ImportError:
+        return 0
+
+
+def get_route(scope) -> str:
+    """Returns the path template of the route that handled the request, routes of mounted applications are prefixed with the mount path"""
+    route = scope.get('route')
+    path = getattr(route, 'path', None)
+    if path is None:
+        return scope.get('root_path') or "unmatched" #mounted applications without routes (e.g. static files)
+    if isinstance(route, Mount):
+        return path
+    return scope.get('root_path', "") + path
+
+
+class MetricsMiddleware:
+    """ASGI middleware that counts requests and measures their latency per route, adds the Server-Timing header
+    and logs requests that take longer than the threshold (if set) along with the SPARQL they were translated to"""
+
+    def __init__(self, app, server):
+        self.app = app
+        self.server = server
+
+    async def __call__(self, scope, receive, send):
+        if scope['type'] != 'http':
+            await self.app(scope, receive, send)
+            return
+        metrics = self.server.metrics
+        timings = RequestTimings()
+        token = current_timings.set(timings)
+        status = 500
+
+        async def timedsend(message):
+            nonlocal status
+            if message['type'] == 'http.response.start':
+                status = message['status']
+                headers = list(message.get('headers', []))
+                if not any(name.lower() == b"server-timing" for name, _ in headers): #sub-applications may set their own
+                    headers.append((b"server-timing", timings.header().encode('ascii')))
+                message['headers'] = headers
+            await send(message)
+
+        metrics.inflight.inc()
+        try:
+            await self.app(scope, receive, timedsend)
+        finally:
+            metrics.inflight.dec()
+            current_timings.reset(token)
+            duration = time.perf_counter() - timings.begintime
+            routepath = get_route(scope)
+            if routepath.startswith("/api"):
+                metrics.sparql_seconds.observe(duration, source="endpoint")
+            metrics.requests.inc(route=routepath, method=scope.get('method', ""), status=str(status))
+            metrics.request_seconds.observe(duration, route=routepath)
+            if self.server.slowrequests and duration >= self.server.slowrequests:
+                path = scope.get('path', "")
+                if scope.get('query_string'):
+                    path += "?" + scope['query_string'].decode('latin-1')
+                msg = f"Slow request ({duration:.2f}s, status {status}): {scope.get('method', '')} {path} [{timings.header()}]"
+                if timings.sparql:
+                    msg += f"\nSPARQL query was: {timings.sparql}"
+                print(msg,file=sys.stderr)
+
+
+class ServerMetrics:
+    """All metrics of the server"""
+
+    def __init__(self, server):
+        self.registry = Registry()
+        add = self.registry.add
+        self.requests = add(Counter("codemeta_requests_total", "Number of HTTP requests handled", ("route", "method", "status")))
+        self.request_seconds = add(Histogram("codemeta_request_duration_seconds", "Duration of HTTP requests", ("route",)))
+        self.inflight = add(Gauge("codemeta_requests_in_flight", "Number of HTTP requests currently being handled"))
+        self.serialize_seconds = add(Histogram("codemeta_serialize_duration_seconds", "Time spent serializing (including cache lookups), by output type and index template", ("output_type", "indextemplate")))
+        self.sparql_seconds = add(Histogram("codemeta_sparql_duration_seconds", "Duration of SPARQL queries, by source (endpoint: the SPARQL endpoint, index: queries resolving an index or search)", ("source",)))
+        self.sparql_aborted = add(Counter("codemeta_sparql_aborted_total", "Number of SPARQL queries aborted, by reason (timeout, size, cancelled)", ("reason",)))
+        self.graph_load_seconds = add(Gauge("codemeta_graph_load_duration_seconds", "Duration of the latest (re)load of the graph"))
+        self.graph_loads = add(Counter("codemeta_graph_loads_total", "Number of times the graph was (re)loaded"))
+        add(Gauge("codemeta_graph_triples", "Number of triples in the graph", callback=lambda: len(server.graph) if server.graphstate is not None else 0))
+        add(Gauge("codemeta_graph_generation", "Generation of the graph that is served", callback=lambda: server.generation))
+        add(Counter("codemeta_cache_hits_total", "Number of render cache hits", callback=lambda: server.cache.hits))
+        add(Counter("codemeta_cache_misses_total", "Number of render cache misses", callback=lambda: server.cache.misses))
+        add(Gauge("codemeta_cache_hit_ratio", "Ratio of render cache lookups that were hits", callback=lambda: server.cache.hits / (server.cache.hits + server.cache.misses) if server.cache.hits + server.cache.misses else 0.0))
+        add(Gauge("codemeta_cache_entries", "Number of entries in the render cache", callback=lambda: len(server.cache)))
+        add(Gauge("codemeta_cache_size_bytes", "Total size of the entries in the render cache", callback=lambda: server.cache.size))
+        add(Gauge("codemeta_queue_pending", "Number of requests running or waiting for a worker thread", callback=lambda: server.limiter.pending))
+        add(Gauge("codemeta_sparql_queue_pending", "Number of SPARQL queries running or waiting for a SPARQL thread", callback=lambda: server.sparqllimiter.pending))
+        add(Gauge("process_resident_memory_bytes", "Resident memory size of this process", callback=resident_memory))
+
+    def render(self) -> str:
+        return self.registry.render()
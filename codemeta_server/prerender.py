@@ -0,0 +1,198 @@
+"""Pre-rendering of all resource pages and indices to disk, either as a cache the server serves from or as a static site"""
+
+import sys
+import os
+import os.path
+import re
+import time
+import shutil
+import threading
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+from typing import Optional, List, Set, Tuple
+from rdflib import URIRef
+from codemeta.common import SDO, RDF, CODEMETA, urijoin
+from codemeta_server.store import reopen
+
+#output type => file name in the directory of a page, this is the same layout codemeta2html uses for static sites
+FILENAMES = {
+    "html": "index.html",
+    "json": "data.json",
+    "turtle": "data.ttl",
+}
+
+#index template => directory
+INDICES = {
+    "cardindex.html": "",
+    "tableindex.html": "table",
+    "serviceindex.html": "services",
+}
+
+#full dumps in a static site: output type => file name
+DUMPS = {
+    "json": "data.json",
+    "turtle": "data.ttl",
+    "ntriples": "data.nt",
+}
+
+#number of pages rendered per task in a render process
+BATCHSIZE = 50
+
+_PRERENDER = None #(server, state, outputdir), set prior to forking render processes
+
+
+def valid_path(path: str) -> bool:
+    """Checks whether a resource path can safely be used as a directory"""
+    return "\\" not in path and "\0" not in path and all(component not in ("", ".", "..") for component in path.split("/"))
+
+
+def get_pages(server, state) -> List[str]:
+    """Returns the paths of all resource pages: every SoftwareSourceCode and every target product"""
+    resources = set(s for s, _, _ in state.graph.triples((None, RDF.type, SDO.SoftwareSourceCode)))
+    resources.update(o for _, _, o in state.graph.triples((None, CODEMETA.isSourceCodeOf, None)) if isinstance(o, URIRef))
+    paths = []
+    for res in resources:
+        if str(res).startswith(server.baseuri):
+            path = str(res)[len(server.baseuri):].strip("/")
+            if path and valid_path(path):
+                paths.append(path)
+    return sorted(paths)
+
+
+def write(filename: str, content: str):
+    os.makedirs(os.path.dirname(filename), exist_ok=True)
+    with open(filename,'w',encoding='utf-8') as f:
+        f.write(content if content else "")
+
+
+def render_pages(paths: List[str], server, state, outputdir: str) -> List[str]:
+    """Renders the pages in all output types, returns the paths that were rendered successfully"""
+    rendered = []
+    for path in paths:
+        res = URIRef(urijoin(server.baseuri, path))
+        try:
+            for output_type, filename in FILENAMES.items():
+                write(os.path.join(outputdir, path, filename), server.render(res, output_type, state))
+        except Exception as e: #pylint: disable=broad-except
+            print(f"Unable to pre-render {res}: {e}",file=sys.stderr)
+            continue
+        rendered.append(path)
+    return rendered
+
+
+def _render_batch(paths: List[str]) -> List[str]:
+    """Entrypoint for render processes"""
+    server, state, outputdir = _PRERENDER
+    return render_pages(paths, server, state, outputdir)
+
+
+def prerender(server, state, outputdir: str, processes: int = 0, fork: bool = False) -> Set[str]:
+    """Renders all resource pages and the indices to the output directory, in parallel forked processes if requested (which is
+    only safe if the process has no other threads). Returns the paths of all rendered resource pages."""
+    global _PRERENDER
+    paths = get_pages(server, state)
+    batches = [ paths[i:i+BATCHSIZE] for i in range(0, len(paths), BATCHSIZE) ]
+    rendered = set()
+    if fork and processes > 1 and len(batches) > 1 and "fork" in multiprocessing.get_all_start_methods():
+        #the render processes are forked, so they share the graph with this process rather than having to load it
+        _PRERENDER = (server, state, outputdir)
+        try:
+            with ProcessPoolExecutor(max_workers=processes, mp_context=multiprocessing.get_context("fork"), initializer=reopen, initargs=(state,)) as pool:
+                for result in pool.map(_render_batch, batches):
+                    rendered.update(result)
+        finally:
+            _PRERENDER = None
+    else:
+        for batch in batches:
+            rendered.update(render_pages(batch, server, state, outputdir))
+    for indextemplate, directory in INDICES.items():
+        write(os.path.join(outputdir, directory, "index.html"), server.render(None, "html", state, sparql_query=None, indextemplate=indextemplate, q=""))
+    return rendered
+
+
+def export_site(server, outputdir: str, staticdir: str, processes: int = 0):
+    """Exports the current graph as a complete static site: all pages, indices, full dumps and static assets"""
+    begintime = time.time()
+    server.wait_idle() #so the render processes can be forked safely
+    state = server.graphstate
+    pages = prerender(server, state, outputdir, processes, fork=True)
+    #version-less paths serve the latest version
+    for key in state.versionmap.identifiers():
+        version = state.versionmap.latest(key)
+        if f"{key}/{version}" in pages:
+            for filename in FILENAMES.values():
+                shutil.copyfile(os.path.join(outputdir, key, version, filename), os.path.join(outputdir, key, filename))
+    for output_type, filename in DUMPS.items():
+        with open(os.path.join(outputdir, filename),'wb') as f:
+            for chunk in server.stream(None, output_type, state):
+                f.write(chunk)
+    shutil.copytree(staticdir, os.path.join(outputdir, "static"), dirs_exist_ok=True)
+    if server.logstore:
+        #the log summaries in the pages link to /logs/{identifier}
+        os.makedirs(os.path.join(outputdir, "logs"), exist_ok=True)
+        for identifier, entry in list(server.logstore.entries.items()):
+            if valid_path(identifier):
+                shutil.copyfile(entry.filename, os.path.join(outputdir, "logs", identifier))
+    print(f"Exported {len(pages)} pages to {outputdir} in {time.time() - begintime:.2f}s",file=sys.stderr)
+
+
+class PageStore:
+    """Holds pre-rendered pages for the current generation of the graph in a directory on disk, the server serves these directly when available"""
+
+    def __init__(self, server, directory: str, processes: int = 0):
+        self.server = server
+        self.directory = directory
+        self.processes = processes if processes else (os.cpu_count() or 1)
+        self.current: Tuple[Optional[int], Optional[str], Set[str]] = (None, None, set()) #(generation, directory, paths), replaced at once
+        self.lock = threading.Lock()
+        os.makedirs(self.directory, exist_ok=True)
+        self.cleanup() #left behind by earlier runs
+
+    def cleanup(self, keep: Tuple[str, ...] = ()):
+        """Removes the directories of generations other than the ones to keep. Only directories created by the store itself are considered."""
+        for name in os.listdir(self.directory):
+            if re.match(r"^[0-9]+(\.tmp)?$", name) and name not in keep:
+                shutil.rmtree(os.path.join(self.directory, name), ignore_errors=True)
+
+    def build(self, fork: bool = False):
+        """Pre-renders all pages for the current graph generation (a no-op if they already exist).
+        Render processes are only forked if requested, which is only safe if the process has no other threads."""
+        with self.lock:
+            state = self.server.graphstate
+            generation = state.generation
+            if self.current[0] == generation:
+                return
+            begintime = time.time()
+            tmpdir = os.path.join(self.directory, f"{generation}.tmp")
+            shutil.rmtree(tmpdir, ignore_errors=True)
+            pages = prerender(self.server, state, tmpdir, self.processes, fork)
+            if self.server.graphstate is not state:
+                #a newer generation was published in the meantime, the result is outdated already
+                shutil.rmtree(tmpdir, ignore_errors=True)
+                return
+            outputdir = os.path.join(self.directory, str(generation))
+            shutil.rmtree(outputdir, ignore_errors=True)
+            os.rename(tmpdir, outputdir)
+            previous = self.current[1]
+            self.current = (generation, outputdir, pages)
+            #the previous generation is kept as requests may still be reading from it
+            self.cleanup(keep=(str(generation), os.path.basename(previous)) if previous else (str(generation),))
+            print(f"Pre-rendered {len(pages)} pages for graph generation {generation} in {time.time() - begintime:.2f}s",file=sys.stderr)
+
+    def build_in_background(self):
+        self.server.run_in_background(self.build)
+
+    def lookup(self, resource: str, output_type: str, state) -> Optional[str]:
+        """Returns the file holding the pre-rendered resource, if any"""
+        generation, outputdir, pages = self.current
+        path = resource.strip("/")
+        if generation != state.generation or output_type not in FILENAMES or path not in pages:
+            return None
+        return os.path.join(outputdir, path, FILENAMES[output_type])
+
+    def lookup_index(self, indextemplate: str, state) -> Optional[str]:
+        """Returns the file holding the pre-rendered (unfiltered) index, if any"""
+        generation, outputdir, _ = self.current
+        if generation != state.generation or indextemplate not in INDICES:
+            return None
+        return os.path.join(outputdir, INDICES[indextemplate], "index.html")
@@ -0,0 +1,82 @@
+"""Binary snapshots of the parsed graph, so the server can start without doing any JSON-LD processing"""
+
+import sys
+import os
+import os.path
+import glob
+import json
+import pickle
+import hashlib
+import rdflib
+from typing import Optional, Tuple
+from rdflib import Graph
+from codemeta.common import AttribDict
+from codemeta_server.versions import VersionIndex
+
+#increase whenever the contents of the snapshot change in an incompatible way
+SNAPSHOT_FORMAT = 2
+
+
+def snapshot_key(graphfile: str, args: AttribDict) -> str:
+    """Computes the key of a snapshot from the contents of the input file and all settings that influence the parsed result"""
+    h = hashlib.sha256()
+    with open(graphfile,'rb') as f:
+        while True:
+            chunk = f.read(1024 * 1024)
+            if not chunk:
+                break
+            h.update(chunk)
+    localcontext = []
+    for filename in (args.addcontextgraph or []):
+        if not filename.startswith("http") and os.path.exists(filename):
+            stat = os.stat(filename)
+            localcontext.append((filename, stat.st_size, stat.st_mtime))
+    h.update(json.dumps({
+        "format": SNAPSHOT_FORMAT,
+        "rdflib": rdflib.__version__,
+        "baseuri": args.baseuri,
+        "includecontext": bool(args.includecontext),
+        "addcontext": list(args.addcontext or []),
+        "addcontextgraph": list(args.addcontextgraph or []),
+        "localcontext": localcontext,
+    }, sort_keys=True).encode('utf-8'))
+    return h.hexdigest()
+
+
+def snapshot_filename(snapshotdir: str, key: str) -> str:
+    return os.path.join(snapshotdir, f"snapshot.{key[:32]}.pickle")
+
+
+def load_snapshot(snapshotdir: str, key: str) -> Optional[Tuple[Graph, Graph, VersionIndex]]:
+    """Loads the graph, context graph and version index from a snapshot, returns None if no valid snapshot exists for the key"""
+    filename = snapshot_filename(snapshotdir, key)
+    if not os.path.exists(filename):
+        return None
+    try:
+        with open(filename,'rb') as f:
+            data = pickle.load(f)
+    except Exception as e: #a corrupt or incompatible snapshot is not fatal, we simply parse again
+        print(f"Unable to load snapshot {filename}: {e}",file=sys.stderr)
+        return None
+    if data.get('key') != key:
+        return None
+    print(f"Loaded graph from snapshot {filename}",file=sys.stderr)
+    return data['graph'], data['contextgraph'], data['versionmap']
+
+
+def save_snapshot(snapshotdir: str, key: str, graph: Graph, contextgraph: Graph, versionmap: VersionIndex):
+    """Stores a snapshot, replacing any earlier snapshots in the directory"""
+    os.makedirs(snapshotdir, exist_ok=True)
+    filename = snapshot_filename(snapshotdir, key)
+    with open(filename + ".tmp",'wb') as f:
+        pickle.dump({
+            "key": key,
+            "graph": graph,
+            "contextgraph": contextgraph,
+            "versionmap": versionmap,
+        }, f, protocol=pickle.HIGHEST_PROTOCOL)
+    os.replace(filename + ".tmp", filename)
+    for oldfilename in glob.glob(os.path.join(snapshotdir, "snapshot.*.pickle")):
+        if oldfilename != filename:
+            os.unlink(oldfilename)
+    print(f"Saved graph snapshot {filename}",file=sys.stderr)
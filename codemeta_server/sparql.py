@@ -0,0 +1,398 @@
+"""Guardrails for the SPARQL endpoint. Queries run in their own concurrency lane, separate from page rendering, with a
+limit on their evaluation time and on the size of their results. Parsed queries and results are cached (per graph
+generation) and SELECT results are streamed as they are produced."""
+
+import sys
+import io
+import csv
+import json
+import re
+import time
+import threading
+import traceback
+from collections import OrderedDict
+from itertools import islice, chain
+from typing import Optional, Iterator, Iterable, Tuple, Union, List
+from urllib.parse import parse_qsl
+from rdflib import Graph, BNode
+from rdflib.plugins.sparql import prepareQuery
+from rdflib.plugins.sparql.parserutils import CompValue
+from rdflib.plugins.sparql.sparql import Query, SPARQLError
+from rdflib.plugins.sparql.results.jsonresults import termToJSON
+from rdflib_endpoint.utils import parse_accept_header, GRAPH_CONTENT_TYPE_TO_RDFLIB_FORMAT
+from starlette.requests import Request
+from starlette.responses import Response, JSONResponse, StreamingResponse
+from codemeta_server.metrics import record_sparql, timed
+
+#media types of SELECT results that are serialized (and streamed) by us => format
+STREAMFORMATS = {
+    "application/sparql-results+json": "json",
+    "application/json": "json",
+    "text/json": "json",
+    "text/csv": "csv",
+    "application/sparql-results+csv": "csv",
+    "text/tab-separated-values": "tsv",
+}
+
+#other media types of SELECT and ASK results, serialized by rdflib => rdflib format
+RESULTFORMATS = {
+    "application/sparql-results+json": "json",
+    "application/json": "json",
+    "text/json": "json",
+    "application/sparql-results+xml": "xml",
+    "application/xml": "xml",
+    "text/xml": "xml",
+    "text/csv": "csv",
+    "application/sparql-results+csv": "csv",
+}
+
+#defaults as used by the rdflib endpoint (the XML formats are what federated queries expect)
+DEFAULT_RESULTTYPE = "application/sparql-results+xml"
+DEFAULT_GRAPHTYPE = "application/rdf+xml"
+
+#the guard is checked once every this many triples matched
+CHECKINTERVAL = 1000
+
+#number of rows serialized per chunk when streaming, results that fit in a single chunk are not streamed
+CHUNKSIZE = 500
+
+#results larger than this (in characters) are not cached
+CACHELIMIT = 8 * 1024 * 1024
+
+
+class QueryAborted(Exception):
+    """Raised when the evaluation of a query is aborted"""
+    status = 503
+    reason = "aborted"
+
+
+class QueryTimeout(QueryAborted):
+    status = 504
+    reason = "timeout"
+
+
+class QueryCancelled(QueryAborted):
+    status = 503
+    reason = "cancelled"
+
+
+class ResultTooLarge(QueryAborted):
+    status = 413
+    reason = "size"
+
+
+class InvalidQuery(ValueError):
+    """Raised when a query can not be parsed"""
+    pass
+
+
+class Guard:
+    """Keeps track of the time spent evaluating a query. Time spent waiting for the client (while streaming) does not count."""
+
+    def __init__(self, timeout: float = 0):
+        self.timeout = timeout
+        self.elapsed = 0.0
+        self.started: Optional[float] = time.monotonic()
+        self.cancelled = False
+
+    def resume(self):
+        self.started = time.monotonic()
+
+    def pause(self):
+        if self.started is not None:
+            self.elapsed += time.monotonic() - self.started
+            self.started = None
+
+    def cancel(self):
+        self.cancelled = True
+
+    def check(self):
+        """Raises an exception if the query must be aborted"""
+        if self.cancelled:
+            raise QueryCancelled("Query was cancelled")
+        if self.timeout and self.started is not None and self.elapsed + time.monotonic() - self.started > self.timeout:
+            raise QueryTimeout(f"Query exceeded the time limit of {self.timeout:g}s")
+
+
+class GuardedGraph(Graph):
+    """A view on a graph (sharing its store) that checks a guard while triples are being matched. As all query evaluation
+    comes down to matching triples, this aborts a query in the middle of its evaluation as soon as the guard says so."""
+
+    def __init__(self, graph: Graph, guard: Guard):
+        super().__init__(store=graph.store, identifier=graph.identifier, namespace_manager=graph.namespace_manager)
+        self.guard = guard
+
+    def query(self, *args, **kwargs):
+        #stores that evaluate queries natively (such as Oxigraph) would bypass the guard, so queries are always evaluated by rdflib
+        kwargs['use_store_provided'] = False
+        return super().query(*args, **kwargs)
+
+    def triples(self, triple, *args, **kwargs):
+        guard = self.guard
+        guard.check()
+        for i, t in enumerate(super().triples(triple, *args, **kwargs), 1):
+            if i % CHECKINTERVAL == 0:
+                guard.check()
+            yield t
+
+
+def limit_rows(prepared: Query, maxrows: int) -> Query:
+    """Limits the solutions of a SELECT query to one more than the maximum number of rows, so evaluation stops as soon as
+    the result is known to be too large. Queries with a LIMIT of at most the maximum are left as they are."""
+    algebra = prepared.algebra
+    if not maxrows or algebra.name != "SelectQuery" or (algebra.p.name == "Slice" and algebra.p.length is not None and algebra.p.length <= maxrows):
+        return prepared
+    limited = CompValue(algebra.name, **dict(algebra, p=CompValue("Slice", p=algebra.p, start=0, length=maxrows + 1)))
+    return Query(prepared.prologue, limited)
+
+
+def normalize_query(sparql: str) -> str:
+    """Normalizes the whitespace in a query (outside of literals and IRIs), so trivially different queries share cache entries"""
+    lines = []
+    for line in sparql.strip().split("\n"):
+        tokens = re.findall(r'"(?:[^"\\]|\\.)*"|\'(?:[^\'\\]|\\.)*\'|<[^<>\s]*>|[^\s"\'<]+|\S', line)
+        if tokens:
+            lines.append(" ".join(tokens))
+    return "\n".join(lines)
+
+
+def get_query(request: Request, body: bytes) -> Tuple[Optional[str], Optional[str]]:
+    """Extracts the query and the update (if any) from a request as the SPARQL protocol passes them"""
+    if request.method == "GET":
+        return request.query_params.get("query"), request.query_params.get("update")
+    contenttype = request.headers.get("content-type", "")
+    if "application/sparql-query" in contenttype:
+        return body.decode("utf-8"), None
+    elif "application/sparql-update" in contenttype:
+        return None, body.decode("utf-8")
+    elif "application/x-www-form-urlencoded" in contenttype:
+        params = dict(parse_qsl(body.decode("utf-8")))
+        return params.get("query"), params.get("update")
+    elif not body and request.query_params:
+        return request.query_params.get("query"), request.query_params.get("update")
+    return None, None
+
+
+def iter_results(format: str, variables: List, rows: Iterable, guard: Guard, maxrows: int) -> Iterator[str]:
+    """Serializes the rows of a SELECT result in chunks. Raises ResultTooLarge once the result exceeds the maximum number of rows."""
+    names = [ str(v) for v in variables ]
+    if format == "json":
+        yield '{"head": {"vars": ' + json.dumps(names) + '}, "results": {"bindings": ['
+    elif format == "tsv":
+        yield "\t".join("?" + name for name in names) + "\n"
+    else:
+        yield format_csv([names])
+    rows = iter(rows)
+    count = 0
+    while True:
+        chunk = list(islice(rows, CHUNKSIZE))
+        if not chunk:
+            break
+        count += len(chunk)
+        if maxrows and count > maxrows:
+            raise ResultTooLarge(f"Query result exceeds the maximum of {maxrows} rows, please use LIMIT")
+        guard.check()
+        if format == "json":
+            yield ("," if count > len(chunk) else "") + ",".join(json.dumps({ name: termToJSON(None, row[i]) for i, name in enumerate(names) if row[i] is not None }, ensure_ascii=False) for row in chunk)
+        elif format == "tsv":
+            yield "".join("\t".join("" if term is None else term.n3() for term in row) + "\n" for row in chunk)
+        else:
+            yield format_csv([ ["" if term is None else f"_:{term}" if isinstance(term, BNode) else str(term) for term in row] for row in chunk ])
+    if format == "json":
+        yield "]}}"
+
+
+def format_csv(rows: List[List[str]]) -> str:
+    f = io.StringIO()
+    csv.writer(f).writerows(rows)
+    return f.getvalue()
+
+
+class ResultStream:
+    """Iterator over the serialized chunks of a result, the query is evaluated further as chunks are requested.
+    Cancelling it (for instance because the client disconnected) aborts the evaluation right away."""
+
+    def __init__(self, pieces: Iterator[str], guard: Guard):
+        self.pieces = pieces
+        self.guard = guard
+
+    def __iter__(self):
+        return self
+
+    def __next__(self) -> str:
+        self.guard.resume()
+        try:
+            return next(self.pieces)
+        finally:
+            self.guard.pause()
+
+    def cancel(self):
+        self.guard.cancel()
+
+    def close(self):
+        self.pieces.close()
+
+
+class QueryRunner:
+    """Evaluates SPARQL queries with a time limit and a limit on the size of the result"""
+
+    def __init__(self, server, timeout: float = 30, maxrows: int = 100000, maxprepared: int = 256):
+        self.server = server
+        self.timeout = timeout
+        self.maxrows = maxrows
+        self.maxprepared = maxprepared
+        self.prepared = OrderedDict() #normalized query => parsed query
+        self.lock = threading.Lock()
+
+    def prepare(self, sparql: str, normalized: str, graph: Graph):
+        """Parses a query, parsed queries are retained regardless of the graph generation as parsing does not depend on the data.
+        SELECT queries are limited so they produce at most one row more than the maximum."""
+        with self.lock:
+            prepared = self.prepared.get(normalized)
+            if prepared is not None:
+                self.prepared.move_to_end(normalized)
+                return prepared
+        prepared = limit_rows(prepareQuery(sparql, initNs=dict(graph.namespaces())), self.maxrows)
+        with self.lock:
+            self.prepared[normalized] = prepared
+            while len(self.prepared) > self.maxprepared:
+                self.prepared.popitem(last=False)
+        return prepared
+
+    def graph(self, state) -> GuardedGraph:
+        """Returns a view on the graph that aborts queries taking longer than the time limit, for queries issued by the server itself on behalf of a user"""
+        return GuardedGraph(state.graph, Guard(self.timeout))
+
+    def run(self, sparql: str, accept: str, state) -> Tuple[Union[str, ResultStream], str]:
+        """Evaluates a query and returns the serialized result and its media type. Large SELECT results are returned as a stream."""
+        normalized = normalize_query(sparql)
+        with timed("parse"):
+            try:
+                prepared = self.prepare(sparql, normalized, state.graph)
+            except Exception as e: #pylint: disable=broad-except
+                #syntax errors, but also unknown prefixes and the like
+                raise InvalidQuery(f"Invalid SPARQL query: {e}")
+        operation = prepared.algebra.name
+        mediatype, format = negotiate(accept, operation)
+        key = ("sparql", state.generation, normalized, mediatype)
+        content = self.server.cache.get(key)
+        if content is not None:
+            return content, mediatype
+        guard = Guard(self.timeout)
+        with timed("query"):
+            result = GuardedGraph(state.graph, guard).query(prepared)
+            if operation == "SelectQuery":
+                rows = iter(result)
+                first = list(islice(rows, CHUNKSIZE + 1))
+                if self.maxrows and len(first) > self.maxrows:
+                    raise ResultTooLarge(f"Query result exceeds the maximum of {self.maxrows} rows, please use LIMIT")
+            elif operation in ("ConstructQuery", "DescribeQuery") and self.maxrows and len(result.graph) > self.maxrows:
+                raise ResultTooLarge(f"Query result exceeds the maximum of {self.maxrows} triples, please use LIMIT")
+        if operation == "SelectQuery" and mediatype in STREAMFORMATS:
+            pieces = iter_results(STREAMFORMATS[mediatype], result.vars, chain(first, rows), guard, self.maxrows)
+            if len(first) <= CHUNKSIZE:
+                #complete already
+                content = "".join(pieces)
+            else:
+                guard.pause()
+                return ResultStream(self.iter_cached(key, pieces), guard), mediatype
+        elif operation == "SelectQuery":
+            if self.maxrows and len(result.bindings) > self.maxrows:
+                raise ResultTooLarge(f"Query result exceeds the maximum of {self.maxrows} rows, please use LIMIT")
+            content = result.serialize(format=format).decode("utf-8")
+        else:
+            content = result.serialize(format=format)
+            if isinstance(content, bytes):
+                content = content.decode("utf-8")
+        self.server.cache.set(key, content)
+        return content, mediatype
+
+    def iter_cached(self, key: tuple, pieces: Iterator[str]) -> Iterator[str]:
+        """Passes on the pieces of a streamed result and caches the whole once it is complete (unless too large)"""
+        content = []
+        size = 0
+        try:
+            for piece in pieces:
+                if content is not None:
+                    content.append(piece)
+                    size += len(piece)
+                    if size > CACHELIMIT:
+                        content = None
+                yield piece
+        except QueryAborted as e:
+            print(f"SPARQL query aborted while streaming its result: {e}",file=sys.stderr)
+            self.server.metrics.sparql_aborted.inc(reason=e.reason)
+            raise
+        if content is not None:
+            self.server.cache.set(key, "".join(content))
+
+    async def respond(self, request: Request, sparql: str) -> Response:
+        state = self.server.graphstate
+        record_sparql(sparql)
+        try:
+            content, mediatype = await self.server.sparqllimiter.run(self.run, sparql, request.headers.get("accept", ""), state)
+        except QueryAborted as e:
+            self.server.metrics.sparql_aborted.inc(reason=e.reason)
+            return JSONResponse({"message": str(e)}, status_code=e.status)
+        except (InvalidQuery, SPARQLError) as e:
+            return JSONResponse({"message": str(e) if isinstance(e, InvalidQuery) else f"Error executing the SPARQL query: {e}"}, status_code=400)
+        except Exception as e: #pylint: disable=broad-except
+            print(f"Failed to execute SPARQL query: {sparql}",file=sys.stderr)
+            traceback.print_exc(file=sys.stderr)
+            return JSONResponse({"message": f"Error executing the SPARQL query: {e}"}, status_code=500)
+        if isinstance(content, ResultStream):
+            return StreamingResponse(self.server.sparqllimiter.iterate(content), media_type=mediatype)
+        return Response(content, media_type=mediatype)
+
+
+def negotiate(accept: str, operation: str) -> Tuple[str, str]:
+    """Determines the media type (and rdflib format) of the result of a query, like the rdflib endpoint does"""
+    if operation in ("ConstructQuery", "DescribeQuery"):
+        formats, default = GRAPH_CONTENT_TYPE_TO_RDFLIB_FORMAT, DEFAULT_GRAPHTYPE
+    elif operation == "SelectQuery":
+        formats, default = { **RESULTFORMATS, **STREAMFORMATS }, DEFAULT_RESULTTYPE
+    else:
+        formats, default = RESULTFORMATS, DEFAULT_RESULTTYPE
+    for mediatype in parse_accept_header(accept or default):
+        if mediatype in formats:
+            return mediatype, formats[mediatype]
+    return default, formats[default]
+
+
+class SparqlApp:
+    """ASGI application for the SPARQL endpoint. Queries are answered by the query runner, everything else (the query
+    editor, the service description and updates, which are refused) is passed on to the rdflib endpoint."""
+
+    def __init__(self, runner: QueryRunner, app):
+        self.runner = runner
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope['type'] != 'http' or scope.get('method') not in ("GET", "POST") or get_subpath(scope) not in ("", "/"):
+            await self.app(scope, receive, send)
+            return
+        request = Request(scope, receive)
+        body = await request.body() if request.method == "POST" else b""
+        query, update = get_query(request, body)
+        if not query or update:
+            #the body was consumed already, it is passed on again
+            replayed = False
+
+            async def replay():
+                nonlocal replayed
+                if not replayed:
+                    replayed = True
+                    return {"type": "http.request", "body": body, "more_body": False}
+                return await receive()
+
+            await self.app(scope, replay, send)
+            return
+        response = await self.runner.respond(request, query)
+        await response(scope, receive, send)
+
+
+def get_subpath(scope) -> str:
+    """Returns the path relative to where the application is mounted"""
+    path = scope.get('path', "")
+    root = scope.get('root_path', "")
+    return path[len(root):] if root and path.startswith(root) else path
@@ -0,0 +1,183 @@
+"""Persistent disk-backed triple stores. The graph is ingested into the store once per input, afterwards the server only
+has to open the store, and memory usage is bounded by the caches of the store rather than by the size of the graph."""
+
+import sys
+import os
+import os.path
+import re
+import time
+import shutil
+import pickle
+from typing import Optional, Tuple
+from rdflib import Graph, URIRef
+from rdflib.plugin import PluginException, get as get_plugin
+from rdflib.store import Store
+from codemeta.common import bind_graph
+from codemeta_server.versions import VersionIndex
+
+#store plugin => function returning the configuration to open the store with, given the directory to keep it in.
+#Oxigraph is provided by oxrdflib (and answers SPARQL queries natively), BerkeleyDB ships with rdflib (but requires the berkeleydb package) and SQLAlchemy is provided by rdflib-sqlalchemy.
+STORES = {
+    "Oxigraph": lambda directory: os.path.join(directory, "store"),
+    "BerkeleyDB": lambda directory: os.path.join(directory, "store"),
+    "SQLAlchemy": lambda directory: "sqlite:///" + os.path.join(directory, "store.sqlite"),
+}
+
+def _oxigraph_readonly(configuration: str) -> Store:
+    import pyoxigraph #pylint: disable=import-outside-toplevel
+    return get_plugin("Oxigraph", Store)(store=pyoxigraph.Store.read_only(configuration))
+
+#store plugin => function opening the store read-only, for processes that only read a store another process has open (which
+#these stores do not allow otherwise). The store must not be written to as long as they have it open.
+READONLY = {
+    "Oxigraph": _oxigraph_readonly,
+}
+
+DEFAULT_STORE = "Oxigraph"
+
+#number of triples added to the store at once when ingesting
+BATCHSIZE = 10000
+
+#stores opened by this process: directory => graph, a store can not be opened twice
+_OPENED = {}
+
+#increase whenever the contents of the store directory change in an incompatible way
+STORE_FORMAT = 1
+
+
+class StoreGraph(Graph):
+    """A graph held in a persistent store on disk"""
+
+    def __init__(self, plugin: str, directory: str, identifier: URIRef, store: Optional[Store] = None):
+        super().__init__(store=store if store is not None else plugin, identifier=identifier)
+        self.plugin = plugin
+        self.directory = directory
+
+    def configuration(self) -> str:
+        return STORES[self.plugin](self.directory) if self.plugin in STORES else os.path.join(self.directory, "store")
+
+    def open_store(self, create: bool = False):
+        self.open(self.configuration(), create=create)
+        bind_graph(self)
+
+    def reopen(self, readonly: bool = False) -> "StoreGraph":
+        """Opens the store anew, processes must not share the handles of a store with the process they were forked from.
+        Processes that only read may open it read-only, if the store supports that."""
+        if readonly and self.plugin in READONLY:
+            graph = StoreGraph(self.plugin, self.directory, self.identifier, READONLY[self.plugin](self.configuration()))
+            bind_graph(graph)
+        else:
+            graph = StoreGraph(self.plugin, self.directory, self.identifier)
+            graph.open_store()
+        return graph
+
+
+def parse_store(spec: str) -> Tuple[str, str]:
+    """Parses a store specification (plugin:directory, or just a directory to use the default plugin), returns (plugin, directory)"""
+    match = re.match(r"^([A-Za-z][A-Za-z0-9_]+):(.+)$", spec)
+    plugin, directory = (match.group(1), match.group(2)) if match else (DEFAULT_STORE, spec)
+    try:
+        get_plugin(plugin, Store)
+    except PluginException:
+        raise ValueError(f"Unknown triple store '{plugin}', is the package that provides it installed? Known stores: " + ", ".join(STORES))
+    return plugin, directory
+
+
+def store_directory(spec: str, key: str) -> Tuple[str, str]:
+    plugin, basedir = parse_store(spec)
+    return plugin, os.path.join(basedir, key[:32])
+
+
+def open_store(spec: str, key: str, baseuri: str) -> Optional[Tuple[StoreGraph, Graph, VersionIndex]]:
+    """Opens the store holding the graph for the key, along with the context graph and version index kept alongside it.
+    Returns None if the input was not ingested (completely) yet."""
+    plugin, directory = store_directory(spec, key)
+    metafile = os.path.join(directory, "meta.pickle")
+    if not os.path.exists(metafile):
+        return None
+    try:
+        with open(metafile,'rb') as f:
+            meta = pickle.load(f)
+        if meta.get('key') != key or meta.get('format') != STORE_FORMAT or meta.get('plugin') != plugin:
+            return None
+        graph = _OPENED.get(directory)
+        if graph is not None:
+            #reloading an unchanged input, the store that is open already is simply used again
+            return graph, meta['contextgraph'], meta['versionmap']
+        graph = StoreGraph(plugin, directory, URIRef(baseuri))
+        graph.open_store()
+        _OPENED[directory] = graph
+    except Exception as e: #pylint: disable=broad-except
+        #a corrupt or incompatible store is not fatal, we simply ingest again
+        print(f"Unable to open triple store in {directory}: {e}",file=sys.stderr)
+        return None
+    print(f"Opened {plugin} triple store in {directory}",file=sys.stderr)
+    return graph, meta['contextgraph'], meta['versionmap']
+
+
+def ingest_store(spec: str, key: str, baseuri: str, g: Graph, contextgraph: Graph, versionmap: VersionIndex) -> StoreGraph:
+    """Copies the graph into a new store for the key and returns the graph backed by it. Stores of earlier inputs are removed, except for the previous one as requests may still be using it."""
+    plugin, directory = store_directory(spec, key)
+    begintime = time.time()
+    shutil.rmtree(directory, ignore_errors=True) #left behind by an ingest that did not finish
+    os.makedirs(directory)
+    graph = StoreGraph(plugin, directory, URIRef(baseuri))
+    graph.open_store(create=True)
+    _OPENED[directory] = graph
+    batch = []
+    for triple in g:
+        batch.append(triple + (graph,))
+        if len(batch) >= BATCHSIZE:
+            graph.addN(batch)
+            batch = []
+    if batch:
+        graph.addN(batch)
+    graph.commit()
+    #written last, it marks the store as complete
+    with open(os.path.join(directory, "meta.pickle.tmp"),'wb') as f:
+        pickle.dump({
+            "format": STORE_FORMAT,
+            "key": key,
+            "plugin": plugin,
+            "contextgraph": contextgraph,
+            "versionmap": versionmap,
+        }, f, protocol=pickle.HIGHEST_PROTOCOL)
+    os.replace(os.path.join(directory, "meta.pickle.tmp"), os.path.join(directory, "meta.pickle"))
+    cleanup(os.path.dirname(directory), keep=2)
+    print(f"Ingested {len(g)} triples into {plugin} triple store in {directory} in {time.time() - begintime:.2f}s",file=sys.stderr)
+    return graph
+
+
+def update_meta(graph: StoreGraph, versionmap: VersionIndex):
+    """Stores the version index anew after the graph in the store was changed in place, so the store stays consistent when it is opened again"""
+    metafile = os.path.join(graph.directory, "meta.pickle")
+    with open(metafile,'rb') as f:
+        meta = pickle.load(f)
+    meta['versionmap'] = versionmap
+    with open(metafile + ".tmp",'wb') as f:
+        pickle.dump(meta, f, protocol=pickle.HIGHEST_PROTOCOL)
+    os.replace(metafile + ".tmp", metafile)
+
+
+def cleanup(basedir: str, keep: int):
+    """Removes all but the most recently ingested stores in the directory. Only directories created by ingest_store are considered."""
+    stores = []
+    for name in os.listdir(basedir):
+        if re.match(r"^[0-9a-f]{32}$", name):
+            metafile = os.path.join(basedir, name, "meta.pickle")
+            stores.append((os.path.getmtime(metafile) if os.path.exists(metafile) else 0, name))
+    for _, name in sorted(stores, reverse=True)[keep:]:
+        graph = _OPENED.pop(os.path.join(basedir, name), None)
+        if graph is not None:
+            graph.close()
+        shutil.rmtree(os.path.join(basedir, name), ignore_errors=True)
+
+
+def reopen(state, readonly: bool = False):
+    """Reopens the store of a graph state in a forked process, if it is held in a store at all"""
+    if isinstance(state.graph, StoreGraph):
+        try:
+            state.graph = state.graph.reopen(readonly)
+        except Exception as e: #pylint: disable=broad-except
+            #some stores can only be opened by a single process, the inherited handles are used then
+            print(f"Unable to reopen triple store in {state.graph.directory}, using the handles of the parent process: {e}",file=sys.stderr)
@@ -0,0 +1,108 @@
+"""Incremental serialisation of the graph, so large responses never need to be held in memory as a whole"""
+
+import json
+from collections import defaultdict
+from typing import Iterable, Iterator, Callable, Optional
+from rdflib import Graph, URIRef
+from rdflib.term import Node
+from codemeta.common import RDF
+
+CHUNKSIZE = 64 * 1024
+
+#number of triples serialised at once for N-Triples
+BATCHSIZE = 1000
+
+
+def chunked(pieces: Iterable[str], chunksize: int = CHUNKSIZE) -> Iterator[bytes]:
+    """Joins strings into UTF-8 encoded chunks of (at least) roughly the specified size"""
+    buffer = []
+    size = 0
+    for piece in pieces:
+        buffer.append(piece)
+        size += len(piece)
+        if size >= chunksize:
+            yield "".join(buffer).encode('utf-8')
+            buffer = []
+            size = 0
+    if buffer:
+        yield "".join(buffer).encode('utf-8')
+
+
+def iter_ntriples(graph: Graph) -> Iterator[str]:
+    """Serialises the graph as N-Triples, a batch of triples at a time"""
+    batch = Graph()
+    size = 0
+    for triple in graph:
+        batch.add(triple)
+        size += 1
+        if size >= BATCHSIZE:
+            yield batch.serialize(format="nt")
+            batch = Graph()
+            size = 0
+    if size:
+        yield batch.serialize(format="nt")
+
+
+def iter_turtle(graph: Graph, subjects: Optional[Iterable[Node]] = None) -> Iterator[str]:
+    """Serialises the graph (or only the triples of the specified subjects) as Turtle, one subject at a time.
+    Unlike rdflib's serialiser this does not nest blank nodes or abbreviate URIs, which would require the whole graph in advance."""
+    if subjects is None:
+        subjects = graph.subjects(unique=True)
+    for subject in subjects:
+        objects = defaultdict(list)
+        for _, predicate, o in graph.triples((subject, None, None)):
+            objects[predicate].append(o)
+        if objects:
+            yield subject.n3() + " " + " ;\n    ".join(
+                ("a" if predicate == RDF.type else predicate.n3()) + " " + " , ".join(o.n3() for o in values)
+                for predicate, values in objects.items()
+            ) + " .\n\n"
+
+
+def iter_jsonld(resources: Iterable[URIRef], serialize_resource: Callable[[URIRef], str]) -> Iterator[str]:
+    """Emits a JSON-LD document whose @graph consists of the nodes obtained by serialising each resource separately"""
+    first = True
+    for res in resources:
+        doc = json.loads(serialize_resource(res))
+        if "@graph" in doc:
+            nodes = doc["@graph"]
+        else:
+            nodes = [ { key: value for key, value in doc.items() if key != "@context" } ]
+        for node in nodes:
+            if first:
+                yield "{\n\"@context\": " + json.dumps(doc.get("@context", []), ensure_ascii=False) + ",\n\"@graph\": [\n"
+                first = False
+            else:
+                yield ",\n"
+            yield json.dumps(node, indent=4, ensure_ascii=False, sort_keys=True)
+    if first:
+        yield "{\n\"@graph\": [\n"
+    yield "\n]\n}\n"
+
+
+class Primed:
+    """Wraps an iterator and produces its first item right away, so an error in the serialisation surfaces before a response
+    is started (when it can still be reported properly) rather than halfway through a response that already claimed success"""
+
+    def __init__(self, iterator: Iterator[bytes]):
+        self.iterator = iterator
+        try:
+            self.first = [ next(iterator) ]
+        except StopIteration:
+            self.first = []
+
+    def __iter__(self):
+        return self
+
+    def __next__(self) -> bytes:
+        if self.first:
+            return self.first.pop()
+        return next(self.iterator)
+
+    def cancel(self):
+        if hasattr(self.iterator, "cancel"):
+            self.iterator.cancel()
+
+    def close(self):
+        if hasattr(self.iterator, "close"):
+            self.iterator.close()
@@ -0,0 +1,157 @@
+"""Extraction of the descriptions of selected resources from the graph"""
+
+import threading
+from collections import defaultdict
+from typing import Iterable, Iterator, Optional, Dict, Set, Tuple
+from rdflib import Graph, URIRef, BNode
+from rdflib.term import Node
+from codemeta.common import bind_graph, SDO, RDF, CODEMETA
+
+
+def iter_description(graph: Graph, resources: Iterable[URIRef], restype: URIRef = SDO.SoftwareSourceCode) -> Iterator[tuple]:
+    """Yields the triples of the descriptions of the resources: all their triples along with those of
+    the nodes they reference (recursively), except for other resources of the same type"""
+    queue = list(resources)
+    seen = set(queue)
+    while queue:
+        node = queue.pop()
+        for _, predicate, o in graph.triples((node, None, None)):
+            yield (node, predicate, o)
+            if predicate != RDF.type and isinstance(o, (URIRef, BNode)) and o not in seen and (o, RDF.type, restype) not in graph:
+                seen.add(o)
+                queue.append(o)
+
+
+def extract_subgraph(graph: Graph, resources: Iterable[URIRef], restype: URIRef = SDO.SoftwareSourceCode) -> Graph:
+    """Returns a new graph with the descriptions of the resources: all their triples along with those of
+    the nodes they reference (recursively), except for other resources of the same type"""
+    subgraph = Graph()
+    bind_graph(subgraph)
+    for triple in iter_description(graph, resources, restype):
+        subgraph.add(triple)
+    return subgraph
+
+
+def copy_graph(graph: Graph) -> Graph:
+    """Returns a copy of the graph in memory, with the same identifier and namespace bindings"""
+    copy = Graph(identifier=graph.identifier)
+    for prefix, namespace in graph.namespaces():
+        copy.bind(prefix, namespace, override=True, replace=True)
+    copy.addN((s, p, o, copy) for s, p, o in graph)
+    return copy
+
+
+class SubgraphIndex:
+    """Holds the description of every top-level resource (all SoftwareSourceCode and their target products) as a tuple of triples,
+    so serialising a single resource takes time in proportion to the size of its description rather than to the size of the graph"""
+
+    def __init__(self):
+        self.descriptions: Dict[URIRef, Tuple[tuple, ...]] = {}
+        self.nodes: Dict[Node, Set[URIRef]] = defaultdict(set) #node => resources whose description includes it
+        self.suites: Dict[Node, Set[URIRef]] = defaultdict(set) #tool suite (schema:applicationSuite) => resources in it
+        self.lock = threading.Lock()
+
+    def build(self, graph: Graph):
+        with self.lock:
+            self.descriptions = {}
+            self.nodes = defaultdict(set)
+            self.suites = defaultdict(set)
+            resources = set(s for s, _, _ in graph.triples((None, RDF.type, SDO.SoftwareSourceCode)))
+            resources.update(o for _, _, o in graph.triples((None, CODEMETA.isSourceCodeOf, None)) if isinstance(o, URIRef))
+            for res in resources:
+                self._add(graph, res)
+
+    def copy(self) -> "SubgraphIndex":
+        """Returns a copy that can be updated without affecting this index"""
+        index = SubgraphIndex()
+        with self.lock:
+            index.descriptions = dict(self.descriptions)
+            index.nodes = defaultdict(set, { node: set(resources) for node, resources in self.nodes.items() })
+            index.suites = defaultdict(set, { suite: set(resources) for suite, resources in self.suites.items() })
+        return index
+
+    def update(self, graph: Graph, resources: Iterable[URIRef]):
+        """Updates the descriptions of resources that changed in place (or were added or removed), along with
+        the descriptions of all other resources that share nodes with them"""
+        with self.lock:
+            affected = set()
+            for res in resources:
+                affected.add(res)
+                for o in graph.objects(res, CODEMETA.isSourceCodeOf):
+                    if isinstance(o, URIRef):
+                        affected.add(o)
+                for node in set(s for s, _, _ in self.descriptions.get(res, ())):
+                    affected.update(self.nodes.get(node, ()))
+            for res in affected:
+                self._remove(res)
+            for res in affected:
+                if self.is_toplevel(graph, res):
+                    self._add(graph, res)
+            #nodes the new descriptions share with the descriptions of other resources may have changed as well
+            shared = set()
+            for res in affected:
+                for node in set(s for s, _, _ in self.descriptions.get(res, ())):
+                    shared.update(self.nodes.get(node, ()))
+            for res in shared - affected:
+                self._remove(res)
+                self._add(graph, res)
+
+    def is_toplevel(self, graph: Graph, res: URIRef) -> bool:
+        return (res, RDF.type, SDO.SoftwareSourceCode) in graph or (None, CODEMETA.isSourceCodeOf, res) in graph
+
+    def _add(self, graph: Graph, res: URIRef):
+        triples = tuple(iter_description(graph, [res]))
+        self.descriptions[res] = triples
+        for node in set(s for s, _, _ in triples):
+            self.nodes[node].add(res)
+        for s, predicate, o in triples:
+            if s == res and predicate == SDO.applicationSuite:
+                self.suites[o].add(res)
+
+    def _remove(self, res: URIRef):
+        triples = self.descriptions.pop(res, ())
+        for node in set(s for s, _, _ in triples):
+            resources = self.nodes.get(node)
+            if resources is not None:
+                resources.discard(res)
+                if not resources:
+                    del self.nodes[node]
+        for s, predicate, o in triples:
+            if s == res and predicate == SDO.applicationSuite and o in self.suites:
+                self.suites[o].discard(res)
+                if not self.suites[o]:
+                    del self.suites[o]
+
+    def __contains__(self, res: URIRef) -> bool:
+        return res in self.descriptions
+
+    def __len__(self) -> int:
+        return len(self.descriptions)
+
+    def get(self, resources: Iterable[URIRef], graph: Graph) -> Graph:
+        """Returns a new graph with the descriptions of the resources, those not in the index are extracted from the graph"""
+        subgraph = Graph()
+        bind_graph(subgraph)
+        missing = []
+        for res in resources:
+            triples = self.descriptions.get(res)
+            if triples is None:
+                missing.append(res)
+            else:
+                for triple in triples:
+                    subgraph.add(triple)
+        for triple in iter_description(graph, missing):
+            subgraph.add(triple)
+        return subgraph
+
+    def get_page(self, res: URIRef, graph: Graph) -> Optional[Graph]:
+        """Returns a graph with everything the HTML page of a resource shows: its own description and those of the other
+        resources in the same tool suites. Returns None if the resource is not in the index."""
+        triples = self.descriptions.get(res)
+        if triples is None:
+            return None
+        resources = [res]
+        for s, predicate, o in triples:
+            if s == res and predicate == SDO.applicationSuite:
+                resources += [ x for x in self.suites.get(o, ()) if x != res ]
+        return self.get(resources, graph)
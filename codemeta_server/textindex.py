@@ -0,0 +1,142 @@
+"""Inverted full-text index over literal values of selected predicates"""
+
+import re
+import math
+import bisect
+import threading
+import unicodedata
+from collections import defaultdict
+from typing import Dict, List, Tuple, Iterable, Optional
+from rdflib import Graph, URIRef, Literal
+from codemeta.common import SDO, RDF
+
+#predicate => weight in relevance ranking
+DEFAULT_PREDICATES = {
+    SDO.name: 3.0,
+    SDO.keywords: 2.0,
+    SDO.description: 1.0,
+}
+
+TOKEN_RE = re.compile(r"\w+", re.UNICODE)
+
+#matches on a token of which the query term is only a prefix count for less than exact matches
+PREFIX_PENALTY = 0.5
+
+
+def tokenize(text: str) -> List[str]:
+    """Splits text into normalised tokens: lowercased and stripped of diacritics"""
+    text = unicodedata.normalize("NFKD", text.casefold())
+    text = "".join(c for c in text if not unicodedata.combining(c))
+    return TOKEN_RE.findall(text)
+
+
+class TextIndex:
+    """Inverted index mapping tokens to the resources (of a particular type) in whose literals they occur.
+    Supports prefix matching and tf-idf based relevance ranking."""
+
+    def __init__(self, predicates: Optional[Dict[URIRef,float]] = None, restype: URIRef = SDO.SoftwareSourceCode):
+        self.predicates = predicates if predicates else DEFAULT_PREDICATES
+        self.restype = restype
+        self.postings: Dict[str, Dict[URIRef,float]] = {} #token => resource => weighted term frequency
+        self.vocabulary: List[str] = [] #sorted tokens, for prefix lookups
+        self.documents: Dict[URIRef, Dict[str,float]] = {} #resource => token => weighted term frequency (needed for removal)
+        self.lock = threading.Lock()
+
+    def build(self, graph: Graph):
+        """(Re)builds the entire index from the graph"""
+        documents = {}
+        for res, _, _ in graph.triples((None, RDF.type, self.restype)):
+            documents[res] = self.analyze(graph, res)
+        postings = defaultdict(dict)
+        for res, tokens in documents.items():
+            for token, weight in tokens.items():
+                postings[token][res] = weight
+        with self.lock:
+            self.documents = documents
+            self.postings = dict(postings)
+            self.vocabulary = sorted(self.postings)
+
+    def analyze(self, graph: Graph, res: URIRef) -> Dict[str,float]:
+        tokens = defaultdict(float)
+        for predicate, weight in self.predicates.items():
+            for value in graph.objects(res, predicate):
+                if isinstance(value, Literal):
+                    for token in tokenize(str(value)):
+                        tokens[token] += weight
+        return dict(tokens)
+
+    def copy(self) -> "TextIndex":
+        """Returns a copy that can be updated without affecting this index"""
+        index = TextIndex(self.predicates, self.restype)
+        with self.lock:
+            index.postings = { token: dict(posting) for token, posting in self.postings.items() }
+            index.vocabulary = list(self.vocabulary)
+            index.documents = dict(self.documents)
+        return index
+
+    def update(self, graph: Graph, resources: Iterable[URIRef]):
+        """Updates the index for the specified resources only, resources no longer in the graph are removed"""
+        with self.lock:
+            for res in resources:
+                self._remove(res)
+                if (res, RDF.type, self.restype) in graph:
+                    tokens = self.analyze(graph, res)
+                    self.documents[res] = tokens
+                    for token, weight in tokens.items():
+                        if token not in self.postings:
+                            self.postings[token] = {}
+                            bisect.insort(self.vocabulary, token)
+                        self.postings[token][res] = weight
+
+    def remove(self, res: URIRef):
+        with self.lock:
+            self._remove(res)
+
+    def _remove(self, res: URIRef):
+        for token in self.documents.pop(res, {}):
+            posting = self.postings.get(token)
+            if posting is not None:
+                posting.pop(res, None)
+                if not posting:
+                    del self.postings[token]
+                    i = bisect.bisect_left(self.vocabulary, token)
+                    if i < len(self.vocabulary) and self.vocabulary[i] == token:
+                        del self.vocabulary[i]
+
+    def expand(self, term: str) -> List[str]:
+        """Returns all tokens in the vocabulary that start with the term"""
+        begin = bisect.bisect_left(self.vocabulary, term)
+        end = bisect.bisect_left(self.vocabulary, term + "\U0010ffff")
+        return self.vocabulary[begin:end]
+
+    def search(self, query: str, limit: Optional[int] = None) -> Optional[List[Tuple[URIRef,float]]]:
+        """Returns the resources matching all terms of the query (as prefixes), ordered by descending relevance.
+        Returns None if the query contains no searchable terms at all."""
+        terms = tokenize(query)
+        if not terms:
+            return None
+        with self.lock:
+            total = len(self.documents)
+            scores = None
+            for term in terms:
+                termscores = defaultdict(float)
+                for token in self.expand(term):
+                    posting = self.postings[token]
+                    idf = math.log(1 + total / len(posting))
+                    factor = idf if token == term else idf * PREFIX_PENALTY
+                    for res, weight in posting.items():
+                        termscores[res] += weight * factor
+                if scores is None:
+                    scores = termscores
+                else:
+                    #conjunctive: only resources matching every term remain
+                    scores = { res: score + termscores[res] for res, score in scores.items() if res in termscores }
+                if not scores:
+                    return []
+        results = sorted(scores.items(), key=lambda x: (-x[1], str(x[0])))
+        if limit:
+            results = results[:limit]
+        return results
+
+    def __len__(self):
+        return len(self.documents)
@@ -0,0 +1,240 @@
+"""Validation reports of all resources, collected once per graph generation rather than once per page view"""
+
+import sys
+import re
+import html
+import time
+import threading
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+from typing import Optional, List, Dict, Iterable
+from rdflib import URIRef
+from codemeta.common import AttribDict, SDO, RDF
+from codemeta_server.store import reopen
+
+#severities of the messages in a report, from most to least severe
+SEVERITIES = ("Violation", "Warning", "Info", "Unknown")
+
+#the messages in the body of a report produced by codemetapy look like: 1. Warning: message (cause)
+MESSAGE_PATTERN = re.compile(r"^\s*\d+\.\s+(Violation|Warning|Info|Unknown):\s*(.*)$")
+
+#number of resources validated per task in a validation process
+BATCHSIZE = 25
+
+_VALIDATE = None #(store, state), set prior to forking validation processes
+
+
+class Report:
+    """Summary of the validation report of a single resource"""
+
+    def __init__(self, resource: URIRef, name: str, version: str, review: Optional[URIRef], rating: Optional[int], body: str, author: str = "", date: str = "", computed: bool = False):
+        self.resource = resource
+        self.name = name
+        self.version = version
+        self.review = review #the schema:Review node in the graph (None if computed by the server)
+        self.rating = rating
+        self.body = body
+        self.author = author
+        self.date = date
+        self.computed = computed
+        self.messages: List[tuple] = [] #(severity, message)
+        for line in body.split("\n"):
+            match = MESSAGE_PATTERN.match(line)
+            if match:
+                self.messages.append((match.group(1), match.group(2).strip()))
+        self.counts = { severity: sum(1 for s, _ in self.messages if s == severity) for severity in SEVERITIES }
+
+    @property
+    def severity(self) -> str:
+        """The most severe kind of message in the report, or 'none' if it validates perfectly"""
+        for severity in SEVERITIES:
+            if self.counts[severity]:
+                return severity.lower()
+        return "none"
+
+    def to_dict(self, url: str) -> dict:
+        return {
+            "resource": str(self.resource),
+            "url": url,
+            "name": self.name,
+            "version": self.version,
+            "rating": self.rating,
+            "severity": self.severity,
+            "counts": { severity.lower(): count for severity, count in self.counts.items() },
+            "author": self.author,
+            "datePublished": self.date,
+            "computed": self.computed,
+            "report": self.body,
+        }
+
+
+def get_report(graph, res: URIRef) -> Optional[Report]:
+    """Returns the report of a resource from the schema:Review the graph holds for it (if any)"""
+    for _, _, review in graph.triples((res, SDO.review, None)):
+        if (review, RDF.type, SDO.Review) not in graph:
+            continue
+        body = graph.value(review, SDO.reviewBody)
+        if body is None:
+            continue
+        rating = graph.value(review, SDO.reviewRating)
+        try:
+            rating = int(rating) if rating is not None else None
+        except (ValueError, TypeError):
+            rating = None
+        return Report(res, str(graph.value(res, SDO.name) or ""), str(graph.value(res, SDO.version) or ""),
+                      review if isinstance(review, URIRef) else None, rating, str(body),
+                      str(graph.value(review, SDO.author) or ""), str(graph.value(review, SDO.datePublished) or ""))
+    return None
+
+
+def validate_resources(resources: List[URIRef], store, state) -> List[Report]:
+    """Validates resources against the SHACL shapes. Each resource is validated on its own description only,
+    in a copy, so the graph that is served is left untouched."""
+    from codemeta.validation import validate
+    args = AttribDict({ "validate": store.shacl, "baseuri": store.server.baseuri, "textv": None })
+    reports = []
+    for res in resources:
+        try:
+            subgraph = store.server.describe([res], state)
+            validate(subgraph, res, args, state.contextgraph)
+            report = get_report(subgraph, res)
+        except Exception as e: #pylint: disable=broad-except
+            print(f"Unable to validate {res}: {e}",file=sys.stderr)
+            continue
+        if report is not None:
+            report.review = None #generated anew on every validation, so it can not be referred to
+            report.computed = True
+            reports.append(report)
+    return reports
+
+
+def _validate_batch(resources: List[URIRef]) -> List[Report]:
+    """Entrypoint for validation processes"""
+    store, state = _VALIDATE
+    return validate_resources(resources, store, state)
+
+
+class ValidationStore:
+    """Holds the validation reports of all resources for the current generation of the graph.
+    Reports are taken from the graph (as added by the harvester), resources without a report are validated by the
+    server itself if a SHACL file is configured, in parallel processes when building in a process that can safely fork."""
+
+    def __init__(self, server, shacl: Optional[str] = None, processes: int = 0):
+        self.server = server
+        self.shacl = shacl
+        self.processes = processes
+        self.reports: Dict[URIRef, Report] = {}
+        self.reviews: Dict[URIRef, Report] = {} #review => report
+        self.generation = None
+        self.lock = threading.Lock()
+
+    def ready(self) -> bool:
+        return self.generation == self.server.generation
+
+    def build(self, resources: Optional[Iterable[URIRef]] = None, fork: bool = False):
+        """Collects the reports for the current graph generation (a no-op if they exist already).
+        If the changed resources are passed and the reports are those of the generation the current one was derived from, only those are redone.
+        Validation processes are only forked if requested, which is only safe if the process has no other threads."""
+        with self.lock:
+            state = self.server.graphstate
+            generation = state.generation
+            if self.generation == generation:
+                return
+            begintime = time.time()
+            if resources is not None and self.generation == generation - 1:
+                reports = dict(self.reports)
+                resources = set(resources)
+                for res in resources:
+                    reports.pop(res, None)
+            else:
+                reports = {}
+                resources = set(s for s, _, _ in state.graph.triples((None, RDF.type, SDO.SoftwareSourceCode)))
+            missing = []
+            for res in sorted(resources):
+                report = get_report(state.graph, res) if (res, RDF.type, SDO.SoftwareSourceCode) in state.graph else None
+                if report is not None:
+                    reports[res] = report
+                elif self.shacl and (res, RDF.type, SDO.SoftwareSourceCode) in state.graph:
+                    missing.append(res)
+            for report in self.validate(missing, state, fork):
+                reports[report.resource] = report
+            if self.server.graphstate is not state:
+                #a newer generation was published in the meantime, the result is outdated already
+                return
+            self.reports = reports
+            self.reviews = { report.review: report for report in reports.values() if report.review is not None }
+            self.generation = generation
+            print(f"Collected {len(reports)} validation reports ({len(missing)} validated) for graph generation {generation} in {time.time() - begintime:.2f}s",file=sys.stderr)
+
+    def validate(self, resources: List[URIRef], state, fork: bool = False) -> List[Report]:
+        """Validates the resources, in parallel forked processes if allowed and there are enough of them"""
+        global _VALIDATE
+        batches = [ resources[i:i+BATCHSIZE] for i in range(0, len(resources), BATCHSIZE) ]
+        reports = []
+        if fork and self.processes > 1 and len(batches) > 1 and "fork" in multiprocessing.get_all_start_methods():
+            #the validation processes are forked, so they share the graph with this process rather than having to load it
+            _VALIDATE = (self, state)
+            try:
+                with ProcessPoolExecutor(max_workers=self.processes, mp_context=multiprocessing.get_context("fork"), initializer=reopen, initargs=(state,)) as pool:
+                    for result in pool.map(_validate_batch, batches):
+                        reports += result
+            finally:
+                _VALIDATE = None
+        else:
+            for batch in batches:
+                reports += validate_resources(batch, self, state)
+        return reports
+
+    def build_in_background(self, resources: Optional[Iterable[URIRef]] = None):
+        self.server.run_in_background(self.build, resources)
+
+    def get(self, res: URIRef, state) -> Optional[Report]:
+        """Returns the report for a resource or a review, falls back to the graph itself if the reports are not collected yet"""
+        if self.generation == state.generation:
+            return self.reports.get(res) or self.reviews.get(res)
+        report = get_report(state.graph, res)
+        if report is None and (res, RDF.type, SDO.Review) in state.graph:
+            for subject, _, _ in state.graph.triples((None, SDO.review, res)):
+                return get_report(state.graph, subject)
+        return report
+
+    def select(self, severity: Optional[List[str]] = None) -> Optional[List[Report]]:
+        """Returns the reports (ordered by name and version) of the latest generation they were collected for, optionally only
+        those of the specified severities. Returns None if the reports were never collected."""
+        if self.generation is None:
+            return None
+        reports = sorted(self.reports.values(), key=lambda report: (report.name.lower(), report.version, str(report.resource)))
+        if severity:
+            reports = [ report for report in reports if report.severity in severity ]
+        return reports
+
+
+def summarize(reports: List[Report]) -> dict:
+    """Summary statistics over reports"""
+    ratings = [ report.rating for report in reports if report.rating is not None ]
+    return {
+        "reports": len(reports),
+        "severity": { severity: sum(1 for report in reports if report.severity == severity) for severity in [ s.lower() for s in SEVERITIES ] + ["none"] },
+        "messages": { severity.lower(): sum(report.counts[severity] for report in reports) for severity in SEVERITIES },
+        "ratings": { str(rating): ratings.count(rating) for rating in sorted(set(ratings), reverse=True) },
+        "meanRating": round(sum(ratings) / len(ratings), 2) if ratings else None,
+    }
+
+
+def render_html(reports: List[Report], summary: dict, urls: Dict[URIRef, str], title: str, css: List[str], severity: Optional[List[str]] = None) -> str:
+    """Renders an overview of the reports as a simple HTML page"""
+    rows = []
+    for report in reports:
+        counts = " ".join(f"{count} {s.lower()}" for s, count in report.counts.items() if count)
+        rows.append(f"<tr class=\"{report.severity}\"><td><a href=\"{html.escape(urls[report.resource])}\">{html.escape(report.name or str(report.resource))}</a></td>"
+                    f"<td>{html.escape(report.version)}</td><td>{'' if report.rating is None else report.rating}</td><td>{report.severity}</td><td>{counts}</td>"
+                    f"<td><details><summary>report</summary><pre>{html.escape(report.body)}</pre></details></td></tr>")
+    filters = " | ".join(f"<a href=\"?severity={s}\">{s}</a> ({count})" for s, count in summary["severity"].items())
+    stylesheets = "".join(f"<link rel=\"stylesheet\" href=\"{html.escape(href)}\" />" for href in css)
+    heading = "Validation reports" + (" (" + ", ".join(html.escape(s) for s in severity) + ")" if severity else "")
+    return f"""<!DOCTYPE html>
+<html><head><meta charset="utf-8" /><title>{html.escape(title)} - Validation reports</title>{stylesheets}</head>
+<body><main><h1>{heading}</h1>
+<p>{summary['reports']} reports, mean rating: {summary['meanRating'] if summary['meanRating'] is not None else '-'}. Filter by severity: <a href="?">all</a> | {filters}</p>
+<table class="validation"><thead><tr><th>Name</th><th>Version</th><th>Rating</th><th>Severity</th><th>Messages</th><th>Report</th></tr></thead>
+<tbody>{"".join(rows)}</tbody></table></main></body></html>"""
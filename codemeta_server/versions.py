@@ -0,0 +1,259 @@
+"""Index of the available versions of each resource, with resolution of version ranges"""
+
+import re
+import bisect
+import threading
+from typing import Dict, List, Tuple, Set, Iterable, Optional
+from packaging.version import Version, InvalidVersion
+from rdflib import Graph, URIRef
+from codemeta.common import SDO, RDF, CODEMETA
+
+RANGE_OPERATORS = ("~", "^", ">", "<", "=", "!")
+
+
+class InvalidRange(ValueError):
+    pass
+
+
+def parse_version(s: str) -> Optional[Version]:
+    """Parses a version string, returns None if it is not a valid version"""
+    try:
+        return Version(re.sub("^v", "", s))
+    except InvalidVersion:
+        return None
+
+
+def is_range(s: str) -> bool:
+    """Checks whether a path component is a version range (rather than a version)"""
+    return s.startswith(RANGE_OPERATORS) or s.endswith((".*", ".x"))
+
+
+def parse_range(spec: str) -> Tuple[Optional[Tuple[Version,bool]], Optional[Tuple[Version,bool]], Set[Version]]:
+    """Parses a version range into a lower bound, an upper bound (each a version and whether it is inclusive, or None if unbounded) and a set of excluded versions.
+    Supported are comma separated comparisons (e.g. >=2,<3 or !=1.2.1), tilde ranges (~1.2 means >=1.2,<1.3), caret ranges (^1.2 means >=1.2,<2) and wildcards (1.2.* or 1.2.x)."""
+    lower = None
+    upper = None
+    excluded = set()
+
+    def setlower(version: Version, inclusive: bool):
+        nonlocal lower
+        if lower is None or version > lower[0] or (version == lower[0] and not inclusive):
+            lower = (version, inclusive)
+
+    def setupper(version: Version, inclusive: bool):
+        nonlocal upper
+        if upper is None or version < upper[0] or (version == upper[0] and not inclusive):
+            upper = (version, inclusive)
+
+    for clause in re.split(r"[,\s]+", spec.strip()):
+        if not clause:
+            continue
+        operator, value = re.match(r"^(~=|~|\^|>=|<=|==|!=|>|<|=)?(.*)$", clause).groups()
+        if value.endswith((".*", ".x")):
+            if operator not in (None, "=", "=="):
+                raise InvalidRange(f"Wildcards can not be combined with {operator}")
+            operator = "~"
+            value = value[:-2]
+        version = parse_version(value)
+        if version is None:
+            raise InvalidRange(f"Invalid version in range: {value}")
+        release = version.release
+        if operator in ("~", "~="):
+            #allow changes in the last specified component only
+            prefix = list(release[:-1] if operator == "~=" and len(release) > 1 else release[:2])
+            prefix[-1] += 1
+            setlower(version, True)
+            setupper(Version(".".join(str(x) for x in prefix)), False)
+        elif operator == "^":
+            #allow changes that do not modify the left-most non-zero component
+            components = list(release) + [0] * (3 - len(release))
+            i = next((i for i, x in enumerate(components) if x != 0), len(components) - 1)
+            prefix = components[:i+1]
+            prefix[-1] += 1
+            setlower(version, True)
+            setupper(Version(".".join(str(x) for x in prefix)), False)
+        elif operator == ">=":
+            setlower(version, True)
+        elif operator == ">":
+            setlower(version, False)
+        elif operator == "<=":
+            setupper(version, True)
+        elif operator == "<":
+            setupper(version, False)
+        elif operator == "!=":
+            excluded.add(version)
+        else: #exact
+            setlower(version, True)
+            setupper(version, True)
+    return lower, upper, excluded
+
+
+class VersionIndex:
+    """Maps each resource identifier (e.g. frog, or commandlineapplication/frog for target products) to its available versions, kept sorted so the latest version or the latest version in a range is found by bisection.
+    Versions that can not be parsed (e.g. snapshot) are considered more recent than any valid version."""
+
+    def __init__(self, baseuri: str):
+        self.baseuri = baseuri
+        self.sorted: Dict[str,List[Version]] = {} #identifier => valid versions, in ascending order
+        self.labels: Dict[str,Dict[Version,List[str]]] = {} #identifier => version => version strings as used in the URIs (multiple strings may denote the same version, e.g. 1.0 and v1.0)
+        self.invalid: Dict[str,List[str]] = {} #identifier => unparseable versions, in descending (lexicographical) order
+        self.targets: Dict[URIRef,Set[URIRef]] = {} #source code => target products (needed for removal)
+        self.targetcount: Dict[URIRef,int] = {} #target product => number of source code resources referring to it
+        self.lock = threading.Lock()
+
+    def __getstate__(self) -> dict:
+        #the index is stored in snapshots, the lock can not be
+        state = self.__dict__.copy()
+        del state['lock']
+        return state
+
+    def __setstate__(self, state: dict):
+        self.__dict__.update(state)
+        self.lock = threading.Lock()
+
+    def build(self, graph: Graph):
+        """(Re)builds the entire index from the graph"""
+        with self.lock:
+            self.sorted = {}
+            self.labels = {}
+            self.invalid = {}
+            self.targets = {}
+            self.targetcount = {}
+            for res, _, _ in graph.triples((None, RDF.type, SDO.SoftwareSourceCode)):
+                self._add_resource(graph, res)
+
+    def copy(self) -> "VersionIndex":
+        """Returns a copy that can be updated without affecting this index"""
+        with self.lock:
+            index = VersionIndex(self.baseuri)
+            index.sorted = { identifier: list(versions) for identifier, versions in self.sorted.items() }
+            index.labels = { identifier: { version: list(labels) for version, labels in versions.items() } for identifier, versions in self.labels.items() }
+            index.invalid = { identifier: list(versions) for identifier, versions in self.invalid.items() }
+            index.targets = { res: set(targets) for res, targets in self.targets.items() }
+            index.targetcount = dict(self.targetcount)
+        return index
+
+    def update(self, graph: Graph, resources: Iterable[URIRef]):
+        """Updates the index for the specified (source code) resources only, resources no longer in the graph are removed"""
+        with self.lock:
+            for res in resources:
+                self._remove_resource(res)
+                if (res, RDF.type, SDO.SoftwareSourceCode) in graph:
+                    self._add_resource(graph, res)
+
+    def split(self, res: URIRef, components: int) -> Optional[Tuple[str,str]]:
+        """Splits a URI into an identifier and a version, if it consists of the specified number of components after the base URI"""
+        if str(res).startswith(self.baseuri):
+            path = str(res)[len(self.baseuri):].strip("/").split("/")
+            if len(path) == components:
+                return "/".join(path[:-1]), path[-1]
+        return None
+
+    def _add_resource(self, graph: Graph, res: URIRef):
+        found = self.split(res, 2)
+        if found:
+            self.add(*found)
+        targets = set()
+        for _, _, target in graph.triples((res, CODEMETA.isSourceCodeOf, None)):
+            found = self.split(target, 3) #interfacetype/name/version
+            if found and target not in targets:
+                targets.add(target)
+                self.targetcount[target] = self.targetcount.get(target, 0) + 1
+                self.add(*found)
+        if targets:
+            self.targets[res] = targets
+
+    def _remove_resource(self, res: URIRef):
+        found = self.split(res, 2)
+        if found:
+            self.remove(*found)
+        for target in self.targets.pop(res, ()):
+            self.targetcount[target] -= 1
+            if not self.targetcount[target]:
+                del self.targetcount[target]
+                self.remove(*self.split(target, 3))
+
+    def add(self, identifier: str, versionlabel: str):
+        version = parse_version(versionlabel)
+        if version is None:
+            invalid = self.invalid.setdefault(identifier, [])
+            if versionlabel not in invalid:
+                invalid.append(versionlabel)
+                invalid.sort(reverse=True)
+        else:
+            labels = self.labels.setdefault(identifier, {})
+            if version not in labels:
+                bisect.insort(self.sorted.setdefault(identifier, []), version)
+                labels[version] = []
+            if versionlabel not in labels[version]:
+                labels[version].append(versionlabel)
+
+    def remove(self, identifier: str, versionlabel: str):
+        version = parse_version(versionlabel)
+        if version is None:
+            if versionlabel in self.invalid.get(identifier, []):
+                self.invalid[identifier].remove(versionlabel)
+                if not self.invalid[identifier]:
+                    del self.invalid[identifier]
+        elif versionlabel in self.labels.get(identifier, {}).get(version, []):
+            self.labels[identifier][version].remove(versionlabel)
+            if not self.labels[identifier][version]:
+                del self.labels[identifier][version]
+                versions = self.sorted[identifier]
+                del versions[bisect.bisect_left(versions, version)]
+                if not versions:
+                    del self.sorted[identifier]
+                    del self.labels[identifier]
+
+    def __contains__(self, identifier: str) -> bool:
+        return identifier in self.sorted or identifier in self.invalid
+
+    def __len__(self) -> int:
+        return len(set(self.sorted) | set(self.invalid))
+
+    def identifiers(self) -> List[str]:
+        return sorted(set(self.sorted) | set(self.invalid))
+
+    def latest(self, identifier: str) -> Optional[str]:
+        """Returns the latest version"""
+        with self.lock:
+            if identifier in self.invalid:
+                return self.invalid[identifier][0]
+            elif identifier in self.sorted:
+                return self.labels[identifier][self.sorted[identifier][-1]][0]
+            return None
+
+    def versions(self, identifier: str) -> List[str]:
+        """Returns all versions, the latest first"""
+        with self.lock:
+            return list(self.invalid.get(identifier, [])) + [ label for version in reversed(self.sorted.get(identifier, [])) for label in self.labels[identifier][version] ]
+
+    def get(self, identifier: str, default=None) -> List[str]:
+        """Returns all versions, the latest first (for compatibility with the former plain version map)"""
+        if identifier not in self:
+            return default
+        return self.versions(identifier)
+
+    def resolve(self, identifier: str, spec: str) -> Optional[str]:
+        """Returns the latest version that satisfies the specification: latest or a version range (see parse_range()). Raises InvalidRange if the range can not be parsed."""
+        if spec == "latest":
+            return self.latest(identifier)
+        lower, upper, excluded = parse_range(spec)
+        with self.lock:
+            versions = self.sorted.get(identifier, [])
+            if upper is None:
+                i = len(versions)
+            elif upper[1]:
+                i = bisect.bisect_right(versions, upper[0])
+            else:
+                i = bisect.bisect_left(versions, upper[0])
+            while i > 0:
+                i -= 1
+                version = versions[i]
+                if lower is not None and (version < lower[0] or (version == lower[0] and not lower[1])):
+                    return None
+                if upper is not None and not upper[1] and version.is_prerelease and not upper[0].is_prerelease and Version(version.base_version) >= upper[0]:
+                    continue #as in PEP 440, <2 does not admit pre-releases of 2 itself (such as 2.0rc1)
+                if version not in excluded:
+                    return self.labels[identifier][version][0]
+            return None
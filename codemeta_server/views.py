@@ -0,0 +1,154 @@
+"""Materialized views of the indices: the listings of the card, table and service indices, the per-resource fields they
+are made of and the rendered unfiltered index pages. Built once per graph generation, in the background."""
+
+import sys
+import time
+import threading
+from typing import Optional, List, Dict, Iterable
+from rdflib import Graph, URIRef
+from codemeta.common import SDO, RDF, CODEMETA
+
+#the index templates whose unfiltered pages are materialized
+TEMPLATES = ("cardindex.html", "tableindex.html", "serviceindex.html")
+
+#types of target products that the service index lists (if they have a URL)
+SERVICETYPES = (SDO.WebApplication, SDO.WebSite, SDO.NotebookApplication, SDO.WebPage)
+
+
+class Summary:
+    """The fields of a single resource that the index listings are made of"""
+
+    def __init__(self, graph: Graph, res: URIRef):
+        self.res = res
+        name = graph.value(res, SDO.name)
+        identifier = graph.value(res, SDO.identifier)
+        #the same label codemeta2html uses in its indices
+        if name:
+            self.label = str(name)
+        elif identifier:
+            self.label = str(identifier).strip("/ \n").capitalize()
+        else:
+            self.label = "~untitled"
+        self.identifier = str(identifier) if identifier else ""
+        self.version = str(graph.value(res, SDO.version) or "")
+        self.suites = sorted(set(str(suite) for suite in graph.objects(res, SDO.applicationSuite)))
+        self.services = sorted(str(target) for target in graph.objects(res, CODEMETA.isSourceCodeOf)
+                               if (target, SDO.url, None) in graph and any((target, RDF.type, t) in graph for t in SERVICETYPES))
+
+
+def collect(graph: Graph, resources: Optional[Iterable[URIRef]] = None, summaries: Optional[Dict[URIRef, Summary]] = None) -> Dict[URIRef, Summary]:
+    """Collects the summaries of all source code resources, or updates earlier summaries for the passed resources only"""
+    if resources is None or summaries is None:
+        resources = set(s for s, _, _ in graph.triples((None, RDF.type, SDO.SoftwareSourceCode)))
+        summaries = {}
+    else:
+        summaries = dict(summaries)
+    for res in resources:
+        if (res, RDF.type, SDO.SoftwareSourceCode) in graph:
+            summaries[res] = Summary(graph, res)
+        else:
+            summaries.pop(res, None)
+    return summaries
+
+
+class IndexView:
+    """The listings of one generation of the graph, in the order in which the indices present them"""
+
+    def __init__(self, generation: int, summaries: Dict[URIRef, Summary]):
+        self.generation = generation
+        self.summaries = summaries
+        groups = {}
+        for summary in summaries.values():
+            if summary.suites:
+                for suite in summary.suites:
+                    groups.setdefault((suite, True), []).append(summary) #explicit group
+            else:
+                groups.setdefault((summary.label, False), []).append(summary) #ad-hoc group (singleton)
+        #grouped and by label, like codemeta2html's get_index(), resources with the same label are ordered by URI so the order is stable
+        self.groups = [ (group, explicit, [ (s.res, s.label) for s in sorted(members, key=lambda s: (s.label.lower(), str(s.res))) ])
+                        for (group, explicit), members in sorted(groups.items(), key=lambda x: (x[0][0].lower(), x[0][0], not x[0][1])) ]
+        seen = set()
+        self.catalogue: List[URIRef] = [] #all resources, once each (resources may be in multiple groups)
+        for _, _, members in self.groups:
+            for res, _ in members:
+                if res not in seen:
+                    seen.add(res)
+                    self.catalogue.append(res)
+        self.services = [ res for res in self.catalogue if summaries[res].services ]
+        self.rank = { res: i for i, res in enumerate(sorted(summaries, key=lambda res: (summaries[res].label.lower(), str(res)))) }
+        self.pages: Dict[str, str] = {} #index template => rendered unfiltered index (html)
+
+    def order(self, resources: Iterable[URIRef]) -> List[URIRef]:
+        """Orders resources by label, resources that are not in the view go last"""
+        last = len(self.rank)
+        return sorted(resources, key=lambda res: (self.rank.get(res, last), str(res)))
+
+    def select_services(self, resources: Iterable[URIRef]) -> List[URIRef]:
+        """Returns only those resources that provide a service, as those are all the service index shows"""
+        return [ res for res in resources if res in self.summaries and self.summaries[res].services ]
+
+
+class ViewStore:
+    """Holds the materialized views of the indices for the current generation of the graph. The listings are updated
+    incrementally when single resources are changed, the unfiltered index pages are rendered anew."""
+
+    def __init__(self, server):
+        self.server = server
+        self.lock = threading.Lock()
+
+    def get(self, state) -> IndexView:
+        """Returns the view of a graph generation. If it was not built yet, the listings are computed on the spot (rendering the pages is left to the background),
+        only for the changed resources if the state was derived from that of the previous view."""
+        view = state.view
+        if view is None or view.generation != state.generation:
+            generation = state.generation
+            if view is not None and view.generation == generation - 1 and state.changed is not None:
+                summaries = collect(state.graph, state.changed, view.summaries)
+            else:
+                summaries = collect(state.graph)
+            view = IndexView(generation, summaries)
+            if state.generation == generation and (state.view is None or state.view.generation != generation):
+                state.view = view
+        return view
+
+    def page(self, indextemplate: str, state) -> Optional[str]:
+        """Returns the rendered unfiltered index, or None if it is not available (yet)"""
+        view = state.view
+        if view is None or view.generation != state.generation:
+            return None
+        return view.pages.get(indextemplate)
+
+    def build(self, resources: Optional[Iterable[URIRef]] = None):
+        """Builds the view for the current graph generation (a no-op if it exists already).
+        If the changed resources are passed and the previous view is that of the generation the current one was derived from, only their summaries are redone."""
+        with self.lock:
+            state = self.server.graphstate
+            generation = state.generation
+            previous = state.view
+            if previous is not None and previous.generation == generation and previous.pages:
+                return
+            begintime = time.time()
+            if previous is not None and previous.generation == generation:
+                summaries = previous.summaries
+            elif resources is not None and previous is not None and previous.generation == generation - 1:
+                summaries = collect(state.graph, resources, previous.summaries)
+            else:
+                summaries = collect(state.graph)
+            view = IndexView(generation, summaries)
+            if not self.server.pagesize:
+                #with a page size, unfiltered indices are paginated so there is no single page to materialize
+                for indextemplate in TEMPLATES:
+                    try:
+                        view.pages[indextemplate] = self.server.render(None, "html", state, sparql_query=None, indextemplate=indextemplate, q="")
+                    except Exception as e: #pylint: disable=broad-except
+                        print(f"Unable to render {indextemplate}: {e}",file=sys.stderr)
+                    if self.server.graphstate is not state:
+                        #a newer generation was published in the meantime, the result is outdated already
+                        return
+            if self.server.graphstate is not state:
+                return
+            state.view = view
+            print(f"Built index views ({len(summaries)} resources) for graph generation {generation} in {time.time() - begintime:.2f}s",file=sys.stderr)
+
+    def build_in_background(self, resources: Optional[Iterable[URIRef]] = None):
+        self.server.run_in_background(self.build, resources)
@@ -0,0 +1,305 @@
+"""Serving with multiple worker processes forked from a master process that holds the graph, so the graph is shared copy-on-write rather than loaded by each worker"""
+
+import sys
+import os
+import gc
+import shutil
+import tempfile
+import time
+import signal
+import socket
+import traceback
+from typing import Dict, List, Optional
+from codemeta_server.main import filestat
+from codemeta_server.health import LoadProgress
+
+#a worker that exits sooner than this after being started is considered to have failed to start, and is restarted with a delay
+MINLIFETIME = 5
+
+#maximum delay (in seconds) before restarting a worker that keeps failing
+MAXBACKOFF = 30
+
+
+def memory_usage(pid: int) -> Optional[Dict[str,int]]:
+    """Returns the memory usage of a process in kB: rss (resident), pss (proportional share), shared and private.
+    Memory shared copy-on-write with the master counts as shared until a worker writes to it. Only available on Linux."""
+    usage = { "rss": 0, "pss": 0, "shared": 0, "private": 0 }
+    try:
+        with open(f"/proc/{pid}/smaps_rollup",'r',encoding='utf-8') as f:
+            for line in f:
+                fields = line.split()
+                if len(fields) >= 2 and fields[1].isdigit():
+                    key = fields[0].rstrip(":")
+                    if key == "Rss":
+                        usage["rss"] = int(fields[1])
+                    elif key == "Pss":
+                        usage["pss"] = int(fields[1])
+                    elif key.startswith("Shared_"):
+                        usage["shared"] += int(fields[1])
+                    elif key.startswith("Private_"):
+                        usage["private"] += int(fields[1])
+    except OSError:
+        return None
+    return usage
+
+
+class Master:
+    """Loads the graph once, then forks worker processes that serve requests on a shared socket.
+    The master restarts workers that die, and handles reloads (SIGHUP, changes to the graph file or the logs) by
+    loading the new graph itself and then replacing all workers by ones forked from the new state. Updates of single
+    resources received by workers are queued for the master (SIGUSR1), which applies them and replaces the workers likewise."""
+
+    def __init__(self, app, host: str, port: int, workers: int, statsinterval: int = 300, **uvicornargs):
+        self.app = app
+        self.host = host
+        self.port = port
+        self.numworkers = workers
+        self.statsinterval = statsinterval
+        self.uvicornargs = uvicornargs
+        self.workers: Dict[int,float] = {} #pid => start time, of the current generation of workers
+        self.retiring: Dict[int,float] = {} #pid => time the worker was asked to stop
+        self.restarts: List[float] = [] #times at which exited workers are due to be replaced
+        self.failures = 0
+        self.socket = None
+        self.stopping = False
+        self.reloadrequested = False
+        self.updaterequested = False
+
+    def run(self):
+        self.socket = socket.socket(socket.AF_INET6 if ":" in self.host else socket.AF_INET, socket.SOCK_STREAM)
+        self.socket.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+        self.socket.bind((self.host, self.port))
+        self.socket.listen(2048)
+        self.socket.set_inheritable(True)
+        signal.signal(signal.SIGHUP, self.handle_reload)
+        signal.signal(signal.SIGUSR1, self.handle_update)
+        self.app.spooldir = tempfile.mkdtemp(prefix="codemeta-server-updates-")
+        self.app.progress.filename = os.path.join(self.app.spooldir, "progress") #shared with the workers for the readiness endpoint
+        self.app.progress.save()
+        self.app.writehook = self.stop_workers
+        signal.signal(signal.SIGTERM, self.handle_stop)
+        signal.signal(signal.SIGINT, self.handle_stop)
+        print(f"Master process {os.getpid()} serving on {self.host}:{self.port} with {self.numworkers} workers",file=sys.stderr)
+        if self.app.graphstate is None:
+            #the workers answer health checks (and refuse other requests) while the master loads the graph, they are replaced once it is loaded
+            self.app.wait_idle()
+            for _ in range(self.numworkers):
+                self.spawn()
+            if self.app.load_initial(finish=False):
+                self.replace_workers(self.app.progress)
+                self.app.progress.finish()
+        else:
+            self.prepare()
+            for _ in range(self.numworkers):
+                self.spawn()
+        laststat = filestat(self.app.graphfile)
+        pendingstat = None
+        now = time.time()
+        nextreloadcheck = now + self.app.reloadinterval
+        nextlogcheck = now + self.app.logwatchinterval
+        nextstats = now + min(10, self.statsinterval)
+        while not self.stopping:
+            time.sleep(1)
+            self.reap()
+            self.restart()
+            now = time.time()
+            if self.app.reloadinterval and now >= nextreloadcheck:
+                nextreloadcheck = now + self.app.reloadinterval
+                stat = filestat(self.app.graphfile)
+                if stat is None or stat == laststat:
+                    pendingstat = None
+                elif stat == pendingstat:
+                    #unchanged since the previous poll, so writing is finished
+                    laststat = stat
+                    pendingstat = None
+                    self.reloadrequested = True
+                else:
+                    pendingstat = stat
+            if self.reloadrequested:
+                self.reloadrequested = False
+                self.reload()
+            elif self.updaterequested:
+                self.updaterequested = False
+                self.apply_updates()
+            elif self.app.logstore and self.app.logwatchinterval and now >= nextlogcheck:
+                nextlogcheck = now + self.app.logwatchinterval
+                self.update_logs()
+            if self.statsinterval and now >= nextstats:
+                nextstats = now + self.statsinterval
+                self.report()
+        self.shutdown()
+
+    def handle_reload(self, signum, frame):
+        self.reloadrequested = True
+
+    def handle_update(self, signum, frame):
+        self.updaterequested = True
+
+    def handle_stop(self, signum, frame):
+        self.stopping = True
+
+    def prepare(self, progress: Optional[LoadProgress] = None):
+        """Prepares the state for forking: everything that is derived from the graph is built here once so workers inherit it,
+        and the garbage collector is told to leave all existing objects alone so it does not dirty the shared pages"""
+        if progress is None: progress = LoadProgress() #only the initial load reports its progress
+        #no threads may hold locks when forking (the workers, but also the validation and pre-render processes)
+        self.app.wait_idle()
+        progress.begin("dumps")
+        self.app.dumps.build()
+        progress.begin("validation")
+        self.app.validation.build(fork=True)
+        progress.begin("views")
+        self.app.views.build()
+        if self.app.pagestore:
+            progress.begin("prerender")
+            self.app.pagestore.build(fork=True)
+        progress.begin("workers")
+        self.app.wait_idle() #threads do not survive a fork anyway
+        gc.collect()
+        gc.freeze()
+
+    def spawn(self):
+        pid = os.fork()
+        if pid == 0:
+            #worker process
+            exitcode = 0
+            try:
+                for signum in (signal.SIGHUP, signal.SIGUSR1, signal.SIGTERM, signal.SIGINT):
+                    signal.signal(signum, signal.SIG_DFL)
+                self.run_worker()
+            except Exception: #pylint: disable=broad-except
+                traceback.print_exc(file=sys.stderr)
+                exitcode = 1
+            finally:
+                sys.stderr.flush()
+                os._exit(exitcode)
+        self.workers[pid] = time.time()
+
+    def run_worker(self):
+        import uvicorn
+        self.app.after_fork(os.getppid())
+        config = uvicorn.Config(self.app, **self.uvicornargs)
+        uvicorn.Server(config).run(sockets=[self.socket])
+
+    def reap(self):
+        """Collects exited workers and schedules their replacement if they belong to the current generation. Workers that keep
+        failing right after being started are replaced with an increasing delay."""
+        while True:
+            try:
+                pid, status = os.waitpid(-1, os.WNOHANG)
+            except ChildProcessError:
+                return
+            if pid == 0:
+                return
+            if pid in self.retiring:
+                del self.retiring[pid]
+            elif pid in self.workers:
+                starttime = self.workers.pop(pid)
+                print(f"Worker {pid} exited unexpectedly (status {status})",file=sys.stderr)
+                if self.stopping:
+                    continue
+                now = time.time()
+                if now - starttime < MINLIFETIME:
+                    self.failures += 1
+                    delay = min(2 ** self.failures, MAXBACKOFF)
+                    print(f"Restarting worker in {delay}s",file=sys.stderr)
+                    self.restarts.append(now + delay)
+                else:
+                    self.failures = 0
+                    self.restarts.append(now)
+
+    def restart(self):
+        """Replaces the exited workers that are due"""
+        now = time.time()
+        due = [ t for t in self.restarts if t <= now ]
+        self.restarts = [ t for t in self.restarts if t > now ]
+        for _ in due:
+            self.spawn()
+
+    def reload(self):
+        """Loads a new state and replaces all workers, the old workers finish the requests they are handling first"""
+        begintime = time.time()
+        print(f"Reloading graph from {self.app.graphfile}",file=sys.stderr)
+        gc.unfreeze()
+        try:
+            self.app.swap(self.app.load_state())
+        except Exception: #pylint: disable=broad-except
+            print(f"Failed to reload graph, continuing with the previous generation",file=sys.stderr)
+            traceback.print_exc(file=sys.stderr)
+            gc.freeze()
+            return
+        print(f"Reloaded graph (generation {self.app.generation}) in {time.time() - begintime:.2f}s",file=sys.stderr)
+        self.replace_workers()
+
+    def update_logs(self):
+        generation = self.app.generation
+        gc.unfreeze() #the previous generation becomes garbage once a changed one is published
+        try:
+            self.app.update_logs()
+        except Exception: #pylint: disable=broad-except
+            print(f"Failed to update logs",file=sys.stderr)
+            traceback.print_exc(file=sys.stderr)
+        self.after_update(generation)
+
+    def apply_updates(self):
+        generation = self.app.generation
+        gc.unfreeze() #the previous generation becomes garbage once a changed one is published
+        try:
+            self.app.apply_spool()
+        except Exception: #pylint: disable=broad-except
+            print(f"Failed to apply updates",file=sys.stderr)
+            traceback.print_exc(file=sys.stderr)
+        self.after_update(generation)
+
+    def after_update(self, generation: int):
+        if self.app.generation != generation or not self.workers:
+            #workers are also stopped before a graph in a store is changed, even if the change then failed
+            self.replace_workers()
+        else:
+            gc.freeze()
+
+    def replace_workers(self, progress: Optional[LoadProgress] = None):
+        self.prepare(progress)
+        old = list(self.workers)
+        self.workers = {}
+        self.restarts = [] #the new generation is complete
+        for _ in range(self.numworkers):
+            self.spawn()
+        for pid in old:
+            self.retire(pid)
+
+    def retire(self, pid: int):
+        """Asks a worker to stop gracefully"""
+        self.retiring[pid] = time.time()
+        try:
+            os.kill(pid, signal.SIGTERM)
+        except ProcessLookupError:
+            pass
+
+    def report(self):
+        """Reports the memory usage of the master and each worker"""
+        for label, pid in [("master", os.getpid())] + [ ("worker", pid) for pid in sorted(self.workers) ]:
+            usage = memory_usage(pid)
+            if usage:
+                print(f"Memory usage of {label} {pid}: rss={usage['rss']//1024}MB pss={usage['pss']//1024}MB shared={usage['shared']//1024}MB private={usage['private']//1024}MB",file=sys.stderr)
+
+    def stop_workers(self):
+        """Stops all workers and waits until they have exited. This is done before the graph in a store is changed in place,
+        as the workers read the same store. Requests wait in the backlog of the socket until new workers are forked."""
+        for pid in list(self.workers):
+            self.retire(pid)
+        self.workers = {}
+        self.restarts = []
+        while self.retiring:
+            try:
+                pid, _ = os.waitpid(-1, 0)
+            except ChildProcessError:
+                break
+            self.retiring.pop(pid, None)
+
+    def shutdown(self):
+        print(f"Stopping {len(self.workers)} workers",file=sys.stderr)
+        self.stop_workers()
+        self.socket.close()
+        shutil.rmtree(self.app.spooldir, ignore_errors=True)
+
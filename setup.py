@@ -13,6 +13,12 @@ setup(
     packages=find_packages(),
     python_requires='>=3.7.0',
     install_requires=open("requirements.txt", "r", encoding='utf-8').readlines(),
+    extras_require={
+        "compression": ["brotli", "zstandard"],
+        "benchmark": ["httpx"],
+        "store": ["oxrdflib"],
+        "test": ["pytest", "httpx"],
+    },
     classifiers=[
         "License :: OSI Approved :: GNU General Public License v3 (GPLv3)",
         "Topic :: Internet :: WWW/HTTP :: WSGI :: Application",
@@ -32,7 +38,9 @@ setup(
     },
     entry_points={
         'console_scripts': [
-            'codemeta-server=codemeta_server.main:main'
+            'codemeta-server=codemeta_server.main:main',
+            'codemeta-server-benchmark=codemeta_server.benchmark:main',
+            'codemeta-server-ingest=codemeta_server.ingest:main',
         ]
     },
 )
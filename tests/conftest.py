@@ -0,0 +1,90 @@
+"""Shared fixtures: a small catalogue of codemeta records and servers on top of it"""
+
+import os
+import json
+import shutil
+import pytest
+from fastapi.testclient import TestClient
+import codemeta
+from codemeta.common import TMPDIR
+from codemeta_server.main import get_app
+
+BASEURI = "http://localhost:8080/"
+
+CONTEXT = ["https://w3id.org/codemeta/3.0", "https://schema.org", "https://w3id.org/software-types"]
+
+#identifier => versions
+TOOLS = {
+    "frog": ["0.12", "0.13"],
+    "ucto": ["0.30"],
+    "foliapy": ["2.5.9", "2.5.10"],
+}
+
+
+def make_record(identifier: str, version: str, **extra) -> dict:
+    """Returns a codemeta record (without context) of a command line tool"""
+    record = {
+        "@id": f"{BASEURI}{identifier}/{version}",
+        "@type": "SoftwareSourceCode",
+        "identifier": identifier,
+        "name": identifier.capitalize(),
+        "version": version,
+        "description": f"{identifier} is a tool for natural language processing",
+        "keywords": ["nlp"],
+        "license": "http://spdx.org/licenses/GPL-3.0-only",
+        "codeRepository": f"https://github.com/proycon/{identifier}",
+        "isSourceCodeOf": [{
+            "@id": f"{BASEURI}commandlineapplication/{identifier}/{version}",
+            "@type": "CommandLineApplication",
+            "name": identifier,
+            "executableName": identifier,
+        }],
+    }
+    record.update(extra)
+    return record
+
+
+#minimal versions of the JSON-LD contexts codemetapy would otherwise download (the codemeta context ships with codemetapy)
+CONTEXTDIR = os.path.join(os.path.dirname(__file__), "contexts")
+
+
+@pytest.fixture(scope="session", autouse=True)
+def contexts():
+    """Puts the contexts where codemetapy caches them, so the tests run offline. Contexts that are cached already are kept."""
+    sources = [ os.path.join(CONTEXTDIR, filename) for filename in sorted(os.listdir(CONTEXTDIR)) ]
+    sources.append(os.path.join(os.path.dirname(codemeta.__file__), "schema", "codemeta.jsonld"))
+    for source in sources:
+        target = os.path.join(TMPDIR, os.path.basename(source))
+        if not os.path.exists(target):
+            shutil.copyfile(source, target)
+
+
+@pytest.fixture(scope="session")
+def graphfile(tmp_path_factory):
+    path = tmp_path_factory.mktemp("graph") / "graph.json"
+    records = [ make_record(identifier, version) for identifier, versions in TOOLS.items() for version in versions ]
+    with open(path, "w", encoding="utf-8") as f:
+        json.dump({ "@context": CONTEXT, "@graph": records }, f)
+    return path
+
+
+@pytest.fixture
+def make_client(graphfile):
+    """Returns a function that starts a server with the passed options and returns a client for it"""
+    clients = []
+
+    def make(**kwargs) -> TestClient:
+        kwargs.setdefault("graph", str(graphfile))
+        client = TestClient(get_app(baseuri=BASEURI, baseurl=BASEURI, **kwargs))
+        client.__enter__()
+        clients.append(client)
+        return client
+
+    yield make
+    for client in clients:
+        client.__exit__(None, None, None)
+
+
+@pytest.fixture
+def client(make_client) -> TestClient:
+    return make_client()
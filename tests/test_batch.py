@@ -0,0 +1,70 @@
+"""Batch retrieval (user-019): many resources in one request, one result per resource in the order requested"""
+
+import json
+from conftest import BASEURI
+
+
+def results(response) -> list:
+    assert response.status_code == 200
+    assert response.headers["content-type"].startswith("application/x-ndjson")
+    return [ json.loads(line) for line in response.text.splitlines() ]
+
+
+def test_jsonlines(make_client):
+    client = make_client()
+    lines = results(client.post("/batch", json=["frog/0.12", "ucto", "foliapy/latest", "frog/~0.12", "nonexistent/1.0"]))
+    assert [ line["resource"] for line in lines ] == ["frog/0.12", "ucto", "foliapy/latest", "frog/~0.12", "nonexistent/1.0"]
+    assert [ line["status"] for line in lines ] == [200, 200, 200, 200, 404]
+    assert lines[0]["id"] == f"{BASEURI}frog/0.12" and lines[0]["data"]["name"] == "Frog"
+    assert lines[1]["id"] == f"{BASEURI}ucto/0.30"
+    assert lines[2]["id"] == f"{BASEURI}foliapy/2.5.10" and lines[2]["version"] == "2.5.10"
+    assert lines[3]["id"] == f"{BASEURI}frog/0.12"
+    assert "data" not in lines[4] and lines[4]["error"]
+    #the same as requesting them one by one
+    single = client.get("/frog/0.12.json").json()
+    assert lines[0]["data"]["@id"] == single["@id"] and lines[0]["data"]["version"] == single["version"]
+
+
+def test_formats(make_client):
+    client = make_client()
+    lines = results(client.post("/batch", json={ "resources": ["frog/0.13"], "format": "turtle" }))
+    assert lines[0]["status"] == 200 and f"<{BASEURI}frog/0.13>" in lines[0]["content"]
+    lines = results(client.post("/batch?format=ntriples", json=["frog/0.13"]))
+    assert lines[0]["content"].startswith("<")
+    assert client.post("/batch", json={ "resources": ["frog/0.13"], "format": "rdfxml" }).status_code == 400
+
+
+def test_etag(make_client):
+    client = make_client()
+    etag = results(client.post("/batch", json=["frog/0.13"]))[0]["etag"]
+    lines = results(client.post("/batch", json=[{ "resource": "frog/0.13", "etag": etag }, { "resource": "ucto/0.30", "etag": etag }]))
+    assert lines[0]["status"] == 304 and "data" not in lines[0]
+    assert lines[1]["status"] == 200 and "data" in lines[1]
+
+
+def test_limit(make_client):
+    client = make_client(batchlimit=2)
+    response = client.post("/batch", json=["frog/0.12", "frog/0.13", "ucto/0.30"])
+    assert response.status_code == 400
+    assert "at most 2" in response.json()["message"]
+    assert len(results(client.post("/batch", json=["frog/0.12", "frog/0.13"]))) == 2
+
+
+def test_invalid(make_client):
+    client = make_client()
+    assert client.post("/batch", content=b"not json").status_code == 400
+    assert client.post("/batch", json={ "resources": "frog" }).status_code == 400
+    assert client.post("/batch", json=[42]).status_code == 400
+    lines = results(client.post("/batch", json=["frog/>=bogus"]))
+    assert lines[0]["status"] == 400
+
+
+def test_multipart(make_client):
+    client = make_client()
+    response = client.post("/batch", json=["frog/0.13", "nonexistent"], headers={"Accept": "multipart/mixed"})
+    assert response.status_code == 200
+    boundary = response.headers["content-type"].split("boundary=")[1]
+    parts = response.text.split(f"--{boundary}")
+    assert parts[-1].strip() == "--"
+    assert "Status: 200 OK" in parts[1] and f"Content-Location: {BASEURI}frog/0.13" in parts[1]
+    assert "Status: 404 Not Found" in parts[2]
@@ -0,0 +1,39 @@
+"""The synthetic graph generator and the benchmark harness (user-014)"""
+
+import os
+import pytest
+from codemeta_server.benchmark import generate, generate_graph, run_single, percentile, compare
+
+
+def test_generate_graph():
+    graph = generate_graph(10, 3, seed=1)
+    assert len(graph["@graph"]) == 30
+    assert len(set(node["@id"] for node in graph["@graph"])) <= 30
+    assert generate_graph(10, 3, seed=1) == graph #deterministic
+    assert generate_graph(10, 3, seed=2) != graph
+
+
+def test_percentile():
+    assert percentile([], 50) == 0.0
+    assert percentile([3, 1, 2], 50) == 2
+    assert percentile(list(range(101)), 99) == 99
+
+
+def test_compare():
+    previous = { "runs": [ { "tools": 10, "versions": 3, "startup_s": 1.0, "dumps_s": 1.0, "peak_rss_mb": 100, "endpoints": { "facets": { "p50_ms": 10, "p99_ms": 20, "throughput": 100 } } } ] }
+    current = { "runs": [ { "tools": 10, "versions": 3, "startup_s": 1.05, "dumps_s": 0.5, "peak_rss_mb": 100, "endpoints": { "facets": { "p50_ms": 10, "p99_ms": 20, "throughput": 150 } } } ] }
+    lines = compare(previous, current)
+    assert len(lines) == 2
+    assert any(line.startswith("10x3 dumps_s") and "better" in line for line in lines)
+    assert any(line.startswith("10x3 facets.throughput") and "better" in line for line in lines)
+
+
+def test_run_single(tmp_path):
+    pytest.importorskip("httpx")
+    graphfile = generate(str(tmp_path), 5, 2)
+    assert os.path.exists(os.path.join(tmp_path, "logs", "tool0.harvest.log"))
+    result = run_single(graphfile, os.path.join(tmp_path, "logs"), 4, 2, ["resource_json", "facets"])
+    assert result["resources"] == 5
+    for name in ("resource_json", "facets"):
+        assert result["endpoints"][name]["requests"] == 4
+        assert result["endpoints"][name]["statuses"] == { "200": 4 }
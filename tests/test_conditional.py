@@ -0,0 +1,43 @@
+"""Conditional requests for single resources: ETag, Last-Modified and 304 Not Modified"""
+
+
+def test_etag_not_modified(client):
+    response = client.get("/frog/0.13.json")
+    assert response.status_code == 200
+    etag = response.headers["ETag"]
+    assert response.headers["Last-Modified"]
+    assert response.headers["Cache-Control"]
+    response = client.get("/frog/0.13.json", headers={"If-None-Match": etag})
+    assert response.status_code == 304
+    assert response.content == b""
+    assert response.headers["ETag"] == etag
+
+
+def test_etag_mismatch(client):
+    response = client.get("/frog/0.13.json", headers={"If-None-Match": '"outdated"'})
+    assert response.status_code == 200
+    assert response.json()["@id"] == "http://localhost:8080/frog/0.13"
+
+
+def test_if_modified_since(client):
+    lastmodified = client.get("/frog/0.13.json").headers["Last-Modified"]
+    response = client.get("/frog/0.13.json", headers={"If-Modified-Since": lastmodified})
+    assert response.status_code == 304
+    response = client.get("/frog/0.13.json", headers={"If-Modified-Since": "Thu, 01 Jan 1970 00:00:00 GMT"})
+    assert response.status_code == 200
+
+
+def test_etag_per_representation(client):
+    etags = set()
+    for path, accept in (("/frog/0.13", "application/json+ld"), ("/frog/0.13", "text/turtle"), ("/frog/0.13", "text/html"), ("/frog/0.12", "application/json+ld")):
+        response = client.get(path, headers={"Accept": accept})
+        assert response.status_code == 200
+        etags.add(response.headers["ETag"])
+    assert len(etags) == 4
+
+
+def test_etag_stable(make_client):
+    #the ETag only depends on the content, so another server with the same graph gives the same one
+    first = make_client().get("/frog/0.13.json").headers["ETag"]
+    second = make_client().get("/frog/0.13.json").headers["ETag"]
+    assert first == second
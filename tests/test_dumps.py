@@ -0,0 +1,92 @@
+"""Prebuilt full dumps of the graph: compression, conditional requests and byte ranges"""
+
+import pytest
+from rdflib import Graph
+from codemeta_server.main import CodemetaServer
+
+IDENTITY = {"Accept-Encoding": "identity"}
+
+
+@pytest.fixture
+def dumps(client):
+    client.app.wait_idle() #the dumps are built in the background
+    assert client.app.dumps.ready()
+    return client
+
+
+def test_full_graph(dumps):
+    response = dumps.get("/data.nt", headers=IDENTITY)
+    assert response.status_code == 200
+    graph = Graph()
+    graph.parse(data=response.text, format="nt")
+    assert len(graph) == len(dumps.app.graph)
+
+
+def test_compressed(dumps):
+    full = dumps.get("/data.ttl", headers=IDENTITY)
+    response = dumps.get("/data.ttl", headers={"Accept-Encoding": "gzip"})
+    assert response.status_code == 200
+    assert response.headers["Content-Encoding"] == "gzip"
+    assert response.content == full.content #decompressed by the client
+    assert response.headers["ETag"] != full.headers["ETag"]
+
+
+def test_not_modified(dumps):
+    etag = dumps.get("/data.json", headers=IDENTITY).headers["ETag"]
+    response = dumps.get("/data.json", headers={**IDENTITY, "If-None-Match": etag})
+    assert response.status_code == 304
+
+
+def test_range(dumps):
+    full = dumps.get("/data.json", headers=IDENTITY).content
+    response = dumps.get("/data.json", headers={**IDENTITY, "Range": "bytes=0-9"})
+    assert response.status_code == 206
+    assert response.content == full[:10]
+    assert response.headers["Content-Range"] == f"bytes 0-9/{len(full)}"
+    response = dumps.get("/data.json", headers={**IDENTITY, "Range": "bytes=-10"})
+    assert response.status_code == 206
+    assert response.content == full[-10:]
+
+
+def test_range_not_satisfiable(dumps):
+    size = len(dumps.get("/data.json", headers=IDENTITY).content)
+    response = dumps.get("/data.json", headers={**IDENTITY, "Range": f"bytes={size}-"})
+    assert response.status_code == 416
+    assert response.headers["Content-Range"] == f"bytes */{size}"
+
+
+def test_if_range(dumps):
+    full = dumps.get("/data.json", headers=IDENTITY).content
+    response = dumps.get("/data.json", headers={**IDENTITY, "Range": "bytes=0-9", "If-Range": '"outdated"'})
+    assert response.status_code == 200
+    assert response.content == full
+
+
+def test_failed_build(make_client, monkeypatch, capfd):
+    """A format that fails to serialise is left out of the build and reported as an error rather than a truncated response"""
+    stream = CodemetaServer.stream
+
+    def failing(self, res, output_type, state=None):
+        if output_type == "json":
+            raise TypeError("serialisation failed")
+        return stream(self, res, output_type, state)
+
+    monkeypatch.setattr(CodemetaServer, "stream", failing)
+    client = make_client()
+    client.app.wait_idle()
+    assert client.app.dumps.ready()
+    assert "Failed to build the json data dump" in capfd.readouterr().err
+    response = client.get("/data.json", headers=IDENTITY)
+    assert response.status_code == 500
+    assert client.get("/data.ttl", headers=IDENTITY).status_code == 200
+
+
+def test_cleanup(make_client, tmp_path):
+    """Only files named like the dumps themselves are removed from the dump directory"""
+    (tmp_path / "data.csv").write_text("foreign")
+    (tmp_path / "data.0123456789abcdef0123456789abcdef.ttl.gz").write_text("outdated")
+    client = make_client(dumpdir=str(tmp_path))
+    client.app.wait_idle()
+    assert (tmp_path / "data.csv").exists()
+    assert not (tmp_path / "data.0123456789abcdef0123456789abcdef.ttl.gz").exists()
+    assert client.app.dumps.dumps["turtle"].files["identity"].startswith(str(tmp_path))
@@ -0,0 +1,65 @@
+"""The facet index and the /facets endpoint (user-007)"""
+
+import json
+import pytest
+from rdflib import URIRef
+from codemeta_server.facets import FacetIndex
+from conftest import BASEURI, CONTEXT, TOOLS, make_record
+
+MIT = "http://spdx.org/licenses/MIT"
+
+
+@pytest.fixture
+def client(make_client, tmp_path):
+    """Frog is MIT licensed here, the other tools GPL"""
+    records = [ make_record(identifier, version, **({"license": MIT} if identifier == "frog" else {}))
+                for identifier, versions in TOOLS.items() for version in versions ]
+    path = tmp_path / "graph.json"
+    with open(path, "w", encoding="utf-8") as f:
+        json.dump({ "@context": CONTEXT, "@graph": records }, f)
+    return make_client(graph=str(path))
+
+
+def counts(response, key: str) -> dict:
+    return { facet["value"]: facet["count"] for facet in response.json()["facets"][key] }
+
+
+def test_counts(client):
+    response = client.get("/facets")
+    assert response.status_code == 200
+    assert response.json()["total"] == 5
+    assert counts(response, "schema:license") == { "spdx:MIT": 2, "spdx:GPL-3.0-only": 3 }
+    assert counts(response, "codemeta:isSourceCodeOf/rdf:type") == { "stype:CommandLineApplication": 5 }
+
+
+def test_counts_of_query(client):
+    response = client.get("/facets", params={"q": "schema:license==spdx:MIT"})
+    assert response.json()["total"] == 2
+    assert counts(response, "schema:license") == { "spdx:MIT": 2 }
+    response = client.get("/facets", params={"q": "ucto"})
+    assert response.json()["total"] == 1
+
+
+def test_exact_clause(client):
+    """Exact and disjunctive clauses on facets are answered from the facet index"""
+    response = client.get("/", params={"q": "schema:license==spdx:MIT"}, headers={"Accept": "application/json+ld"})
+    ids = set(node["@id"] for node in response.json()["@graph"] if node.get("@type") == "SoftwareSourceCode")
+    assert ids == { BASEURI + "frog/0.12", BASEURI + "frog/0.13" }
+    response = client.get("/", params={"q": "schema:license=spdx:MIT|spdx:GPL-3.0-only"}, headers={"Accept": "application/json+ld"})
+    ids = set(node["@id"] for node in response.json()["@graph"] if node.get("@type") == "SoftwareSourceCode")
+    assert len(ids) == 5
+
+
+def test_update(client):
+    """Updating and removing resources keeps the counts right"""
+    state = client.app.graphstate
+    index = FacetIndex(client.app.facets)
+    index.build(state.graph)
+    license = URIRef(MIT)
+    assert index.counts()["schema:license"][license] == 2
+    index.remove(URIRef(BASEURI + "frog/0.12"))
+    assert index.counts()["schema:license"][license] == 1
+    assert index.lookup("schema:license", [license]) == { URIRef(BASEURI + "frog/0.13") }
+    index.update(state.graph, [ URIRef(BASEURI + "frog/0.12") ])
+    assert index.counts()["schema:license"][license] == 2
+    assert index.counts({ URIRef(BASEURI + "frog/0.12") })["schema:license"] == { license: 1 }
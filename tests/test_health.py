@@ -0,0 +1,70 @@
+"""Liveness and readiness (user-024): the graph is loaded in the background, requests are refused until it is done"""
+
+import time
+import threading
+import pytest
+from codemeta_server.main import CodemetaServer
+
+
+@pytest.fixture
+def gate(monkeypatch):
+    """Holds loading the graph until the event is set"""
+    event = threading.Event()
+    load_state = CodemetaServer.load_state
+
+    def held(self, progress=None):
+        progress.begin("held")
+        event.wait(10)
+        return load_state(self, progress)
+    monkeypatch.setattr(CodemetaServer, "load_state", held)
+    yield event
+    event.set()
+
+
+def wait_ready(client, timeout: float = 10):
+    begintime = time.time()
+    while client.app.graphstate is None and time.time() - begintime < timeout:
+        time.sleep(0.05)
+
+
+def test_loaded(make_client):
+    client = make_client()
+    assert client.get("/health/live").json() == { "status": "alive" }
+    response = client.get("/health/ready")
+    assert response.status_code == 200
+    report = response.json()
+    assert report["status"] == "ready" and report["generation"] == client.app.generation
+    assert report["details"]["triples"] == len(client.app.graph)
+    assert "parse" in [ phase["name"] for phase in report["phases"] ]
+    assert all(phase["done"] for phase in report["phases"])
+
+
+def test_loading(make_client, gate):
+    client = make_client(loadinbackground=True)
+    assert client.get("/health/live").status_code == 200
+    response = client.get("/health/ready")
+    assert response.status_code == 503
+    assert response.headers["retry-after"] == "5"
+    assert response.json()["status"] == "loading" and response.json()["phase"] == "held"
+    response = client.get("/frog/0.13.json")
+    assert response.status_code == 503 and response.headers["retry-after"] == "5"
+    assert client.get("/metrics").status_code == 200 #served while loading
+    gate.set()
+    wait_ready(client)
+    assert client.get("/health/ready").status_code == 200
+    assert client.get("/frog/0.13.json").status_code == 200
+
+
+def test_failed(make_client, tmp_path):
+    graph = tmp_path / "graph.json"
+    graph.write_text("{ not json", encoding="utf-8")
+    client = make_client(graph=str(graph), loadinbackground=True)
+    begintime = time.time()
+    while client.app.progress.status == "loading" and time.time() - begintime < 10:
+        time.sleep(0.05)
+    response = client.get("/health/live")
+    assert response.status_code == 503 and response.json()["status"] == "failed"
+    response = client.get("/health/ready")
+    assert response.status_code == 503 and response.json()["error"]
+    response = client.get("/frog/0.13.json", headers={"Accept": "application/json"})
+    assert response.status_code == 503 and "Failed to load" in response.json()["message"]
@@ -0,0 +1,94 @@
+"""Adding, replacing and deleting single resources via the administrative API"""
+
+import json
+import pytest
+from rdflib import URIRef, Literal
+from codemeta.common import SDO
+from conftest import CONTEXT, make_record
+
+TOKEN = {"Authorization": "Bearer secret"}
+
+
+def make_body(identifier: str, version: str, **extra) -> bytes:
+    return json.dumps({ "@context": CONTEXT, **make_record(identifier, version, **extra) }).encode("utf-8")
+
+
+@pytest.fixture
+def adminclient(make_client):
+    return make_client(admintoken="secret")
+
+
+def test_roundtrip(adminclient):
+    assert adminclient.get("/lamachine/2.0.json").status_code == 404
+    response = adminclient.put("/admin/resources/lamachine/2.0", content=make_body("lamachine", "2.0"), headers=TOKEN)
+    assert response.status_code == 201
+    assert response.json()["message"] == "Resource added"
+    generation = response.json()["generation"]
+    response = adminclient.get("/lamachine/2.0.json")
+    assert response.status_code == 200
+    assert response.json()["name"] == "Lamachine"
+    assert adminclient.get("/lamachine.json").json()["@id"] == "http://localhost:8080/lamachine/2.0" #latest version
+
+    response = adminclient.put("/admin/resources/lamachine/2.0", content=make_body("lamachine", "2.0", name="LaMachine"), headers=TOKEN)
+    assert response.status_code == 200
+    assert response.json()["message"] == "Resource replaced"
+    assert response.json()["generation"] > generation
+    assert adminclient.get("/lamachine/2.0.json").json()["name"] == "LaMachine"
+
+    response = adminclient.delete("/admin/resources/lamachine/2.0", headers=TOKEN)
+    assert response.status_code == 200
+    assert adminclient.get("/lamachine/2.0.json").status_code == 404
+    assert adminclient.delete("/admin/resources/lamachine/2.0", headers=TOKEN).status_code == 404
+
+
+def test_indices_updated(adminclient):
+    adminclient.put("/admin/resources/lamachine/2.0", content=make_body("lamachine", "2.0"), headers=TOKEN)
+    response = adminclient.get("/?q=lamachine", headers={"Accept": "application/json+ld"})
+    assert "http://localhost:8080/lamachine/2.0" in response.text
+    adminclient.delete("/admin/resources/lamachine/2.0", headers=TOKEN)
+    response = adminclient.get("/?q=lamachine", headers={"Accept": "application/json+ld"})
+    assert "http://localhost:8080/lamachine/2.0" not in response.text
+
+
+def test_new_version(adminclient):
+    adminclient.put("/admin/resources/frog/0.14", content=make_body("frog", "0.14"), headers=TOKEN)
+    assert adminclient.get("/frog.json").json()["@id"] == "http://localhost:8080/frog/0.14"
+    adminclient.delete("/admin/resources/frog/0.14", headers=TOKEN)
+    assert adminclient.get("/frog.json").json()["@id"] == "http://localhost:8080/frog/0.13"
+
+
+def test_unchanged_resources_keep_validators(adminclient):
+    before = adminclient.get("/frog/0.13.json").headers
+    adminclient.put("/admin/resources/lamachine/2.0", content=make_body("lamachine", "2.0"), headers=TOKEN)
+    response = adminclient.get("/frog/0.13.json", headers={"If-None-Match": before["ETag"]})
+    assert response.status_code == 304
+    assert response.headers["Last-Modified"] == before["Last-Modified"]
+
+
+def test_invalid(adminclient):
+    assert adminclient.put("/admin/resources/lamachine", content=make_body("lamachine", "2.0"), headers=TOKEN).status_code == 400
+    assert adminclient.put("/admin/resources/lamachine/2.0", content=b"not json", headers=TOKEN).status_code == 400
+
+
+def test_token_required(adminclient, client):
+    assert adminclient.put("/admin/resources/lamachine/2.0", content=make_body("lamachine", "2.0")).status_code == 401
+    assert adminclient.put("/admin/resources/lamachine/2.0", content=make_body("lamachine", "2.0"), headers={"Authorization": "Bearer wrong"}).status_code == 401
+    assert client.put("/admin/resources/lamachine/2.0", content=make_body("lamachine", "2.0"), headers=TOKEN).status_code == 403
+    assert adminclient.get("/lamachine/2.0.json").status_code == 404
+
+
+def test_shared_nodes_kept(adminclient):
+    """Deleting a resource leaves the nodes it may share with other resources alone, such as an author (user-022)"""
+    author = [{"@id": "https://orcid.org/0000-0002-1825-0097", "@type": "Person", "givenName": "Josiah", "familyName": "Carberry"}]
+    adminclient.put("/admin/resources/lamachine/2.0", content=make_body("lamachine", "2.0", author=author), headers=TOKEN)
+    adminclient.put("/admin/resources/lamachine/2.1", content=make_body("lamachine", "2.1", author=author), headers=TOKEN)
+    assert adminclient.delete("/admin/resources/lamachine/2.0", headers=TOKEN).status_code == 200
+    graph = adminclient.app.graph
+    assert (URIRef("https://orcid.org/0000-0002-1825-0097"), SDO.familyName, Literal("Carberry")) in graph
+    assert not any(graph.triples((URIRef("http://localhost:8080/lamachine/2.0"), None, None)))
+    response = adminclient.get("/lamachine/2.1.ttl")
+    assert response.status_code == 200
+    assert "Carberry" in response.text
+    #described in its own right, so also kept once nothing refers to it anymore
+    assert adminclient.delete("/admin/resources/lamachine/2.1", headers=TOKEN).status_code == 200
+    assert (URIRef("https://orcid.org/0000-0002-1825-0097"), SDO.familyName, Literal("Carberry")) in adminclient.app.graph
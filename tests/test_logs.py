@@ -0,0 +1,41 @@
+"""Harvest logs kept on disk and served with byte ranges"""
+
+import pytest
+
+LOG = "".join(f"line {i}\n" for i in range(100)) + "Harvester error: unable to clone repository\n"
+
+
+@pytest.fixture
+def logclient(make_client, tmp_path):
+    with open(tmp_path / "frog.harvest.log", "w", encoding="utf-8") as f:
+        f.write(LOG)
+    return make_client(inputlogdir=str(tmp_path))
+
+
+def test_log(logclient):
+    response = logclient.get("/logs/frog", headers={"Accept-Encoding": "identity"})
+    assert response.status_code == 200
+    assert response.text == LOG
+    assert response.headers["Accept-Ranges"] == "bytes"
+
+
+def test_log_missing(logclient):
+    assert logclient.get("/logs/ucto").status_code == 404
+
+
+def test_log_tail(logclient):
+    response = logclient.get("/logs/frog", headers={"Range": "bytes=-44"})
+    assert response.status_code == 206
+    assert response.text == "Harvester error: unable to clone repository\n"
+    assert response.headers["Content-Range"] == f"bytes {len(LOG) - 44}-{len(LOG) - 1}/{len(LOG)}"
+
+
+def test_log_range_not_satisfiable(logclient):
+    response = logclient.get("/logs/frog", headers={"Range": f"bytes={len(LOG) + 10}-"})
+    assert response.status_code == 416
+    assert response.headers["Content-Range"] == f"bytes */{len(LOG)}"
+
+
+def test_log_not_modified(logclient):
+    etag = logclient.get("/logs/frog").headers["ETag"]
+    assert logclient.get("/logs/frog", headers={"If-None-Match": etag}).status_code == 304
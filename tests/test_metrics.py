@@ -0,0 +1,35 @@
+"""Metrics (user-015): the /metrics endpoint in the Prometheus text format and the Server-Timing header"""
+
+import re
+
+
+def test_metrics(make_client):
+    client = make_client()
+    assert client.get("/frog/0.13.json").status_code == 200
+    response = client.get("/metrics")
+    assert response.status_code == 200
+    assert response.headers["content-type"].startswith("text/plain")
+    text = response.text
+    assert "# TYPE codemeta_requests_total counter" in text
+    assert re.search(r'^codemeta_requests_total\{route="[^"]*",method="GET",status="200"\} [1-9]', text, re.M)
+    assert "codemeta_request_duration_seconds_bucket{" in text
+    assert 'le="+Inf"' in text
+    triples = re.search(r"^codemeta_graph_triples (\d+)", text, re.M)
+    assert triples and int(triples.group(1)) == len(client.app.graph)
+    assert re.search(r"^codemeta_graph_generation \d+", text, re.M)
+
+
+def test_cache_metrics(make_client):
+    client = make_client()
+    client.get("/frog/0.13.ttl")
+    client.get("/frog/0.13.ttl")
+    text = client.get("/metrics").text
+    hits = re.search(r"^codemeta_cache_hits_total (\S+)", text, re.M)
+    assert hits and float(hits.group(1)) == client.app.cache.hits >= 1
+
+
+def test_server_timing(make_client):
+    client = make_client()
+    response = client.get("/frog/0.13.json")
+    assert "total;dur=" in response.headers["server-timing"]
+    assert re.fullmatch(r"(\w+;dur=[0-9.]+)(, \w+;dur=[0-9.]+)*", response.headers["server-timing"])
@@ -0,0 +1,100 @@
+"""Bounded concurrency: requests beyond the queue are refused with 503 Service Unavailable"""
+
+import time
+import asyncio
+import threading
+from concurrent.futures import ThreadPoolExecutor
+import pytest
+from codemeta_server.concurrency import Limiter, Overloaded
+from codemeta_server.views import ViewStore
+
+
+def wait_for(condition, timeout: float = 10):
+    deadline = time.time() + timeout
+    while not condition():
+        assert time.time() < deadline, "timed out"
+        time.sleep(0.01)
+
+
+def test_limiter():
+    release = threading.Event()
+
+    async def run():
+        limiter = Limiter(ThreadPoolExecutor(max_workers=2), maxconcurrent=1, maxqueue=1)
+        running = asyncio.ensure_future(limiter.run(release.wait))
+        queued = asyncio.ensure_future(limiter.run(lambda: "done"))
+        while limiter.pending < 2:
+            await asyncio.sleep(0.01)
+        assert limiter.running == 1
+        assert limiter.queued == 1
+        with pytest.raises(Overloaded):
+            await limiter.run(lambda: "refused")
+        release.set()
+        assert await running
+        assert await queued == "done"
+        assert limiter.running == 0
+        assert limiter.pending == 0
+
+    asyncio.run(run())
+
+
+def test_overloaded(make_client, monkeypatch):
+    client = make_client(maxconcurrent=1, maxqueue=0)
+    server = client.app
+    release = threading.Event()
+    render = server.render
+
+    def slowrender(*args, **kwargs):
+        release.wait(10)
+        return render(*args, **kwargs)
+
+    monkeypatch.setattr(server, "render", slowrender)
+    responses = []
+    thread = threading.Thread(target=lambda: responses.append(client.get("/frog/0.13.json")))
+    thread.start()
+    try:
+        wait_for(lambda: server.limiter.running == 1)
+        response = client.get("/ucto/0.30.json")
+        assert response.status_code == 503
+        assert response.headers["Retry-After"]
+    finally:
+        release.set()
+        thread.join()
+    assert responses[0].status_code == 200
+    assert client.get("/ucto/0.30.json").status_code == 200
+
+
+def test_overloaded_batch(make_client, monkeypatch):
+    client = make_client(maxconcurrent=1, maxqueue=0)
+    server = client.app
+    release = threading.Event()
+    render = server.render
+
+    def slowrender(*args, **kwargs):
+        release.wait(10)
+        return render(*args, **kwargs)
+
+    monkeypatch.setattr(server, "render", slowrender)
+    thread = threading.Thread(target=lambda: client.get("/frog/0.13.json"))
+    thread.start()
+    try:
+        wait_for(lambda: server.limiter.running == 1)
+        assert client.post("/batch", json=["frog/0.12", "ucto/0.30"]).status_code == 503
+    finally:
+        release.set()
+        thread.join()
+
+
+def test_builds_in_own_threads(make_client, monkeypatch, capfd):
+    """Background builds do not take the threads that serve requests, and their errors are logged"""
+    threads = []
+
+    def build(self, resources=None):
+        threads.append(threading.current_thread().name)
+        raise RuntimeError("view build failed")
+
+    monkeypatch.setattr(ViewStore, "build", build)
+    client = make_client()
+    client.app.wait_idle()
+    assert threads and all(name.startswith("codemeta-server-build") for name in threads)
+    assert "view build failed" in capfd.readouterr().err
@@ -0,0 +1,61 @@
+"""Pagination of indices with cursors"""
+
+import pytest
+
+JSON = {"Accept": "application/json+ld"}
+
+ALL = {"http://localhost:8080/frog/0.12", "http://localhost:8080/frog/0.13", "http://localhost:8080/ucto/0.30",
+       "http://localhost:8080/foliapy/2.5.9", "http://localhost:8080/foliapy/2.5.10"}
+
+
+def get_resources(response) -> list:
+    data = response.json()
+    return [ node["@id"] for node in data.get("@graph", [data]) if node.get("@type") == "SoftwareSourceCode" ]
+
+
+def get_next(response):
+    link = response.headers.get("Link")
+    if link is None:
+        return None
+    assert link.endswith('>; rel="next"')
+    return link[1:link.index(">")]
+
+
+def test_pages(client):
+    url = "/?limit=2"
+    pages = []
+    while url:
+        response = client.get(url, headers=JSON)
+        assert response.status_code == 200
+        assert response.headers["X-Total-Count"] == "5"
+        pages.append(get_resources(response))
+        url = get_next(response)
+    assert [ len(page) for page in pages ] == [2, 2, 1]
+    assert set(res for page in pages for res in page) == ALL
+
+
+def test_next_link_in_body(client):
+    response = client.get("/?limit=2", headers=JSON)
+    assert response.json()["http://www.w3.org/ns/hydra/core#next"]["@id"] == get_next(response)
+
+
+def test_pages_of_selection(client):
+    response = client.get("/?res=frog/0.12;frog/0.13;ucto/0.30&limit=2", headers=JSON)
+    assert response.headers["X-Total-Count"] == "3"
+    first = get_resources(response)
+    response = client.get(get_next(response), headers=JSON)
+    assert get_next(response) is None
+    assert set(first + get_resources(response)) == {"http://localhost:8080/frog/0.12", "http://localhost:8080/frog/0.13", "http://localhost:8080/ucto/0.30"}
+
+
+def test_pagesize(make_client):
+    client = make_client(pagesize=3)
+    response = client.get("/", headers=JSON)
+    assert response.headers["X-Total-Count"] == "5"
+    assert len(get_resources(response)) == 3
+    assert get_next(response) is not None
+
+
+@pytest.mark.parametrize("cursor", ["invalid!", "bm90YW51bWJlcg"])
+def test_invalid_cursor(client, cursor):
+    assert client.get(f"/?limit=2&cursor={cursor}", headers=JSON).status_code == 400
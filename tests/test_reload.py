@@ -0,0 +1,66 @@
+"""Hot reloading the graph (user-005): the new generation replaces the old one at once, a failed reload keeps the old one"""
+
+import json
+import time
+import shutil
+import pytest
+from conftest import CONTEXT, make_record
+
+
+@pytest.fixture
+def graph(graphfile, tmp_path):
+    path = tmp_path / "graph.json"
+    shutil.copyfile(graphfile, path)
+    return path
+
+
+def write_graph(path, *records):
+    with open(path, "w", encoding="utf-8") as f:
+        json.dump({ "@context": CONTEXT, "@graph": list(records) }, f)
+
+
+def test_swap(make_client, graph):
+    client = make_client(graph=str(graph))
+    generation = client.app.generation
+    old = client.app.graphstate
+    write_graph(graph, make_record("lamachine", "2.0"))
+    client.app.reload()
+    assert client.app.generation == generation + 1
+    assert client.app.graphstate is not old
+    assert client.get("/lamachine/2.0.json").status_code == 200
+    assert client.get("/frog/0.13.json").status_code == 404
+    #the previous state is left as it was, for requests that were still using it
+    assert len(old.graph) > 0 and old.versionmap.latest("frog") == "0.13"
+
+
+def test_failed_reload(make_client, graph):
+    client = make_client(graph=str(graph))
+    generation = client.app.generation
+    with open(graph, "w", encoding="utf-8") as f:
+        f.write("{ not json")
+    client.app.reload()
+    assert client.app.generation == generation
+    assert client.get("/frog/0.13.json").status_code == 200
+
+
+def test_admin_reload(make_client, graph):
+    client = make_client(graph=str(graph), admintoken="secret")
+    generation = client.app.generation
+    write_graph(graph, make_record("lamachine", "2.0"))
+    assert client.post("/admin/reload").status_code == 401
+    response = client.post("/admin/reload", headers={"Authorization": "Bearer secret"})
+    assert response.status_code == 202
+    deadline = time.time() + 30
+    while client.app.generation == generation:
+        assert time.time() < deadline, "reload did not finish"
+        time.sleep(0.05)
+    assert client.get("/lamachine/2.0.json").status_code == 200
+
+
+def test_conditional_after_reload(make_client, graph):
+    """Validators of unchanged resources survive a reload, so clients do not download them again"""
+    client = make_client(graph=str(graph))
+    before = client.get("/frog/0.13.json")
+    client.app.reload()
+    response = client.get("/frog/0.13.json", headers={"If-None-Match": before.headers["ETag"]})
+    assert response.status_code == 304
@@ -0,0 +1,32 @@
+"""Searching the index with the simple query syntax (user-006)"""
+
+import pytest
+
+JSONLD = {"Accept": "application/json+ld"}
+
+
+def names(response) -> set:
+    data = response.json()
+    nodes = data.get("@graph", [data]) if isinstance(data, dict) else data
+    return set(node["name"] for node in nodes if node.get("@type") == "SoftwareSourceCode")
+
+
+def test_free_text(client):
+    response = client.get("/", params={"q": "frog"}, headers=JSONLD)
+    assert response.status_code == 200
+    assert names(response) == {"Frog"}
+
+
+@pytest.mark.parametrize("q", ["++", "-- ?", "++;schema:name=frog"])
+def test_no_searchable_terms(client, q):
+    """Free text without any searchable terms matches nothing, rather than the whole catalogue"""
+    response = client.get("/", params={"q": q}, headers=JSONLD)
+    assert response.status_code == 200
+    assert names(response) == set()
+
+
+def test_heading(client):
+    response = client.get("/", params={"q": "frog"}, headers={"Accept": "text/html"})
+    assert response.status_code == 200
+    assert "<h2>Search results</h2>" in response.text
+    assert "Selected resource(s)" not in response.text
@@ -0,0 +1,69 @@
+"""Binary snapshots of the parsed graph (user-004): loading and invalidation"""
+
+import os
+import json
+import shutil
+from codemeta.common import AttribDict
+from codemeta_server.snapshot import snapshot_key, snapshot_filename
+from conftest import BASEURI, CONTEXT, make_record
+
+
+def snapshots(directory) -> list:
+    return sorted(name for name in os.listdir(directory) if name.endswith(".pickle"))
+
+
+def args(**kwargs) -> AttribDict:
+    return AttribDict({ "baseuri": BASEURI, "includecontext": False, "addcontext": None, "addcontextgraph": None, **kwargs })
+
+
+def test_load(make_client, graphfile, tmp_path, capfd):
+    snapshotdir = tmp_path / "snapshots"
+    first = make_client(snapshotdir=str(snapshotdir))
+    assert snapshots(snapshotdir) == [ os.path.basename(snapshot_filename(str(snapshotdir), snapshot_key(str(graphfile), args()))) ]
+    capfd.readouterr()
+    second = make_client(snapshotdir=str(snapshotdir))
+    assert "Loaded graph from snapshot" in capfd.readouterr().err
+    assert len(second.app.graph) == len(first.app.graph)
+    assert second.get("/frog.json").json()["@id"] == BASEURI + "frog/0.13"
+
+
+def test_key(graphfile, tmp_path):
+    key = snapshot_key(str(graphfile), args())
+    assert snapshot_key(str(graphfile), args()) == key
+    assert snapshot_key(str(graphfile), args(includecontext=True)) != key
+    assert snapshot_key(str(graphfile), args(baseuri="https://example.org/")) != key
+    changed = tmp_path / "graph.json"
+    with open(graphfile, encoding="utf-8") as f:
+        data = json.load(f)
+    data["@graph"].append(make_record("lamachine", "2.0"))
+    with open(changed, "w", encoding="utf-8") as f:
+        json.dump(data, f)
+    assert snapshot_key(str(changed), args()) != key
+
+
+def test_invalidated(make_client, graphfile, tmp_path):
+    """A changed input is parsed again, and its snapshot replaces the outdated one"""
+    snapshotdir = tmp_path / "snapshots"
+    graph = tmp_path / "graph.json"
+    shutil.copyfile(graphfile, graph)
+    make_client(graph=str(graph), snapshotdir=str(snapshotdir))
+    before = snapshots(snapshotdir)
+    with open(graph, "w", encoding="utf-8") as f:
+        json.dump({ "@context": CONTEXT, "@graph": [ make_record("lamachine", "2.0") ] }, f)
+    client = make_client(graph=str(graph), snapshotdir=str(snapshotdir))
+    assert client.get("/lamachine/2.0.json").status_code == 200
+    assert client.get("/frog/0.13.json").status_code == 404
+    after = snapshots(snapshotdir)
+    assert len(after) == 1 and after != before
+
+
+def test_corrupt(make_client, graphfile, tmp_path):
+    """An unreadable snapshot is not fatal, the input is parsed instead"""
+    snapshotdir = tmp_path / "snapshots"
+    os.makedirs(snapshotdir)
+    filename = snapshot_filename(str(snapshotdir), snapshot_key(str(graphfile), args()))
+    with open(filename, "wb") as f:
+        f.write(b"garbage")
+    client = make_client(snapshotdir=str(snapshotdir))
+    assert client.get("/frog/0.13.json").status_code == 200
+    assert os.path.getsize(filename) > len(b"garbage") #replaced by a valid snapshot
@@ -0,0 +1,73 @@
+"""Guardrails of the SPARQL endpoint: the maximum number of result rows and the time limit"""
+
+import time
+import pytest
+from codemeta_server.sparql import QueryRunner
+
+RESULTS = {"Accept": "application/sparql-results+json"}
+
+#matches every combination of four triples, which takes far longer to evaluate than the time limit
+SLOWQUERY = "SELECT (COUNT(*) AS ?n) WHERE { ?a ?b ?c . ?d ?e ?f . ?g ?h ?i . ?j ?k ?l }"
+
+
+def select(client, query: str):
+    return client.get("/api/", params={"query": query}, headers=RESULTS)
+
+
+def test_select(client):
+    response = select(client, "SELECT ?s WHERE { ?s a <http://schema.org/SoftwareSourceCode> }")
+    assert response.status_code == 200
+    assert len(response.json()["results"]["bindings"]) == 5
+
+
+def test_row_limit(make_client):
+    client = make_client(sparqlmaxrows=3)
+    response = select(client, "SELECT ?s ?p ?o WHERE { ?s ?p ?o }")
+    assert response.status_code == 413
+    response = select(client, "SELECT ?s ?p ?o WHERE { ?s ?p ?o } LIMIT 3")
+    assert response.status_code == 200
+    assert len(response.json()["results"]["bindings"]) == 3
+
+
+def test_row_limit_stops_evaluation(make_client, options):
+    #the limit is part of the query, so even a query with a huge result is refused right away
+    client = make_client(sparqlmaxrows=3, sparqltimeout=0, **options)
+    begintime = time.time()
+    response = select(client, "SELECT * WHERE { ?a ?b ?c . ?d ?e ?f . ?g ?h ?i . ?j ?k ?l }")
+    assert response.status_code == 413
+    assert time.time() - begintime < 10
+
+
+@pytest.fixture(params=["memory", "store"])
+def options(request, tmp_path) -> dict:
+    """Runs a test against a graph in memory and against one in a persistent store"""
+    if request.param == "store":
+        pytest.importorskip("oxrdflib")
+        return { "store": str(tmp_path / "store") }
+    return {}
+
+
+def test_time_limit(make_client, options):
+    client = make_client(sparqltimeout=0.5, **options)
+    begintime = time.time()
+    response = select(client, SLOWQUERY)
+    assert response.status_code == 504
+    assert time.time() - begintime < 10
+    #the endpoint is still available afterwards
+    assert select(client, "ASK { ?s ?p ?o }").status_code == 200
+
+
+def test_invalid_query(client):
+    assert select(client, "SELECT ?s WHERE { ?s").status_code == 400
+    assert select(client, "SELECT ?s WHERE { ?s a unknown:Type }").status_code == 400
+
+
+def test_internal_error(client, monkeypatch, capfd):
+    """Errors other than those in the query itself are reported as such, and logged"""
+    def run(self, sparql, accept, state):
+        raise RuntimeError("broken")
+
+    monkeypatch.setattr(QueryRunner, "run", run)
+    response = select(client, "ASK { ?s ?p ?o }")
+    assert response.status_code == 500
+    assert "broken" in capfd.readouterr().err
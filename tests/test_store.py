@@ -0,0 +1,86 @@
+"""Persistent triple stores (user-018): the graph is ingested once per input, afterwards the store is only opened"""
+
+import os
+import pytest
+from rdflib import Graph, URIRef, Literal
+from codemeta.common import SDO
+import codemeta_server.main
+from codemeta_server import store as storemodule
+from codemeta_server.store import StoreGraph, open_store, ingest_store, parse_store, cleanup
+from codemeta_server.versions import VersionIndex
+from conftest import BASEURI
+
+pytest.importorskip("oxrdflib")
+
+
+@pytest.fixture
+def storedir(tmp_path):
+    yield str(tmp_path / "store")
+    forget(str(tmp_path))
+
+
+def forget(basedir: str):
+    """Closes the stores opened below the directory, as if the process ended"""
+    for directory in list(storemodule._OPENED):
+        if directory.startswith(basedir):
+            storemodule._OPENED.pop(directory).close()
+
+
+def test_parse_store():
+    assert parse_store("/tmp/store") == ("Oxigraph", "/tmp/store")
+    assert parse_store("Oxigraph:/tmp/store") == ("Oxigraph", "/tmp/store")
+    with pytest.raises(ValueError):
+        parse_store("Bogus:/tmp/store")
+
+
+def test_serves_from_store(make_client, storedir):
+    client = make_client(store=storedir)
+    assert isinstance(client.app.graph, StoreGraph)
+    response = client.get("/frog/0.13.json")
+    assert response.status_code == 200
+    assert response.json()["name"] == "Frog"
+    assert client.get("/frog.json").json()["@id"] == f"{BASEURI}frog/0.13"
+
+
+def test_reopen(make_client, storedir, tmp_path, monkeypatch):
+    """A restarted server opens the store it ingested into before, rather than ingesting again"""
+    client = make_client(store=storedir)
+    triples = len(client.app.graph)
+    expected = client.get("/frog/0.13.json").json()
+    client.__exit__(None, None, None)
+    forget(str(tmp_path))
+
+    def fail(*args, **kwargs):
+        raise AssertionError("ingested again")
+    monkeypatch.setattr(codemeta_server.main, "ingest_store", fail)
+    client = make_client(store=storedir)
+    assert isinstance(client.app.graph, StoreGraph)
+    assert len(client.app.graph) == triples
+    assert client.get("/frog/0.13.json").json() == expected
+    assert client.app.graphstate.versionmap.latest("frog") == "0.13"
+
+
+def test_incomplete_store(storedir, tmp_path):
+    """A store without its metadata (an ingest that did not finish) is not opened"""
+    g = Graph()
+    g.add((URIRef(f"{BASEURI}frog/0.13"), SDO.name, Literal("Frog")))
+    key = "0" * 32
+    assert len(ingest_store(storedir, key, BASEURI, g, Graph(), VersionIndex(BASEURI))) == 1
+    forget(str(tmp_path))
+    opened = open_store(storedir, key, BASEURI)
+    assert opened is not None and len(opened[0]) == 1
+    assert open_store(storedir, "1" * 32, BASEURI) is None #another input
+    forget(str(tmp_path))
+    os.remove(os.path.join(storedir, key, "meta.pickle"))
+    assert open_store(storedir, key, BASEURI) is None
+
+
+def test_cleanup(tmp_path):
+    """Only the most recently ingested stores are kept, other directories are left alone"""
+    for i in range(4):
+        os.makedirs(tmp_path / (str(i) * 32))
+        (tmp_path / (str(i) * 32) / "meta.pickle").write_bytes(b"")
+        os.utime(tmp_path / (str(i) * 32) / "meta.pickle", (1000 + i, 1000 + i))
+    os.makedirs(tmp_path / "unrelated")
+    cleanup(str(tmp_path), keep=2)
+    assert sorted(os.listdir(tmp_path)) == ["2" * 32, "3" * 32, "unrelated"]
@@ -0,0 +1,53 @@
+"""Incremental serialization (user-009): streamed output describes the same graph as output serialized at once"""
+
+import json
+from rdflib import Graph
+from rdflib.compare import to_isomorphic
+from codemeta_server import main
+
+TURTLE = {"Accept": "text/turtle"}
+JSONLD = {"Accept": "application/json+ld"}
+
+
+def parse(data, format: str) -> Graph:
+    graph = Graph()
+    graph.parse(data=data, format=format)
+    return graph
+
+
+def test_full_graph(client):
+    state = client.app.graphstate
+    expected = to_isomorphic(state.graph)
+    for format, rdfformat in (("turtle", "turtle"), ("ntriples", "nt")):
+        data = b"".join(client.app.stream(None, format, state)).decode("utf-8")
+        assert to_isomorphic(parse(data, rdfformat)) == expected
+
+
+def test_full_graph_jsonld(client):
+    """The JSON-LD dump made of the resources one by one has the same nodes as the graph serialized as a whole"""
+    state = client.app.graphstate
+    assert client.app.is_partitioned(state)
+    streamed = json.loads(b"".join(client.app.stream(None, "json", state)))
+    whole = json.loads(client.app.render(None, "json", state))
+    ids = lambda doc: set(node["@id"] for node in doc["@graph"] if "@id" in node)
+    assert ids(streamed) == ids(whole)
+
+
+def test_index(client, monkeypatch):
+    """Indices above the threshold are streamed, with the same content as those below it"""
+    whole = client.get("/", params={"q": "nlp"}, headers=TURTLE)
+    monkeypatch.setattr(main, "STREAM_THRESHOLD", 0)
+    client.app.cache.clear()
+    streamed = client.get("/", params={"q": "nlp"}, headers=TURTLE)
+    assert streamed.status_code == 200
+    assert "content-length" not in streamed.headers #chunked
+    assert to_isomorphic(parse(streamed.text, "turtle")) == to_isomorphic(parse(whole.text, "turtle"))
+
+
+def test_index_jsonld(client, monkeypatch):
+    whole = client.get("/", params={"q": "nlp"}, headers=JSONLD).json()
+    monkeypatch.setattr(main, "STREAM_THRESHOLD", 0)
+    client.app.cache.clear()
+    streamed = client.get("/", params={"q": "nlp"}, headers=JSONLD).json()
+    nodes = lambda doc: sorted(json.dumps(node, sort_keys=True) for node in doc["@graph"])
+    assert nodes(streamed) == nodes(whole)
@@ -0,0 +1,87 @@
+"""The subgraph index (user-020): precomputed descriptions must be the same as those extracted from the graph"""
+
+import pytest
+from rdflib import Graph, URIRef, Literal
+from rdflib.compare import isomorphic
+from codemeta.common import SDO, RDF
+from codemeta_server.subgraph import SubgraphIndex, extract_subgraph, copy_graph
+from conftest import BASEURI
+
+FROG = URIRef(f"{BASEURI}frog/0.13")
+UCTO = URIRef(f"{BASEURI}ucto/0.30")
+SUITE = URIRef(f"{BASEURI}languagemachines")
+ORG = URIRef("https://www.ru.nl/clst")
+
+
+@pytest.fixture
+def graph(make_client) -> Graph:
+    """A copy of the served graph, where frog and ucto share a producer and belong to the same suite"""
+    g = copy_graph(make_client().app.graph)
+    g.add((ORG, RDF.type, SDO.Organization))
+    g.add((ORG, SDO.name, Literal("Centre for Language and Speech Technology")))
+    for res in (FROG, UCTO):
+        g.add((res, SDO.producer, ORG))
+        g.add((res, SDO.applicationSuite, SUITE))
+    return g
+
+
+def assert_same(index: SubgraphIndex, graph: Graph):
+    resources = set(s for s, _, _ in graph.triples((None, RDF.type, SDO.SoftwareSourceCode)))
+    assert resources and all(res in index for res in resources)
+    for res in resources:
+        assert isomorphic(index.get([res], graph), extract_subgraph(graph, [res])), res
+    assert isomorphic(index.get(sorted(resources), graph), extract_subgraph(graph, sorted(resources)))
+
+
+def test_build(graph):
+    index = SubgraphIndex()
+    index.build(graph)
+    assert_same(index, graph)
+    #target products have their own descriptions
+    assert URIRef(f"{BASEURI}commandlineapplication/frog/0.13") in index
+
+
+def test_missing(graph):
+    """Resources that are not in the index are extracted from the graph"""
+    index = SubgraphIndex()
+    assert isomorphic(index.get([FROG], graph), extract_subgraph(graph, [FROG]))
+    assert index.get_page(FROG, graph) is None
+
+
+def test_page(graph):
+    index = SubgraphIndex()
+    index.build(graph)
+    page = index.get_page(FROG, graph)
+    assert isomorphic(page, extract_subgraph(graph, [FROG, UCTO]))
+
+
+def test_update_shared(graph):
+    """Changing a node shared by several descriptions updates all of them, and the original index is left as it was"""
+    index = SubgraphIndex()
+    index.build(graph)
+    before = index.get([UCTO], graph)
+    updated = index.copy()
+    graph.set((ORG, SDO.name, Literal("CLST")))
+    graph.remove((FROG, SDO.applicationSuite, SUITE))
+    updated.update(graph, [FROG])
+    assert_same(updated, graph)
+    assert (ORG, SDO.name, Literal("CLST")) in updated.get([UCTO], graph)
+    assert isomorphic(updated.get_page(FROG, graph), extract_subgraph(graph, [FROG]))
+    assert isomorphic(index.get([UCTO], graph), before)
+
+
+def test_update_removed(graph):
+    index = SubgraphIndex()
+    index.build(graph)
+    graph.remove((FROG, None, None))
+    index.update(graph, [FROG])
+    assert FROG not in index
+    assert_same(index, graph)
+
+
+def test_served(make_client):
+    """The server describes resources from the index"""
+    app = make_client().app
+    state = app.graphstate
+    assert state.descriptions is not None and FROG in state.descriptions
+    assert isomorphic(app.describe([FROG], state), extract_subgraph(state.graph, [FROG]))
@@ -0,0 +1,95 @@
+"""Validation reports (user-017): reports from the graph and computed against SHACL shapes, collected once per generation"""
+
+import json
+import pytest
+from rdflib import URIRef
+from conftest import BASEURI, CONTEXT, TOOLS, make_record
+
+SHAPES = """@prefix sh: <http://www.w3.org/ns/shacl#> .
+@prefix schema: <http://schema.org/> .
+@prefix ex: <http://example.org/> .
+ex:SoftwareShape a sh:NodeShape ;
+    sh:targetClass schema:SoftwareSourceCode ;
+    sh:property [ sh:path schema:author ; sh:minCount 1 ; sh:severity sh:Warning ; sh:message "Author is missing" ] .
+"""
+
+REPORT = "Validation report\n\n1. Violation: name is wrong (sdo:name)\n2. Info: description is short"
+
+
+@pytest.fixture
+def client(make_client, tmp_path):
+    """A server on a graph where frog 0.12 carries a report from the harvester and the others are validated against the shapes"""
+    records = [ make_record(identifier, version) for identifier, versions in TOOLS.items() for version in versions ]
+    records[0]["review"] = {
+        "@id": f"{BASEURI}validation/frog/0.12",
+        "@type": "Review",
+        "reviewBody": REPORT,
+        "reviewRating": 2,
+        "datePublished": "2024-01-01",
+    }
+    graph = tmp_path / "graph.json"
+    with open(graph, "w", encoding="utf-8") as f:
+        json.dump({ "@context": CONTEXT, "@graph": records }, f)
+    shapes = tmp_path / "shapes.ttl"
+    shapes.write_text(SHAPES, encoding="utf-8")
+    client = make_client(graph=str(graph), shacl=str(shapes), admintoken="secret")
+    client.app.wait_idle() #the reports are collected in the background
+    return client
+
+
+def test_overview(client):
+    assert client.app.validation.ready()
+    response = client.get("/validation/", headers={"Accept": "application/json"})
+    assert response.status_code == 200
+    data = response.json()
+    assert data["generation"] == client.app.generation
+    assert data["summary"]["reports"] == 5
+    assert data["summary"]["severity"]["violation"] == 1
+    assert data["summary"]["severity"]["warning"] == 4
+    reports = { report["resource"]: report for report in data["reports"] }
+    harvested = reports[f"{BASEURI}frog/0.12"]
+    assert not harvested["computed"] and harvested["rating"] == 2 and harvested["report"] == REPORT
+    assert harvested["counts"] == { "violation": 1, "warning": 0, "info": 1, "unknown": 0 }
+    computed = reports[f"{BASEURI}ucto/0.30"]
+    assert computed["computed"] and computed["severity"] == "warning"
+    assert "Author is missing" in computed["report"]
+
+
+def test_overview_html(client):
+    response = client.get("/validation/", headers={"Accept": "text/html"})
+    assert response.status_code == 200
+    assert "<h1>Validation reports</h1>" in response.text
+    assert response.text.count("<tr class=") == 5
+
+
+def test_severity(client):
+    data = client.get("/validation/?severity=violation", headers={"Accept": "application/json"}).json()
+    assert [ report["resource"] for report in data["reports"] ] == [ f"{BASEURI}frog/0.12" ]
+    assert data["summary"]["reports"] == 5 #the summary covers all reports
+    assert client.get("/validation/?severity=bogus", headers={"Accept": "application/json"}).status_code == 400
+
+
+def test_report(client):
+    #by the identifier of the review as well as that of the resource
+    for path in ("/validation/validation/frog/0.12", "/validation/frog/0.12"):
+        response = client.get(path)
+        assert response.status_code == 200
+        assert response.text == REPORT
+    response = client.get("/validation/ucto/0.30", headers={"Accept": "application/json"})
+    assert response.status_code == 200
+    assert response.json()["computed"]
+    assert client.get("/validation/nonexistent/1.0").status_code == 404
+
+
+def test_incremental(client):
+    """After a resource is replaced only that one is validated again, the reports of the others are kept"""
+    app = client.app
+    before = dict(app.validation.reports)
+    body = json.dumps({ "@context": CONTEXT, **make_record("ucto", "0.30", author={"@type": "Person", "name": "Maarten"}) }).encode("utf-8")
+    response = client.put("/admin/resources/ucto/0.30", content=body, headers={"Authorization": "Bearer secret"})
+    assert response.status_code == 200
+    app.wait_idle()
+    assert app.validation.ready()
+    after = app.validation.reports
+    assert after[URIRef(f"{BASEURI}ucto/0.30")].severity == "none"
+    assert after[URIRef(f"{BASEURI}frog/0.13")] is before[URIRef(f"{BASEURI}frog/0.13")]
@@ -0,0 +1,76 @@
+"""Resolving versions and version ranges (user-011)"""
+
+import pytest
+from codemeta_server.versions import VersionIndex, InvalidRange, parse_range
+from conftest import BASEURI
+
+VERSIONS = ["0.9", "1.0", "v1.1", "1.2.0", "1.2.3", "1.10", "2.0.0rc1", "2.0", "2.1"]
+
+
+@pytest.fixture
+def index() -> VersionIndex:
+    index = VersionIndex(BASEURI)
+    for version in VERSIONS:
+        index.add("tool", version)
+    return index
+
+
+@pytest.mark.parametrize("spec,expected", [
+    ("latest", "2.1"),
+    ("~1.2", "1.2.3"),
+    ("~1", "1.10"),
+    ("^1.1", "1.10"),
+    ("^0.9", "0.9"),
+    ("1.2.*", "1.2.3"),
+    ("1.x", "1.10"),
+    (">=1,<2", "1.10"),
+    (">=1,<1.10,!=1.2.3", "1.2.0"),
+    ("<=1.1", "v1.1"),
+    (">2.1", None),
+    ("==1.0", "1.0"),
+    ("<0.5", None),
+])
+def test_resolve(index, spec, expected):
+    assert index.resolve("tool", spec) == expected
+
+
+def test_invalid_range():
+    with pytest.raises(InvalidRange):
+        parse_range(">=banana")
+    with pytest.raises(InvalidRange):
+        parse_range(">=1.*")
+
+
+def test_order(index):
+    """Versions are ordered semantically rather than lexicographically, unparseable versions count as the most recent"""
+    assert index.versions("tool")[:3] == ["2.1", "2.0", "2.0.0rc1"]
+    assert index.versions("tool")[-1] == "0.9"
+    index.add("tool", "snapshot")
+    assert index.latest("tool") == "snapshot"
+    assert index.resolve("tool", "~2") == "2.1"
+
+
+def test_remove(index):
+    index.remove("tool", "2.1")
+    assert index.latest("tool") == "2.0"
+    for version in VERSIONS[:-1]:
+        index.remove("tool", version)
+    assert "tool" not in index
+
+
+def test_redirects(client):
+    response = client.get("/frog/latest.json", follow_redirects=False)
+    assert response.status_code == 302
+    assert response.headers["Location"] == BASEURI + "frog/0.13.json"
+    response = client.get("/foliapy/~2.5", follow_redirects=False)
+    assert response.headers["Location"] == BASEURI + "foliapy/2.5.10"
+    response = client.get("/frog/<0.13", follow_redirects=False)
+    assert response.headers["Location"] == BASEURI + "frog/0.12"
+    assert client.get("/frog/>=1", follow_redirects=False).status_code == 404
+    assert client.get("/frog/>=banana", follow_redirects=False).status_code == 400
+
+
+def test_versions_listing(client):
+    data = client.get("/frog/versions").json()
+    assert data["latest"] == "0.13"
+    assert [ v["version"] for v in data["versions"] ] == ["0.13", "0.12"]
@@ -0,0 +1,80 @@
+"""Materialized index views (user-023): listings and unfiltered index pages built once per generation, updated incrementally"""
+
+import json
+from rdflib import URIRef, Literal
+from codemeta.common import SDO, RDF, CODEMETA
+from codemeta_server.views import IndexView, collect, TEMPLATES
+from codemeta_server.subgraph import copy_graph
+from conftest import BASEURI, CONTEXT, make_record
+
+TOKEN = {"Authorization": "Bearer secret"}
+
+HTML = {"Accept": "text/html"}
+
+
+def uri(path: str) -> URIRef:
+    return URIRef(f"{BASEURI}{path}")
+
+
+def test_catalogue(make_client):
+    """Resources are listed by label, those in a suite grouped under it"""
+    g = copy_graph(make_client().app.graph)
+    g.add((uri("ucto/0.30"), SDO.applicationSuite, Literal("Aardvark")))
+    view = IndexView(1, collect(g))
+    assert view.catalogue == [ uri("ucto/0.30"), uri("foliapy/2.5.10"), uri("foliapy/2.5.9"), uri("frog/0.12"), uri("frog/0.13") ]
+    assert view.groups[0] == ("Aardvark", True, [ (uri("ucto/0.30"), "Ucto") ])
+    assert view.order([uri("frog/0.13"), uri("nonexistent"), uri("foliapy/2.5.9")]) == [uri("foliapy/2.5.9"), uri("frog/0.13"), uri("nonexistent")]
+    assert view.services == []
+
+
+def test_services(make_client):
+    g = copy_graph(make_client().app.graph)
+    target = uri("webapplication/frog/0.13")
+    g.add((uri("frog/0.13"), CODEMETA.isSourceCodeOf, target))
+    g.add((target, RDF.type, SDO.WebApplication))
+    g.add((target, SDO.url, URIRef("https://webservices.cls.ru.nl/frog")))
+    view = IndexView(1, collect(g))
+    assert view.services == [ uri("frog/0.13") ]
+    assert view.select_services([uri("frog/0.12"), uri("frog/0.13")]) == [ uri("frog/0.13") ]
+
+
+def test_pages_served(make_client):
+    """The unfiltered indices are served from the view, filtered ones are not"""
+    client = make_client()
+    client.app.wait_idle() #the pages are rendered in the background
+    state = client.app.graphstate
+    assert state.view is not None and state.view.generation == state.generation
+    assert set(state.view.pages) == set(TEMPLATES)
+    for indextemplate, path in (("cardindex.html", "/"), ("tableindex.html", "/table/"), ("serviceindex.html", "/services/")):
+        state.view.pages[indextemplate] = f"materialized {indextemplate}"
+        assert client.get(path, headers=HTML).text == f"materialized {indextemplate}"
+    assert "materialized" not in client.get("/?q=frog", headers=HTML).text
+
+
+def test_paginated(make_client):
+    """With a page size there is no single unfiltered page to materialize"""
+    client = make_client(pagesize=2)
+    client.app.wait_idle()
+    state = client.app.graphstate
+    assert state.view is not None and state.view.pages == {}
+    assert len(state.view.catalogue) == 5
+
+
+def test_incremental(make_client):
+    """After a resource is added only its summary is made, those of the others are kept"""
+    client = make_client(admintoken="secret")
+    client.app.wait_idle()
+    before = client.app.graphstate.view
+    body = json.dumps({ "@context": CONTEXT, **make_record("lamachine", "2.0") }).encode("utf-8")
+    assert client.put("/admin/resources/lamachine/2.0", content=body, headers=TOKEN).status_code == 201
+    client.app.wait_idle()
+    state = client.app.graphstate
+    view = state.view
+    assert view.generation == state.generation > before.generation
+    assert view.summaries[uri("frog/0.13")] is before.summaries[uri("frog/0.13")]
+    assert view.catalogue[4] == uri("lamachine/2.0")
+    assert "lamachine/2.0" in view.pages["cardindex.html"]
+    assert "lamachine/2.0" not in before.pages["cardindex.html"]
+    assert client.delete("/admin/resources/lamachine/2.0", headers=TOKEN).status_code == 200
+    client.app.wait_idle()
+    assert uri("lamachine/2.0") not in client.app.graphstate.view.catalogue
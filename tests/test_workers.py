@@ -0,0 +1,63 @@
+"""Restarting the worker processes of a master (user-013), without forking any"""
+
+import time
+import pytest
+from codemeta_server import workers
+from codemeta_server.workers import Master, MINLIFETIME
+
+
+@pytest.fixture
+def master(monkeypatch):
+    master = Master(None, "localhost", 8080, 2)
+    exited = []
+    spawned = []
+
+    def waitpid(pid, options):
+        return (exited.pop(0), 256) if exited else (0, 0)
+
+    def spawn():
+        pid = 1000 + len(spawned)
+        spawned.append(pid)
+        master.workers[pid] = time.time()
+
+    monkeypatch.setattr(workers.os, "waitpid", waitpid)
+    monkeypatch.setattr(master, "spawn", spawn)
+    master.exited = exited
+    master.spawned = spawned
+    return master
+
+
+def test_restart(master):
+    master.workers[1] = time.time() - MINLIFETIME - 1
+    master.exited.append(1)
+    master.reap()
+    master.restart()
+    assert master.spawned == [1000]
+    assert master.failures == 0
+
+
+def test_backoff(master):
+    """A worker that fails right after being started is replaced later, without holding up the master"""
+    master.workers[1] = time.time()
+    master.exited.append(1)
+    begintime = time.time()
+    master.reap()
+    master.restart()
+    assert time.time() - begintime < 1
+    assert master.spawned == []
+    assert master.failures == 1
+    assert master.restarts and master.restarts[0] > time.time()
+    master.restarts = [ t - 2 for t in master.restarts ] #time passes
+    master.restart()
+    assert master.spawned == [1000]
+    assert master.restarts == []
+
+
+def test_no_restart_when_stopping(master):
+    master.stopping = True
+    master.workers[1] = time.time()
+    master.exited.append(1)
+    master.reap()
+    master.restart()
+    assert master.spawned == []
+    assert master.restarts == []